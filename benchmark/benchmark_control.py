@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# the benchmark runs the control strategies of the temperature control on the simulation engine of the simulators
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "temperature_control"))
+from benchmark_simulation import createEngine
+from strategies import COOLING, HEATING, createStrategy
+
+
+def runStrategy(settings, name, parameters, temperatureRange):
+    """
+    Control the temperature of all the greenhouses of the simulation with a strategy, one batched step per reading,
+    and measure the energy used, the share of the time in the range and the CPU time of the control.
+
+    Parameters:
+        settings (dict): settings of the control benchmark.
+        name (str): name of the strategy.
+        parameters (dict): parameters of the strategy.
+        temperatureRange (dict): min and max temperature of the greenhouses.
+
+    Returns:
+        dict: results of the strategy.
+    """
+    engine = createEngine(settings["simulation"])
+    strategy = createStrategy(name, parameters, settings["minOnTime"], settings["minOffTime"])
+    greenhouses = len(engine.temperature)
+    slots = strategy.slots(list(range(greenhouses)))
+    tempMin = np.full(greenhouses, float(temperatureRange["min"]))
+    tempMax = np.full(greenhouses, float(temperatureRange["max"]))
+    steps = int(settings["simulation"]["simulatedHours"] * 3600 / engine.dt)
+
+    heatingTime = 0
+    coolingTime = 0
+    inRange = 0
+    transitions = 0
+    controlTime = 0
+    for _ in range(steps):
+        temperature = engine.temperature.copy()
+        start = time.perf_counter()
+        commands, changed = strategy.step(slots, temperature, tempMin, tempMax, engine.time)
+        controlTime += time.perf_counter() - start
+
+        engine.heating[:] = commands == HEATING
+        engine.cooling[:] = commands == COOLING
+        transitions += np.count_nonzero(changed)
+        heatingTime += np.count_nonzero(engine.heating) * engine.dt
+        coolingTime += np.count_nonzero(engine.cooling) * engine.dt
+        inRange += np.count_nonzero((temperature >= tempMin) & (temperature <= tempMax))
+        engine.step()
+
+    energy = heatingTime * engine.model.heaterPower + coolingTime * engine.model.coolerPower
+    return {
+        "strategy": name,
+        "energyPerGreenhouse": round(energy / 3.6e6 / greenhouses, 2),  # kWh
+        "temperatureInRange": round(inRange / (steps * greenhouses), 3),
+        "commandsPerGreenhouse": round(transitions / greenhouses, 1),
+        "stepTime": controlTime / steps,
+        "timePerGreenhouse": controlTime / (steps * greenhouses)
+    }
+
+
+def run(settings, temperatureRange):
+    """
+    Compare the control strategies on the same simulation.
+
+    Parameters:
+        settings (dict): settings of the control benchmark.
+        temperatureRange (dict): min and max temperature of the greenhouses.
+
+    Returns:
+        dict: size of the simulation and results of each strategy.
+    """
+    return {
+        "model": settings["simulation"]["model"],
+        "greenhouses": settings["simulation"]["greenhouses"],
+        "simulatedHours": settings["simulation"]["simulatedHours"],
+        "dt": settings["simulation"]["dt"],
+        "strategies": [runStrategy(settings, name, parameters, temperatureRange) for name, parameters in settings["strategies"].items()]
+    }
+
+
+if __name__ == "__main__":
+    settings = json.load(open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json")))
+    print(json.dumps(run(settings["control"], settings["temperatureRange"]), indent=4))
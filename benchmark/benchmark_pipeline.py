@@ -0,0 +1,127 @@
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+# the benchmark uses the local broker and the shared MQTT client of the services
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "local_broker"))
+sys.path.append(os.path.join(ROOT, "mymqtt"))
+from local_broker import LocalBroker
+from mymqtt import MyMQTT
+
+
+class ControlStage:
+    """
+    Threshold control of the pipeline: receive the temperatures and publish the heating/cooling commands.
+    The timestamp of the reading is copied in the command to measure the end-to-end latency.
+    """
+
+    def __init__(self, settings, broker, port):
+        self.heatingcoolingTopic = settings["heatingcoolingTopic"]
+        self.temp_min = settings["temperatureRange"]["min"]
+        self.temp_max = settings["temperatureRange"]["max"]
+        self.client = MyMQTT(str(uuid.uuid1()), broker, port, self, settings["mqttOptions"], "BenchmarkControl")
+        self.client.start()
+        self.client.mySubscribe(settings["temperatureTopic"].format(greenhouseID="+"))
+
+    def notify(self, topic, payload):
+        greenhouseID = topic.split("/")[-2]
+        temperature = payload["v"]
+        if temperature < self.temp_min:
+            command = "heating"
+        elif temperature > self.temp_max:
+            command = "cooling"
+        else:
+            command = "off"
+        self.client.myPublish(self.heatingcoolingTopic.format(greenhouseID=greenhouseID), {"command": command, "t": payload["t"]})
+
+
+class ActuatorStage:
+    """
+    Actuators of the pipeline: receive the commands and record the latency since the reading.
+    """
+
+    def __init__(self, settings, broker, port):
+        self.latencies = []
+        self.client = MyMQTT(str(uuid.uuid1()), broker, port, self, settings["mqttOptions"], "BenchmarkActuators")
+        self.client.start()
+        self.client.mySubscribe(settings["heatingcoolingTopic"].format(greenhouseID="+"))
+
+    def notify(self, topic, payload):
+        self.latencies.append(time.time() - payload["t"])
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(settings):
+    """
+    Run the sensor -> control -> actuator pipeline through a local broker and return the results.
+
+    Parameters:
+        settings (dict): settings of the benchmark.
+
+    Returns:
+        dict: throughput, latency and statistics of the run.
+    """
+    broker = LocalBroker("127.0.0.1", 0).startInThread()
+    host, port = "127.0.0.1", broker.port
+
+    actuators = ActuatorStage(settings, host, port)
+    control = ControlStage(settings, host, port)
+    sensorClients = []
+    for i in range(settings["sensorClients"]):
+        client = MyMQTT(str(uuid.uuid1()), host, port, None, settings["mqttOptions"], f"BenchmarkSensors{i}")
+        client.start()
+        sensorClients.append(client)
+    time.sleep(1)
+
+    # each greenhouse publishes readingsPerSecond temperatures per second, through the sensor clients
+    greenhouses = list(range(1, settings["greenhouses"] + 1))
+    temperatures = {greenhouseID: random.uniform(10, 35) for greenhouseID in greenhouses}
+    period = 1 / settings["readingsPerSecond"]
+    published = 0
+    start = time.time()
+    nextTick = start
+    while time.time() - start < settings["duration"]:
+        for greenhouseID in greenhouses:
+            temperatures[greenhouseID] += random.uniform(-0.2, 0.2)
+            message = {"v": round(temperatures[greenhouseID], 1), "u": "°C", "t": time.time(), "n": "temperature"}
+            client = sensorClients[greenhouseID % len(sensorClients)]
+            client.myPublish(settings["temperatureTopic"].format(greenhouseID=greenhouseID), message)
+            published += 1
+        nextTick += period
+        time.sleep(max(0, nextTick - time.time()))
+    elapsed = time.time() - start
+    # wait for the last commands
+    time.sleep(2)
+
+    results = {
+        "readingsPublished": published,
+        "readingsPerSecond": round(published / elapsed, 1),
+        "commandsReceived": len(actuators.latencies),
+        "latencyP50": percentile(actuators.latencies, 0.5),
+        "latencyP95": percentile(actuators.latencies, 0.95),
+        "latencyP99": percentile(actuators.latencies, 0.99),
+        "brokerReceived": broker.received,
+        "brokerDelivered": broker.delivered,
+        "controlStats": control.client.getStats()
+    }
+
+    for client in sensorClients + [control.client, actuators.client]:
+        client.stop()
+    broker.stopThread()
+    return results
+
+
+if __name__ == "__main__":
+    settings = json.load(open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json")))
+    results = run(settings)
+    print(json.dumps(results, indent=4))
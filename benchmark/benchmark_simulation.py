@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# the benchmark uses the simulation engine of the sensor simulators
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "simulator"))
+from simulator import SimulationEngine, createModel
+
+
+def createEngine(settings):
+    model = createModel(settings.get("model", "randomWalk"), settings.get("parameters"))
+    engine = SimulationEngine(settings["seed"], model, settings.get("dt", 15), startTime=0)
+    engine.addGreenhouses(list(range(settings["greenhouses"])))
+    engine.addZones(list(range(settings["zones"])), [zoneID % settings["greenhouses"] for zoneID in range(settings["zones"])])
+    return engine
+
+
+def run(settings):
+    """
+    Step the simulation engine for many greenhouses and zones and return the time per step.
+
+    Parameters:
+        settings (dict): settings of the simulation benchmark.
+
+    Returns:
+        dict: size of the simulation and time per step.
+    """
+    engine = createEngine(settings)
+    # half of the greenhouses and zones are actuated, so that every branch of the step is used
+    engine.heating[::4] = True
+    engine.cooling[1::4] = True
+    engine.irrigation[::2] = True
+
+    start = time.perf_counter()
+    for _ in range(settings["steps"]):
+        engine.step()
+    elapsed = time.perf_counter() - start
+
+    # the same seed gives the same simulation
+    replay = createEngine(settings)
+    replay.heating[::4] = True
+    replay.cooling[1::4] = True
+    replay.irrigation[::2] = True
+    for _ in range(settings["steps"]):
+        replay.step()
+
+    return {
+        "model": engine.model.name,
+        "greenhouses": settings["greenhouses"],
+        "zones": settings["zones"],
+        "steps": settings["steps"],
+        "stepTime": elapsed / settings["steps"],
+        "zonesPerSecond": round(settings["zones"] * settings["steps"] / elapsed),
+        "reproducible": bool(np.array_equal(engine.temperature, replay.temperature) and np.array_equal(engine.moisture, replay.moisture))
+    }
+
+
+def runControlLoop(settings, temperatureRange, moistureRange):
+    """
+    Run the threshold control of all the greenhouses and zones on the simulation, faster than real time,
+    and return the share of the time spent in the ranges.
+
+    Parameters:
+        settings (dict): settings of the simulation benchmark.
+        temperatureRange (dict): min and max temperature of the greenhouses.
+        moistureRange (dict): min and max moisture of the zones.
+
+    Returns:
+        dict: simulated duration, speed-up over real time and share of the time in the ranges.
+    """
+    engine = createEngine(settings)
+    steps = int(settings["simulatedHours"] * 3600 / engine.dt)
+    inRangeTemperature = 0
+    inRangeMoisture = 0
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        temperature = engine.temperature
+        engine.heating[:] = temperature < temperatureRange["min"]
+        engine.cooling[:] = temperature > temperatureRange["max"]
+        moisture = engine.moisture
+        engine.irrigation[:] = (moisture < moistureRange["min"]) | (engine.irrigation & (moisture < moistureRange["max"]))
+        engine.step()
+        inRangeTemperature += np.count_nonzero((temperature >= temperatureRange["min"]) & (temperature <= temperatureRange["max"]))
+        inRangeMoisture += np.count_nonzero(moisture >= moistureRange["min"])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "model": engine.model.name,
+        "simulatedHours": settings["simulatedHours"],
+        "dt": engine.dt,
+        "speedUp": round(settings["simulatedHours"] * 3600 / elapsed),
+        "temperatureInRange": round(inRangeTemperature / (steps * len(engine.temperature)), 3),
+        "moistureInRange": round(inRangeMoisture / (steps * len(engine.moisture)), 3)
+    }
+
+
+if __name__ == "__main__":
+    settings = json.load(open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json")))
+    results = run(settings["simulation"])
+    results["controlLoop"] = runControlLoop(settings["simulation"], settings["temperatureRange"], settings["moistureRange"])
+    print(json.dumps(results, indent=4))
@@ -1,6 +1,8 @@
 import cherrypy
+import collections
 import json
-import time
+import uuid
+from clock import clock
 
 class CatalogREST(object):
     exposed = True
@@ -15,6 +17,52 @@ class CatalogREST(object):
         self.catalog_address = catalog_address
         self.catalog = json.load(open(self.catalog_address, "r"))
         self.inactive_threshold = 80 # devices and services who have not updated their registration for 80 s are consider inactive
+
+        # Log of the last changes of the greenhouses and zones, for the processes polling the catalog for changes
+        # (the epoch identifies this run of the catalog, the versions restart at each run)
+        self.epoch = str(uuid.uuid4())
+        self.version = 0
+        self.changes = collections.deque(maxlen=1000)
+
+    # - Changes
+
+    def record_change(self, action, greenhouseID, zoneID=None):
+        """
+        Record the addition, removal or update of a greenhouse or zone in the log of changes.
+
+        Parameters:
+            action (str): "added", "removed" or "updated".
+            greenhouseID (int): ID of the greenhouse (of the zone).
+            zoneID (int): ID of the zone, if the change is about a zone.
+        """
+
+        self.version += 1
+        change = {"version": self.version, "action": action, "greenhouseID": greenhouseID}
+        if zoneID is not None:
+            change["zoneID"] = zoneID
+        self.changes.append(change)
+
+    def get_changes(self, params):
+        """
+        Return the changes of the greenhouses and zones since a version.
+        If these changes are no longer in the log, or if the version is from a previous run of the catalog,
+        reset is true and the client has to read the full list of greenhouses again.
+
+        Parameters:
+            params (dict): parameters of the request (containing the version and epoch last seen by the client, or nothing to get only the current version).
+
+        Returns:
+            dict: dictionnary containing the epoch, the current version, the changes and the reset flag.
+        """
+
+        output = {"epoch": self.epoch, "version": self.version, "changes": [], "reset": False}
+        if 'since' in params:
+            since = int(params['since'])
+            if params.get('epoch') != self.epoch or since > self.version or since < self.version - len(self.changes):
+                output["reset"] = True
+            else:
+                output["changes"] = [change for change in self.changes if change["version"] > since]
+        return output
     
     # - Users
 
@@ -142,11 +190,11 @@ class CatalogREST(object):
         Remove inactive devices from the services list.
         """
 
-        current_time = time.time()
+        current_time = clock.time()
         devices_removed = []
         for device in self.catalog["devicesList"]:
-            last_update = device["lastUpdate"]
-            if (current_time - last_update) < self.inactive_threshold:
+            last_update = clock.strptime(device["lastUpdate"], "%Y-%m-%d %H:%M:%S")
+            if (current_time - last_update) > self.inactive_threshold:
                 deviceID = device["deviceID"]
                 self.remove_device(deviceID)
                 devices_removed.append(deviceID)
@@ -210,7 +258,7 @@ class CatalogREST(object):
             str: success message.
         """
 
-        self.catalog["servicesList"] = [s for s in self.catalog["servicesList"] if s["ID"] != resource_id]
+        self.catalog["servicesList"] = [s for s in self.catalog["servicesList"] if s["serviceID"] != resource_id]
         return f"Service with ID {resource_id} has been removed"
 
     def clean_services(self):
@@ -218,11 +266,11 @@ class CatalogREST(object):
         Remove inactive services from the services list.
         """
 
-        current_time = time.time()
+        current_time = clock.time()
         services_removed = []
         for service in self.catalog["servicesList"]:
-            last_update = service["lastUpdate"]
-            if (current_time - last_update) < self.inactive_threshold:
+            last_update = clock.strptime(service["lastUpdate"], "%Y-%m-%d %H:%M:%S")
+            if (current_time - last_update) > self.inactive_threshold:
                 serviceID = service["serviceID"]
                 self.remove_service(serviceID)
                 services_removed.append(serviceID)
@@ -260,6 +308,7 @@ class CatalogREST(object):
         user = next((u for u in self.catalog["usersList"] if u["userID"] == userID), None)
         greenhouse = {"greenhouseID": greenhouseID}
         user["greenhouses"].append(greenhouse)
+        self.record_change("added", greenhouseID)
         return f"Greenhouse with ID {dict_body['greenhouseID']} has been added"
 
     def update_greenhouse(self, dict_body, last_update):
@@ -323,6 +372,7 @@ class CatalogREST(object):
             if "greenhouses" in u and resource in u["greenhouses"]:
                 u["greenhouses"].remove(resource)
 
+        self.record_change("removed", resource_id)
         return f"Greenhouse with ID {resource_id} has been removed"
 
     def get_greenhouse(self, params):
@@ -428,6 +478,7 @@ class CatalogREST(object):
             # Add the zone id in the greenhouse zones list
             zone = {"zoneID": dict_body["zoneID"]}
             greenhouse["zones"].append(zone)
+            self.record_change("added", greenhouseID, dict_body["zoneID"])
             return f"Zone with ID {dict_body['zoneID']} added to Greenhouse {greenhouseID}"
 
     def update_zone(self, dict_body, params, last_update):
@@ -456,7 +507,7 @@ class CatalogREST(object):
         new_range = dict_body["temperatureRange"]
         existing_zones = self.get_zones_of_greenhouse(greenhouseID)
         if existing_zones:
-            overlap = self.check_range_overlap(existing_zones, new_range)
+            overlap = self.check_range_overlap(existing_zones, new_range, dict_body["zoneID"])
         else:
             overlap = True
         
@@ -473,6 +524,7 @@ class CatalogREST(object):
                 dict_body if z["zoneID"] == dict_body["zoneID"] else z 
                 for z in self.catalog["zonesList"]
             ]
+            self.record_change("updated", greenhouseID, dict_body["zoneID"])
             return f"Zone with ID {dict_body['zoneID']} updated successfully"
 
     def update_moisture_threshold(self, dict_body, last_update):
@@ -508,6 +560,8 @@ class CatalogREST(object):
         if valid_threshold:
             zone['lastUpdate'] = last_update
             zone["moistureThreshold"] = new_threshold
+            greenhouse = next((gh for gh in self.catalog["greenhousesList"] if any(z["zoneID"] == zoneID for z in gh.get("zones", []))), None)
+            self.record_change("updated", greenhouse["greenhouseID"] if greenhouse else None, zoneID)
             return f"Moisture theshold of zone {dict_body['zoneID']} updated successfully"
 
     def remove_zone(self, resource_id):
@@ -535,10 +589,14 @@ class CatalogREST(object):
         self.catalog["zonesList"] = [z for z in self.catalog["zonesList"] if z["zoneID"] != resource_id]
 
         # Remove zone ID from any greenhouse's zones
+        greenhouseID = None
         for gh in self.catalog["greenhousesList"]:
             resource = {"zoneID": resource_id}
             if "zones" in gh and resource in gh["zones"]:
                 gh["zones"].remove(resource)
+                greenhouseID = gh["greenhouseID"]
+
+        self.record_change("removed", greenhouseID, resource_id)
 
         return f"Zone with ID {resource_id} has been deleted and removed from its greenhouse"
 
@@ -612,22 +670,27 @@ class CatalogREST(object):
         zone_ids = [zone["zoneID"] for zone in zone_ids_dict]
         return [zone for zone in self.catalog["zonesList"] if zone["zoneID"] in zone_ids]
 
-    def check_range_overlap(self, existing_zones, zone_temp_range):
+    def check_range_overlap(self, existing_zones, zone_temp_range, zoneID=None):
         """
         Check that the provided range overlaps with all existing ranges.
 
         Parameters:
             zone_temp_range (dict): dictionnary containing the minimum and maximum temperature allowed for the zone.
             existing_zones (list): list of dictionnaries containing the minimum and maximum temperature for the other zones of the greenhouse.
+            zoneID (int): ID of the checked zone when it is updated, its current range is not compared with the new one.
 
         Returns:
             boolean: true if the ranges overlap, false otherwise.
         """
 
         for existing_zone in existing_zones:
+            if zoneID is not None and existing_zone["zoneID"] == zoneID:
+                continue
             existing_range = existing_zone["temperatureRange"]
             overlap = not (zone_temp_range["max"] < existing_range["min"] or zone_temp_range["min"] > existing_range["max"])
-            return overlap
+            if not overlap:
+                return False
+        return True
 
     def check_moisture_threshold(self, dict_body):
         """
@@ -654,6 +717,57 @@ class CatalogREST(object):
             raise cherrypy.HTTPError(400, f"Zone {dict_body['zoneID']}: moistureThreshold must be provided")
         return valid_threshold
 
+    # - Bulk
+
+    def add_bulk(self, dict_body, last_update):
+        """
+        Add many users, greenhouses and zones at once (e.g. a generated fleet), the catalog being saved only once.
+        The greenhouses and zones are checked as when they are added one by one: IDs not already registered,
+        temperature ranges overlapping within each greenhouse and valid moisture thresholds.
+
+        Parameters:
+            dict_body (dict): lists "usersList", "greenhousesList" and "zonesList" to add, the users listing their greenhouses and the greenhouses their zones.
+            last_update (str): formatted timestamp of the update.
+
+        Returns:
+            str: success message.
+        """
+
+        users = dict_body.get("usersList", [])
+        greenhouses = dict_body.get("greenhousesList", [])
+        zones = dict_body.get("zonesList", [])
+
+        # Check that none of the IDs is already registered
+        for list_name, id_name, new_items in (("usersList", "userID", users), ("greenhousesList", "greenhouseID", greenhouses), ("zonesList", "zoneID", zones)):
+            existing_ids = {item[id_name] for item in self.catalog[list_name]}
+            new_ids = [item[id_name] for item in new_items]
+            if len(set(new_ids)) != len(new_ids) or existing_ids.intersection(new_ids):
+                raise cherrypy.HTTPError(400, f'{id_name.upper()} ALREADY REGISTERED')
+
+        # Check the zones of each greenhouse
+        zones_by_id = {zone["zoneID"]: zone for zone in zones}
+        for greenhouse in greenhouses:
+            greenhouse_zones = []
+            for zone_id in greenhouse.get("zones", []):
+                zone = zones_by_id.get(zone_id["zoneID"])
+                if zone is None:
+                    raise cherrypy.HTTPError(400, f'Zone {zone_id["zoneID"]} of greenhouse {greenhouse["greenhouseID"]} not provided')
+                self.check_moisture_threshold(zone)
+                if not self.check_range_overlap(greenhouse_zones, zone["temperatureRange"]):
+                    raise cherrypy.HTTPError(400, f'Temperature range of zone {zone["zoneID"]} does NOT overlap with the other zones: {zone["temperatureRange"]}')
+                greenhouse_zones.append(zone)
+
+        for item in users + greenhouses + zones:
+            item["lastUpdate"] = last_update
+        self.catalog["usersList"].extend(users)
+        self.catalog["greenhousesList"].extend(greenhouses)
+        self.catalog["zonesList"].extend(zones)
+        for greenhouse in greenhouses:
+            self.record_change("added", greenhouse["greenhouseID"])
+            for zone_id in greenhouse.get("zones", []):
+                self.record_change("added", greenhouse["greenhouseID"], zone_id["zoneID"])
+        return f"{len(users)} users, {len(greenhouses)} greenhouses and {len(zones)} zones have been added"
+
     # - Users
 
     def add_user(self, dict_body, last_update):
@@ -734,6 +848,7 @@ class CatalogREST(object):
             'zonesID': returns the list of zones ID in the requested greenhouse.
             'zones': returns the list of all zones, of zones in the requested greenhouse or a list containing the requested zone, depending on the params.
             'users': returns the list of all users.
+            'changes': returns the changes of the greenhouses and zones since the requested version.
 
         Parameters:
             uri (list): uri of the request.
@@ -766,6 +881,9 @@ class CatalogREST(object):
 
         elif uri[0] == 'users':
             output = self.get_users(params)
+
+        elif uri[0] == 'changes':
+            output = self.get_changes(params)
             
         else:
             raise cherrypy.HTTPError(400, 'INVALID ENDPOINT')
@@ -780,6 +898,7 @@ class CatalogREST(object):
             'greenhouses': add a greenhouse in the list of greenhouses and to the requested user's greenhouses.
             'zones': add a zone the list of zones and to the requested greenhouse's zones.
             'users': add a user to the list of users.
+            'bulk': add many users, greenhouses and zones at once.
 
         Parameters:
             uri (list): uri of the request.
@@ -791,7 +910,7 @@ class CatalogREST(object):
 
         body = cherrypy.request.body.read()
         dict_body = json.loads(body.decode('utf-8'))
-        last_update = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        last_update = clock.strftime("%Y-%m-%d %H:%M:%S")
 
         if uri[0] == 'devices':
             output = self.add_device(dict_body, params, last_update)
@@ -807,6 +926,9 @@ class CatalogREST(object):
             
         elif uri[0] == 'users':
             output = self.add_user(dict_body, last_update)
+
+        elif uri[0] == 'bulk':
+            output = self.add_bulk(dict_body, last_update)
             
         else:
             raise cherrypy.HTTPError(400, 'INVALID ENDPOINT')
@@ -840,7 +962,7 @@ class CatalogREST(object):
 
         body = cherrypy.request.body.read()
         dict_body = json.loads(body.decode('utf-8'))
-        last_update = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        last_update = clock.strftime("%Y-%m-%d %H:%M:%S")
 
         if uri[0] == 'devices':
             output = self.update_device(dict_body, last_update)
@@ -914,7 +1036,7 @@ class CatalogREST(object):
             raise cherrypy.HTTPError(400, 'Invalid resource type for DELETE')
 
         # Update the catalog's lastUpdate field
-        self.catalog["lastUpdate"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        self.catalog["lastUpdate"] = clock.strftime("%Y-%m-%d %H:%M:%S")
 
         # Save updated catalog
         with open(self.catalog_address, "w") as f:
@@ -928,20 +1050,21 @@ if __name__ == '__main__':
     conf = {
         '/': {
             'request.dispatch': cherrypy.dispatch.MethodDispatcher(),
-            'tools.sessions.on': True
+            'tools.sessions.on': True,
+            # ETag of each response, a GET with a matching If-None-Match gets 304 Not Modified without the body
+            'tools.etags.on': True,
+            'tools.etags.autotags': True
         }
     }
     cherrypy.config.update({'server.socket_host': '0.0.0.0', 'server.socket_port': 80})
     cherrypy.tree.mount(catalogClient, '/', conf)
-    cherrypy.engine.start()
-    cherrypy.engine.block()
-    cherrypy.engine.exit()
-    print("Catalog running...")
 
-    # Keep script running
-    while True:
-        time.sleep(80)
-        
-        # Remove the services and devices that have been inactive for too long
+    # Every 80 s (of the clock), remove the services and devices that have been inactive for too long
+    def clean_inactive():
         catalogClient.clean_services()
-        catalogClient.clean_devices()
\ No newline at end of file
+        catalogClient.clean_devices()
+    cherrypy.process.plugins.Monitor(cherrypy.engine, clean_inactive, frequency=clock.realSeconds(80)).subscribe()
+
+    cherrypy.engine.start()
+    print("Catalog running...")
+    cherrypy.engine.block()
\ No newline at end of file
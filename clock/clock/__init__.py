@@ -0,0 +1,6 @@
+# clock shared by all the services of the Smart Greenhouse: use clock.time(), clock.sleep(), clock.now()
+# and clock.strftime() instead of the time and datetime modules so that the whole system can run on
+# a virtual clock, faster than real time (see createClock for the configuration)
+from .clocks import Clock, VirtualClock, clock, createClock
+
+__all__ = ["Clock", "VirtualClock", "clock", "createClock"]
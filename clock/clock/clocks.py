@@ -0,0 +1,65 @@
+import datetime
+import os
+import time
+
+
+class Clock:
+    # real time
+    speed = 1
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self.time())
+
+    def localtime(self):
+        return time.localtime(self.time())
+
+    def strftime(self, format):
+        return time.strftime(format, self.localtime())
+
+    def strptime(self, value, format):
+        # timestamp of a date formatted with strftime
+        return time.mktime(time.strptime(value, format))
+
+    def realSeconds(self, seconds):
+        # real duration of a duration of the clock
+        return seconds / self.speed
+
+
+class VirtualClock(Clock):
+    # virtual time running speed times faster than the real time: it is equal to the real time at origin
+    # (a timestamp), so the processes configured with the same speed and origin share the same virtual time
+    # without communicating
+    def __init__(self, speed, origin=None):
+        self.speed = speed
+        # by default the origin is the start of the current day (UTC), the same for all the processes started that day
+        self.origin = origin if origin is not None else time.time() // 86400 * 86400
+
+    def time(self):
+        return self.origin + (time.time() - self.origin) * self.speed
+
+    def sleep(self, seconds):
+        time.sleep(seconds / self.speed)
+
+
+def createClock(settings=None):
+    # create the clock from settings {"mode": "real" or "virtual", "speed": N, "origin": timestamp},
+    # the environment variables CLOCK_MODE, CLOCK_SPEED and CLOCK_ORIGIN take precedence over them
+    settings = settings or {}
+    mode = os.environ.get("CLOCK_MODE") or settings.get("mode", "real")
+    if mode == "real":
+        return Clock()
+    if mode != "virtual":
+        raise ValueError(f"Unknown clock mode: {mode}")
+    speed = float(os.environ.get("CLOCK_SPEED") or settings.get("speed", 1))
+    origin = os.environ.get("CLOCK_ORIGIN") or settings.get("origin")
+    return VirtualClock(speed, float(origin) if origin is not None else None)
+
+
+# clock of the process, configured from the environment
+clock = createClock()
@@ -1,8 +1,8 @@
 import json
 import requests
 import uuid
-import time
-from MyMQTT import *
+from clock import clock
+from mymqtt import ActuatorState, CatalogWatcher, MyMQTT
 
 class CoolingHeatingActuator:
 
@@ -22,23 +22,30 @@ class CoolingHeatingActuator:
 
         self.greenhouseID = greenhouseID
         self.heatingcoolingTopic = self.settings["heatingcoolingTopic"].format(greenhouseID=self.greenhouseID)
-        self.status = self.settings["deviceInfo"]["status"]
+        # The state changes are published (retained) on the state topic, with the energy usage metrics
+        self.stateTopic = self.settings["stateTopic"].format(greenhouseID=self.greenhouseID)
+        self.state = ActuatorState(("off", "heating", "cooling"), self.settings["deviceInfo"]["status"], ("heating", "cooling"), clock.time())
         
-        self.deviceInfo = self.settings["deviceInfo"]
+        self.deviceInfo = self.settings["deviceInfo"].copy() # each actuator registers its own copy
 
         self.deviceID = f"TemperatureActuator{self.greenhouseID}"  # example: TemperatureActuator1
 
-        self.mqttClient = MyMQTT(clientID=str(uuid.uuid1()), broker=self.broker, port=self.port, notifier=self)
+        self.mqttClient = MyMQTT(clientID=str(uuid.uuid1()), broker=self.broker, port=self.port, notifier=self, options=self.settings.get("mqttOptions"), name=self.deviceID)
 
         self.start()
         self.registerDevice() # register the device in the catalog
+        self.publishState()
+
+    @property
+    def status(self):
+        return self.state.state
 
     def registerDevice(self):
         """
         Register the device in the catalog.
         """  
         try:   
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.deviceInfo["lastUpdate"] = actualTime
             self.deviceInfo["deviceID"] = self.deviceID
             params = {"greenhouseID": self.greenhouseID}
@@ -54,8 +61,13 @@ class CoolingHeatingActuator:
         Update the device registration in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.deviceInfo["lastUpdate"] = actualTime
+            # The registration also reports the state and the time spent heating or cooling
+            snapshot = self.state.snapshot(clock.time())
+            self.deviceInfo["status"] = snapshot["state"]
+            self.deviceInfo["onTime"] = snapshot["onTime"]
+            self.deviceInfo["dutyCycle"] = snapshot["dutyCycle"]
             response = requests.put(f"{self.catalogURL}/devices", data=json.dumps(self.deviceInfo))
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
@@ -70,28 +82,35 @@ class CoolingHeatingActuator:
         
         Parameters:
             topic (str): topic of the message.
-            payload (json): payload of the message.
+            payload (dict): decoded payload of the message.
         """
         try:
-            data = json.loads(payload)
+            data = payload
             command = data.get("command")
 
+            if command not in self.state.states:
+                print(f"[Greenhouse {self.greenhouseID}] Unknown command received: {command}")
+                return
+            # A command equal to the current state is ignored, only the transitions are handled and published
+            if not self.state.apply(command, clock.time()):
+                return
+
             if command == "heating":
-                self.status = "heating"
                 print(f"[Greenhouse {self.greenhouseID}] Heating is ON.")
             elif command == "cooling":
-                self.status = "cooling"
                 print(f"[Greenhouse {self.greenhouseID}] Cooling is ON.")
-            elif command == "off":
-                self.status = "off"
-                print(f"[Greenhouse {self.greenhouseID}] Actuators are OFF.")
             else:
-                print(f"[Greenhouse {self.greenhouseID}] Unknown command received: {command}")
-        except json.JSONDecodeError:
-            print(f"[Greenhouse {self.greenhouseID}] Error in the format of the MQTT message.")
+                print(f"[Greenhouse {self.greenhouseID}] Actuators are OFF.")
+            self.publishState()
         except Exception as e:
             print(f"[Greenhouse {self.greenhouseID}] Error in the message: {e}")
 
+    def publishState(self):
+        """
+        Publish the state of the actuator with its cumulative heating and cooling times and duty cycle.
+        """
+        self.mqttClient.myPublish(self.stateTopic, self.state.snapshot(clock.time()))
+
     def start(self):
         """
         Start the MQTT client and subscribe to the topic.
@@ -108,29 +127,32 @@ class CoolingHeatingActuator:
 if __name__ == "__main__":
     settings = json.load(open("settings.json"))
 
-    try:
-        response = requests.get(f"{settings['catalogURL']}/greenhouses")
-        greenhouses = response.json().get('greenhousesList', [])
-    except Exception as e:
-        print(f"Error fetching greenhouses: {e}")
-        greenhouses = []
-
-    actuators = [] 
-    for greenhouse in greenhouses:
-        greenhouseID = greenhouse["greenhouseID"]
-        actuator = CoolingHeatingActuator(settings, greenhouseID)
-        actuators.append(actuator)
+    actuators = {} # greenhouseID: actuator
+
+    def addActuator(greenhouseID):
+        actuators[greenhouseID] = CoolingHeatingActuator(settings, greenhouseID)
+
+    def removeActuator(greenhouseID):
+        actuator = actuators.pop(greenhouseID, None)
+        if actuator is not None:
+            actuator.stop()
+
+    # the actuators follow the greenhouses added and removed in the catalog, checked at every loop
+    watcher = CatalogWatcher(settings['catalogURL'], onGreenhouseAdded=addActuator, onGreenhouseRemoved=removeActuator)
+    watcher.poll()
 
     print("Actuator control systems started...") 
 
     try:
         while True:
-            for actuator in actuators:
-                time.sleep(5)
+            watcher.poll()
+            # all the heartbeats in one pass, then a fixed sleep: every actuator is updated every 15 s whatever
+            # their number, well within the 80 s after which the catalog removes the inactive devices
+            for actuator in list(actuators.values()):
                 actuator.updateDevice()
 
-            time.sleep(10)
+            clock.sleep(15)
     except KeyboardInterrupt:
         print("Stopping actuators...")
-        for actuator in actuators:
-            actuator.stop()
\ No newline at end of file
+        for actuator in actuators.values():
+            actuator.stop()
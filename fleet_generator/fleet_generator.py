@@ -0,0 +1,156 @@
+import json
+import random
+import string
+import requests
+
+class FleetGenerator:
+
+    def __init__(self, settings):
+        """
+        Initialize FleetGenerator.
+
+        Parameters:
+            settings (dict): Settings of FleetGenerator.
+        """
+        self.settings = settings
+        self.catalogURL = settings["catalogURL"]
+        self.users = settings["users"]
+        self.greenhousesPerUser = settings["greenhousesPerUser"] # {"min", "max"}
+        self.zonesPerGreenhouse = settings["zonesPerGreenhouse"] # {"min", "max"}
+        self.plants = settings["plants"] # plant types with their ideal temperature and moisture threshold
+        self.firstIDs = settings["firstIDs"] # first user, greenhouse and zone IDs, above the ones already in the catalog
+        self.maxZoneFields = settings.get("maxZoneFields", 5) # the zones are uploaded on the fields 4 to 8 of the channel
+        self.random = random.Random(settings.get("seed")) # same seed, same fleet
+
+    def randomKey(self):
+        return "".join(self.random.choice(string.ascii_uppercase + string.digits) for _ in range(16))
+
+    def generateZones(self, firstZoneID):
+        """
+        Generate the zones of a greenhouse.
+        The temperature ranges of the zones all contain a common temperature of the greenhouse,
+        so that they overlap two by two as required by the catalog.
+
+        Parameters:
+            firstZoneID (int): ID of the first zone.
+
+        Returns:
+            list: generated zones.
+        """
+        numberZones = self.random.randint(self.zonesPerGreenhouse["min"], self.zonesPerGreenhouse["max"])
+        commonTemperature = round(self.random.uniform(18, 24), 1)
+        zones = []
+        for i in range(numberZones):
+            plant = self.random.choice(self.plants)
+            temperatureMin = round(min(plant["temperature"] - 3, commonTemperature - self.random.uniform(0.5, 3)), 1)
+            temperatureMax = round(max(plant["temperature"] + 3, commonTemperature + self.random.uniform(0.5, 3)), 1)
+            zone = {
+                "zoneID": firstZoneID + i,
+                "zoneName": f"Zone{firstZoneID + i}",
+                "plantType": plant["plantType"],
+                "temperatureRange": {
+                    "min": temperatureMin,
+                    "max": temperatureMax
+                },
+                "moistureThreshold": float(plant["moistureThreshold"]),
+                "devices": []
+            }
+            if i < self.maxZoneFields:
+                zone["thingspeakFieldID"] = 4 + i
+            zones.append(zone)
+        return zones
+
+    def generate(self):
+        """
+        Generate the fleet: users, their greenhouses and the zones of the greenhouses.
+
+        Returns:
+            dict: lists "usersList", "greenhousesList" and "zonesList" of the fleet.
+        """
+        fleet = {"usersList": [], "greenhousesList": [], "zonesList": []}
+        greenhouseID = self.firstIDs["greenhouseID"]
+        zoneID = self.firstIDs["zoneID"]
+        for userID in range(self.firstIDs["userID"], self.firstIDs["userID"] + self.users):
+            user = {"userID": userID, "userName": f"User{userID}", "greenhouses": []}
+            for _ in range(self.random.randint(self.greenhousesPerUser["min"], self.greenhousesPerUser["max"])):
+                zones = self.generateZones(zoneID)
+                greenhouse = {
+                    "greenhouseID": greenhouseID,
+                    "greenhouseName": f"Greenhouse{greenhouseID}",
+                    "zones": [{"zoneID": zone["zoneID"]} for zone in zones],
+                    "devices": [],
+                    # synthetic channel, so that the Thingspeak adaptor does not create real ones
+                    "thingspeakChannel": {
+                        "channelID": greenhouseID,
+                        "channelWriteAPIkey": self.randomKey(),
+                        "channelReadAPIkey": self.randomKey(),
+                        "numberZoneFields": min(len(zones), self.maxZoneFields)
+                    }
+                }
+                user["greenhouses"].append({"greenhouseID": greenhouseID})
+                fleet["greenhousesList"].append(greenhouse)
+                fleet["zonesList"].extend(zones)
+                greenhouseID += 1
+                zoneID += len(zones)
+            fleet["usersList"].append(user)
+        return fleet
+
+    def saveCatalog(self, fleet, path):
+        """
+        Write a catalog file containing only the fleet, to start a catalog from it.
+
+        Parameters:
+            fleet (dict): generated fleet.
+            path (str): path of the catalog file.
+        """
+        catalog = {
+            "projectOwner": "Group06",
+            "projectName": "SmartGreenhouse",
+            "servicesList": [],
+            "devicesList": [],
+            "usersList": fleet["usersList"],
+            "zonesList": fleet["zonesList"],
+            "greenhousesList": fleet["greenhousesList"],
+            "lastUpdate": ""
+        }
+        with open(path, "w") as f:
+            json.dump(catalog, f, indent=4)
+
+    def bulkLoad(self, fleet, chunkSize=100):
+        """
+        Load the fleet in a running catalog, chunkSize users (with their greenhouses and zones) per request.
+
+        Parameters:
+            fleet (dict): generated fleet.
+            chunkSize (int): number of users per request.
+        """
+        greenhouses = {greenhouse["greenhouseID"]: greenhouse for greenhouse in fleet["greenhousesList"]}
+        zones = {zone["zoneID"]: zone for zone in fleet["zonesList"]}
+        for start in range(0, len(fleet["usersList"]), chunkSize):
+            users = fleet["usersList"][start:start + chunkSize]
+            chunkGreenhouses = [greenhouses[g["greenhouseID"]] for user in users for g in user["greenhouses"]]
+            chunkZones = [zones[z["zoneID"]] for greenhouse in chunkGreenhouses for z in greenhouse["zones"]]
+            body = {"usersList": users, "greenhousesList": chunkGreenhouses, "zonesList": chunkZones}
+            try:
+                response = requests.post(f"{self.catalogURL}/bulk", data=json.dumps(body))
+                response.raise_for_status()
+                print(response.json()["message"])
+            except requests.exceptions.HTTPError as e:
+                print(f"Error raised by catalog while loading users {users[0]['userID']} to {users[-1]['userID']}: {e.response.status_code} - {e.args[0]}")
+                return
+            except Exception as e:
+                print(f"Error loading the fleet in the catalog: {e}")
+                return
+
+if __name__ == "__main__":
+    settings = json.load(open("settings.json"))
+    fleet_generator = FleetGenerator(settings)
+    fleet = fleet_generator.generate()
+    print(f"Generated {len(fleet['usersList'])} users, {len(fleet['greenhousesList'])} greenhouses and {len(fleet['zonesList'])} zones")
+
+    if settings.get("outputPath"):
+        fleet_generator.saveCatalog(fleet, settings["outputPath"])
+        print(f"Catalog written to {settings['outputPath']}")
+
+    if settings.get("bulkLoad", False):
+        fleet_generator.bulkLoad(fleet, settings.get("chunkSize", 100))
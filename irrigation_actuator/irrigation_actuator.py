@@ -1,7 +1,7 @@
 import json
 import requests
-import time
-import MyMQTT
+from clock import clock
+from mymqtt import ActuatorState, CatalogWatcher, MyMQTT
 import uuid
 
 class IrrigationActuator:
@@ -21,23 +21,30 @@ class IrrigationActuator:
         self.broker = settings["brokerIP"]
         self.port = settings["brokerPort"]
         self.catalog_url = settings["catalogURL"]
-        self.client = MyMQTT.MyMQTT(self.clientID, self.broker, self.port, self)
         self.irrigation_topic = settings["irrigationTopic"].format(greenhouseID=greenhouseID, zoneID=zoneID)
         self.device_info = settings['deviceInfo'].copy()
         self.deviceID = f"IrrigationActuator{zoneID}" 
         self.device_info['deviceID'] = self.deviceID
-        self.irrigation_status = "OFF"
+        self.client = MyMQTT(self.clientID, self.broker, self.port, self, settings.get("mqttOptions"), self.deviceID)
+        #the state changes are published (retained) on the state topic, with the water usage metrics
+        self.state_topic = settings["stateTopic"].format(greenhouseID=greenhouseID, zoneID=zoneID)
+        self.state = ActuatorState(("OFF", "ON"), "OFF", ("ON",), clock.time())
         self.zone_id = zoneID
         self.greenhouse_id = greenhouseID
         self.start()
         self.registerDevice()
+        self.publishState()
+
+    @property
+    def irrigation_status(self):
+        return self.state.state
 
     def registerDevice(self):
         """
         Register the device in the catalog.
         """  
         try:   
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.device_info["lastUpdate"] = actualTime
             params = {"zoneID": self.zone_id}
             response = requests.post(f"{self.catalog_url}/devices", params=params, data=json.dumps(self.device_info))
@@ -52,8 +59,13 @@ class IrrigationActuator:
         Update the device registration in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.device_info["lastUpdate"] = actualTime
+            #the registration also reports the state and the time spent irrigating
+            snapshot = self.state.snapshot(clock.time())
+            self.device_info["status"] = snapshot["state"]
+            self.device_info["onTime"] = snapshot["onTime"]
+            self.device_info["dutyCycle"] = snapshot["dutyCycle"]
             response = requests.put(f"{self.catalog_url}/devices", data=json.dumps(self.device_info))
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
@@ -68,25 +80,35 @@ class IrrigationActuator:
         
         Parameters:
             topic (str): topic of the message.
-            payload (json): payload of the message.
+            payload (dict): decoded payload of the message.
         """
+        zone_id = topic.split("/")[-2]
+        greenhouse_id = topic.split("/")[-3]
         try:
-            message = json.loads(payload)
-            zone_id = topic.split("/")[-2]
-            greenhouse_id = topic.split("/")[-2]
+            message = payload
             command = message.get("command")
-            
+
+            if command not in self.state.states:
+                print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Invalid command received: {command}")
+                return
+            #a command equal to the current state is ignored, only the transitions are handled and published
+            if not self.state.apply(command, clock.time()):
+                return
+
             if command == "ON":
                 print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Irrigation started")
-                self.irrigation_status = "ON"
-            elif command == "OFF":
-                print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Irrigation stopped")
-                self.irrigation_status = "OFF"
             else:
-                print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Invalid command received: {command}")
+                print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Irrigation stopped")
+            self.publishState()
         except (ValueError, KeyError) as e:
             print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Error processing message: {e}")
 
+    def publishState(self):
+        """
+        Publish the state of the actuator with its cumulative irrigation time and duty cycle.
+        """
+        self.client.myPublish(self.state_topic, self.state.snapshot(clock.time()))
+
     def start(self):
         """
         Start the MQTT client and subscribe to the topic.
@@ -103,29 +125,31 @@ class IrrigationActuator:
 if __name__ == "__main__":
     with open("settings.json", "r") as f:
         config = json.load(f)
-    try:
-        greenhouses = requests.get(f"{config['catalogURL']}/greenhouses").json().get('greenhousesList', [])
-    except Exception as e:
-        print(f"Error in retreiving greenhouses: {e}")
-        greenhouses = []
-
-    actuators = []
-    for greenhouse in greenhouses:
-        greenhouse_id = greenhouse["greenhouseID"]
-        for zone in greenhouse.get("zones", []):
-            zone_id = zone["zoneID"]
-            actuator = IrrigationActuator(config, greenhouse_id, zone_id)
-            actuators.append(actuator)
+
+    actuators = {} #(greenhouse_id, zone_id): actuator
+
+    def add_actuator(greenhouse_id, zone_id):
+        actuators[(greenhouse_id, zone_id)] = IrrigationActuator(config, greenhouse_id, zone_id)
+
+    def remove_actuator(greenhouse_id, zone_id):
+        actuator = actuators.pop((greenhouse_id, zone_id), None)
+        if actuator is not None:
+            actuator.stop()
+
+    #the actuators follow the zones added and removed in the catalog, checked at every loop
+    watcher = CatalogWatcher(config['catalogURL'], onZoneAdded=add_actuator, onZoneRemoved=remove_actuator)
+    watcher.poll()
     
     print("Irrigation actuators on.")
 
     try:
         while True:
-            time.sleep(10)
-            for actuator in actuators:
+            clock.sleep(10)
+            watcher.poll()
+            for actuator in list(actuators.values()):
                 actuator.updateDevice()
 
     except KeyboardInterrupt:
         print("Stopping Irrigation Actuators...")
-        for actuator in actuators:
+        for actuator in actuators.values():
             actuator.stop()
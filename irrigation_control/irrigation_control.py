@@ -1,7 +1,8 @@
 import json
 import requests
-import MyMQTT
-import time
+from mymqtt import CatalogCache, CatalogWatcher, LatestValues, MyMQTT
+from clock import clock
+import numpy as np
 import uuid
 
 class IrrigationControl:
@@ -19,41 +20,170 @@ class IrrigationControl:
         self.broker = settings["brokerIP"]
         self.port = settings["brokerPort"]
         self.serviceInfo = settings["serviceInfo"]
-        self.client = MyMQTT.MyMQTT(self.client_id, self.broker, self.port, self)
+        self.client = MyMQTT(self.client_id, self.broker, self.port, self, settings.get("mqttOptions"), self.serviceInfo["serviceName"])
         self.irrigation_topic = settings["irrigationTopic"]
         self.moisture_topic = settings["moistureTopic"]
+        self.senml_pack_topic = settings.get("senmlPackTopic")
         self.catalog_url = settings["catalogURL"]
+        self.controlled_zones = {} #(greenhouse_id, zone_id): last moisture level controlled
+        # In batch mode the readings are only stored in the table of the last moisture levels, and the commands of all
+        # the zones with new readings are decided together once per tick by evaluate(), only the changes are published
+        self.batch_settings = settings.get("batch", {"enabled": False})
+        self.latest_moisture = LatestValues()
+        self.zone_commands = {} #(greenhouse_id, zone_id): last command published
+
+        # The moisture thresholds of the zones are kept in memory, one entry per greenhouse, read with one request for
+        # all its zones and revalidated with ETags after ttl seconds; if the catalog cannot be reached the last known
+        # thresholds are used. The greenhouses are prefetched at the first poll of the watcher, and fetched again when
+        # their zones change: all the requests are done by the main loop, the messages are controlled from memory
+        cache_settings = settings.get("thresholdCache", {})
+        self.threshold_cache = CatalogCache(self.catalog_url, cache_settings.get("ttl", 600), cache_settings.get("maxEntries", 1024))
+        self.stale_greenhouses = set() # greenhouses whose thresholds have to be fetched by prefetch_thresholds()
+        self.watcher = CatalogWatcher(self.catalog_url,
+                                      onGreenhouseAdded=self.mark_stale,
+                                      onGreenhouseRemoved=self.remove_greenhouse,
+                                      onZoneAdded=lambda greenhouseID, zoneID: self.mark_stale(greenhouseID),
+                                      onZoneRemoved=lambda greenhouseID, zoneID: self.mark_stale(greenhouseID),
+                                      onZoneUpdated=lambda greenhouseID, zoneID: self.mark_stale(greenhouseID))
         self.start()
         self.registerService()
 
     def get_zone_threshold(self, greenhouseID, zoneID):
         """
-        Get the moisture threshold of the zone from the catalog.
+        Get the moisture threshold of the zone from the table of the thresholds.
 
         Params:
             greenhouseID (int): ID of the greenhouse in which the zone is.
             zoneID (int): ID of the zone whose moisture threshold we want to get.
 
         Returns:
-            float: moisture threshold of the zone.
+            float: moisture threshold of the zone (None if unknown).
+        """
+        threshold = self.get_zone_thresholds(greenhouseID).get(str(zoneID))
+        if threshold is None:
+            # The zone may have been added after the last fetch, the greenhouse is fetched again by the main loop
+            self.mark_stale(greenhouseID)
+        return threshold
+
+    def get_zone_thresholds(self, greenhouseID):
+        """
+        Get the moisture thresholds of all the zones of the greenhouse from memory, without requests to the catalog.
+        A greenhouse not fetched yet is marked to be fetched by the main loop.
+
+        Params:
+            greenhouseID (int): ID of the greenhouse whose zones we want the thresholds of.
+
+        Returns:
+            dict: moisture threshold of each zone of the greenhouse, by zone ID (empty if unknown).
+        """
+        thresholds = self.threshold_cache.peek(str(greenhouseID))
+        if thresholds is None:
+            self.mark_stale(greenhouseID)
+            return {}
+        return thresholds
+
+    def fetch_thresholds(self, greenhouseID):
+        """
+        Get the moisture thresholds of the zones of the greenhouse from the catalog with one request, if they are
+        not cached or expired (conditional GET). If the catalog cannot be reached, the last known thresholds are kept.
+
+        Params:
+            greenhouseID (int): ID of the greenhouse whose zones we want the thresholds of.
         """
         try:
-            params = {"zoneID": zoneID}
-            response = requests.get(f"{self.catalog_url}/zones", params=params).json()
-            zone = response.get('zonesList', [])[0]
-            threshold = zone.get('moistureThreshold', 0)
-            print(f"[Greenhouse {greenhouseID} zone {zoneID}] Moisture threshold {threshold} %")
-            return threshold
+            params = {"greenhouseID": greenhouseID}
+            self.threshold_cache.get(str(greenhouseID), "zones", params, lambda data: self.parse_thresholds(greenhouseID, data))
         except Exception as e:
-            print(f"[Greenhouse {greenhouseID} zone {zoneID}] Error fetching catalog: {e}")
-        return 0
+            print(f"[Greenhouse {greenhouseID}] Error fetching catalog: {e}")
+
+    def parse_thresholds(self, greenhouseID, data):
+        """
+        Get the moisture thresholds of the zones from the response of the catalog.
+
+        Params:
+            greenhouseID (int): ID of the greenhouse.
+            data (dict): response of the catalog with the zones of the greenhouse.
+
+        Returns:
+            dict: moisture threshold of each zone, by zone ID.
+        """
+        thresholds = {str(zone["zoneID"]): zone["moistureThreshold"] for zone in data.get('zonesList', []) if "moistureThreshold" in zone}
+        print(f"[Greenhouse {greenhouseID}] Moisture thresholds {thresholds}")
+        return thresholds
+
+    def mark_stale(self, greenhouseID):
+        """
+        Mark the thresholds of the greenhouse to be fetched again by the main loop (greenhouse added, zones changed in
+        the catalog or zone unknown), the messages are still controlled with the last known thresholds until then.
+
+        Params:
+            greenhouseID (int): ID of the greenhouse.
+        """
+        self.stale_greenhouses.add(str(greenhouseID))
+
+    def prefetch_thresholds(self):
+        """
+        Fetch the thresholds of the greenhouses marked as stale, and revalidate those older than the ttl, from the
+        main loop: the handling of the messages never waits for the catalog. The zones whose threshold changed are
+        controlled again with their last moisture levels, since with report-by-exception sensors no new reading may
+        come for a long time.
+
+        Returns:
+            int: number of zones controlled again.
+        """
+        changed = []
+        stale = list(self.stale_greenhouses)
+        for greenhouseID in stale:
+            self.stale_greenhouses.discard(greenhouseID)
+            previous = self.threshold_cache.peek(greenhouseID)
+            self.threshold_cache.invalidate(greenhouseID)
+            self.fetch_thresholds(greenhouseID)
+            changed.extend(self.changed_zones(greenhouseID, previous))
+        for greenhouseID in list(self.watcher.greenhouses):
+            if str(greenhouseID) not in stale:
+                previous = self.threshold_cache.peek(str(greenhouseID))
+                self.fetch_thresholds(greenhouseID)
+                changed.extend(self.changed_zones(str(greenhouseID), previous))
+        return self.control_zones(changed, [self.controlled_zones[zone] for zone in changed], changes_only=True)
+
+    def changed_zones(self, greenhouseID, previous):
+        """
+        Get the controlled zones of the greenhouse whose threshold changed since the previous thresholds.
+
+        Params:
+            greenhouseID (str): ID of the greenhouse.
+            previous (dict): previous thresholds of the zones of the greenhouse (None if unknown).
+
+        Returns:
+            list: controlled zones, as (greenhouse_id, zone_id).
+        """
+        thresholds = self.threshold_cache.peek(greenhouseID)
+        if thresholds is None or thresholds == previous:
+            return []
+        previous = previous or {}
+        return [zone for zone in list(self.controlled_zones) if zone[0] == greenhouseID and thresholds.get(zone[1]) != previous.get(zone[1])]
+
+    def remove_greenhouse(self, greenhouseID):
+        """
+        Forget the thresholds and the control state of a greenhouse removed from the catalog.
+
+        Params:
+            greenhouseID (int): ID of the removed greenhouse.
+        """
+        greenhouseID = str(greenhouseID)
+        self.threshold_cache.discard(greenhouseID)
+        self.stale_greenhouses.discard(greenhouseID)
+        for zone in [zone for zone in list(self.controlled_zones) if zone[0] == greenhouseID]:
+            self.controlled_zones.pop(zone, None)
+            self.zone_commands.pop(zone, None)
+            self.latest_moisture.discard(zone)
     
     def registerService(self):
         """
         Register the service in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.serviceInfo["lastUpdate"] = actualTime
             response = requests.post(f"{self.catalog_url}/services", data=json.dumps(self.serviceInfo))
             response.raise_for_status()
@@ -67,7 +197,7 @@ class IrrigationControl:
         Update the service registration in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.serviceInfo["lastUpdate"] = actualTime
             response = requests.put(f"{self.catalog_url}/services", data=json.dumps(self.serviceInfo))
             response.raise_for_status()
@@ -83,38 +213,88 @@ class IrrigationControl:
         
         Parameters:
             topic (str): topic of the message.
-            payload (json): payload of the message.
+            payload (dict): decoded payload of the message.
         """
         try:
-            data = json.loads(payload)
+            data = payload
             greenhouse_id = topic.split("/")[-3]
             zone_id = topic.split("/")[-2]
             moisture_level = data["v"]
-            
-            # Get the moisture threshold of the zone
-            threshold = self.get_zone_threshold(greenhouse_id, zone_id)
-
-            # If the moisture level is greater than the treshold publish the ON command
-            if moisture_level < threshold:
-                print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Moisture level {moisture_level} %, needs water!")
-                irrigation_command = {"command": "ON"}
-                self.client.myPublish(self.irrigation_topic.format(greenhouseID=greenhouse_id, zoneID=zone_id), irrigation_command)
-            
-            # If the moisture level is lower than the treshold publish the OFF command
-            else:
-                print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Moisture level {moisture_level} %, does not need water.")
-                irrigation_command = {"command": "OFF"}
-                self.client.myPublish(self.irrigation_topic.format(greenhouseID=greenhouse_id, zoneID=zone_id), irrigation_command)
-        
+            if self.batch_settings["enabled"]:
+                self.latest_moisture.put((greenhouse_id, zone_id), moisture_level, data.get("t"))
+                return
+            # The readings publish their command every time, the "still alive" markers only if it changes
+            self.control_zones([(greenhouse_id, zone_id)], [moisture_level], changes_only=data.get("alive", False))
         except Exception as e:
             print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Error processing message: {e}")
 
+    def evaluate(self):
+        """
+        Decide in one step the commands of all the zones with new moisture levels since the last tick (batch mode),
+        and publish only the commands that changed.
+
+        Returns:
+            int: number of zones evaluated.
+        """
+        zones, moisture_levels, _ = self.latest_moisture.take()
+        return self.control_zones(zones, moisture_levels, changes_only=True)
+
+    def control_zones(self, zones, moisture_levels, changes_only):
+        """
+        Decide in one step the commands of the zones against the thresholds in memory, and publish them.
+        A zone without a known threshold is not controlled.
+
+        Params:
+            zones (list): zones to control, as (greenhouse_id, zone_id), each one at most once.
+            moisture_levels (list): moisture levels of the zones.
+            changes_only (bool): publish only the commands that changed, else all of them.
+
+        Returns:
+            int: number of zones controlled.
+        """
+        if not zones:
+            return 0
+
+        # The thresholds are taken from memory once per greenhouse
+        thresholds = {}
+        for greenhouse_id in set(greenhouse_id for greenhouse_id, _ in zones):
+            thresholds[greenhouse_id] = self.get_zone_thresholds(greenhouse_id)
+        for greenhouse_id, zone_id in zones:
+            if zone_id not in thresholds[greenhouse_id]:
+                print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Moisture threshold unknown, not controlled")
+                self.mark_stale(greenhouse_id)
+        known = [i for i, (greenhouse_id, zone_id) in enumerate(zones) if zone_id in thresholds[greenhouse_id] and moisture_levels[i] is not None]
+        zones = [zones[i] for i in known]
+        moisture = np.array([moisture_levels[i] for i in known], dtype=float)
+        threshold = np.array([thresholds[greenhouse_id][zone_id] for greenhouse_id, zone_id in zones], dtype=float)
+        # -1 if no command was published yet, else 1 for ON and 0 for OFF
+        previous = np.array([{"ON": 1, "OFF": 0}.get(self.zone_commands.get(zone), -1) for zone in zones], dtype=np.int8)
+
+        # If the moisture level is lower than the threshold the command is ON, else OFF
+        on = moisture < threshold
+        publish = on.astype(np.int8) != previous if changes_only else np.ones(len(zones), dtype=bool)
+        for i in np.flatnonzero(publish):
+            greenhouse_id, zone_id = zones[i]
+            command = "ON" if on[i] else "OFF"
+            if on[i]:
+                print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Moisture level {moisture[i]} %, needs water!")
+            else:
+                print(f"[Greenhouse {greenhouse_id} zone {zone_id}] Moisture level {moisture[i]} %, does not need water.")
+            self.client.myPublish(self.irrigation_topic.format(greenhouseID=greenhouse_id, zoneID=zone_id), {"command": command})
+            self.zone_commands[zones[i]] = command
+        for zone, moisture_level in zip(zones, moisture):
+            self.controlled_zones[zone] = float(moisture_level)
+        return len(zones)
+
     def start(self):
         """
         Start the MQTT client and subscribe to the topic.
         """
         self.client.start()
         self.client.mySubscribe(self.moisture_topic)
+        # The moisture levels can also arrive in SenML packs, which are delivered reading by reading
+        if self.senml_pack_topic:
+            self.client.mySubscribe(self.senml_pack_topic)
         print("Irrigation control ON")
 
     def stop(self):
@@ -129,11 +309,25 @@ if __name__ == "__main__":
         config = json.load(f)
 
     irrigation_control = IrrigationControl(config)
+    # The first poll of the watcher lists all the greenhouses, whose thresholds are prefetched
+    irrigation_control.watcher.poll()
+    irrigation_control.prefetch_thresholds()
 
+    # In batch mode the loop runs once per tick, the commands are decided at each iteration
+    period = irrigation_control.batch_settings["tick"] if irrigation_control.batch_settings["enabled"] else 10
     try:
+        elapsed = 0
         while True:
-            time.sleep(10)
-            irrigation_control.updateService()
+            clock.sleep(period)
+            irrigation_control.watcher.poll() # mark the greenhouses whose zones changed
+            irrigation_control.prefetch_thresholds()
+            if irrigation_control.batch_settings["enabled"]:
+                irrigation_control.evaluate()
+            elapsed += period
+            # Every 10s
+            if elapsed >= 10:
+                irrigation_control.updateService()
+                elapsed = 0
     except KeyboardInterrupt:
         irrigation_control.stop()
         print("\nExit...")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the tests import the service from its folder, and the clock and mymqtt packages from the sources
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(ROOT, "irrigation_control"))
+sys.path.insert(0, os.path.join(ROOT, "clock"))
+sys.path.insert(0, os.path.join(ROOT, "mymqtt"))
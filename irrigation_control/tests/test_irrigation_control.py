@@ -0,0 +1,160 @@
+import json
+import os
+
+import pytest
+
+import irrigation_control
+import mymqtt.cache
+
+SETTINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "settings.json")
+
+
+class StubResponse:
+    def __init__(self, data=None):
+        self._data = data
+        self.status_code = 200
+        self.headers = {}
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        pass
+
+
+class StubCatalog:
+    # GET /zones of the catalog, with the moisture thresholds of the zones of each greenhouse
+    def __init__(self):
+        self.thresholds = {}  # greenhouseID: {zoneID: threshold}
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        greenhouseID = int(params["greenhouseID"])
+        self.requests.append(greenhouseID)
+        zones = self.thresholds.get(greenhouseID, {})
+        return StubResponse({"zonesList": [{"zoneID": zoneID, "moistureThreshold": threshold} for zoneID, threshold in zones.items()]})
+
+
+class StubMQTT:
+    # MQTT client of the service, the published commands are recorded
+    def __init__(self, *args, **kwargs):
+        self.published = []
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def mySubscribe(self, topic):
+        pass
+
+    def myPublish(self, topic, message):
+        self.published.append((topic, message["command"]))
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    catalog = StubCatalog()
+    monkeypatch.setattr(mymqtt.cache.requests, "get", catalog.get)
+    monkeypatch.setattr(irrigation_control.requests, "post", lambda *args, **kwargs: StubResponse())
+    monkeypatch.setattr(irrigation_control.requests, "put", lambda *args, **kwargs: StubResponse())
+    monkeypatch.setattr(irrigation_control, "MyMQTT", StubMQTT)
+    return catalog
+
+
+def createControl(batch=False):
+    with open(SETTINGS) as f:
+        settings = json.load(f)
+    settings["batch"] = {"enabled": batch, "tick": 2}
+    return irrigation_control.IrrigationControl(settings)
+
+
+def reading(control, greenhouseID, zoneID, moisture, **fields):
+    control.notify(f"group06/SmartGreenhouse/{greenhouseID}/{zoneID}/moisture", dict({"v": moisture, "t": 0}, **fields))
+
+
+def topic(greenhouseID, zoneID):
+    return f"group06/SmartGreenhouse/{greenhouseID}/{zoneID}/irrigation"
+
+
+def test_unknown_threshold_is_not_controlled_until_fetched_by_the_main_loop(catalog):
+    catalog.thresholds = {1: {1: 30}}
+    control = createControl()
+
+    # nothing in memory: the zone is not controlled and the message does not wait for the catalog
+    assert control.get_zone_thresholds("1") == {}
+    reading(control, 1, 1, 20)
+    assert control.client.published == [] and catalog.requests == []
+    assert control.stale_greenhouses == {"1"}
+
+    control.prefetch_thresholds()
+    assert catalog.requests == [1] and control.stale_greenhouses == set()
+    reading(control, 1, 1, 20)
+    reading(control, 1, 1, 40)
+    assert control.client.published == [(topic(1, 1), "ON"), (topic(1, 1), "OFF")]
+    assert catalog.requests == [1]
+
+
+def test_zone_unknown_in_a_known_greenhouse_is_fetched_again(catalog):
+    catalog.thresholds = {1: {1: 30}}
+    control = createControl()
+    control.mark_stale(1)
+    control.prefetch_thresholds()
+
+    # zone added after the fetch
+    assert control.get_zone_threshold(1, 2) is None
+    reading(control, 1, 2, 20)
+    assert control.client.published == [] and control.stale_greenhouses == {"1"}
+
+    catalog.thresholds[1][2] = 50
+    control.prefetch_thresholds()
+    reading(control, 1, 2, 40)
+    assert control.client.published == [(topic(1, 2), "ON")]
+
+
+def test_changed_threshold_is_applied_to_the_last_moisture_level(catalog):
+    catalog.thresholds = {1: {1: 30, 2: 30}}
+    control = createControl()
+    control.mark_stale(1)
+    control.prefetch_thresholds()
+    reading(control, 1, 1, 40)
+    reading(control, 1, 2, 40)
+    control.client.published.clear()
+
+    # no new reading comes (report by exception), the zone whose threshold changed is controlled again
+    catalog.thresholds[1][1] = 50
+    control.mark_stale(1)
+    assert control.prefetch_thresholds() == 1
+    assert control.client.published == [(topic(1, 1), "ON")]
+
+
+def test_alive_marker_publishes_only_a_changed_command(catalog):
+    catalog.thresholds = {1: {1: 30}}
+    control = createControl()
+    control.mark_stale(1)
+    control.prefetch_thresholds()
+    reading(control, 1, 1, 40)
+    reading(control, 1, 1, 39, alive=True)
+    assert control.client.published == [(topic(1, 1), "OFF")]
+    reading(control, 1, 1, 29, alive=True)
+    assert control.client.published == [(topic(1, 1), "OFF"), (topic(1, 1), "ON")]
+
+
+def test_batch_evaluation_publishes_only_the_changes(catalog):
+    catalog.thresholds = {1: {1: 30, 2: 30}}
+    control = createControl(batch=True)
+    control.mark_stale(1)
+    control.prefetch_thresholds()
+    reading(control, 1, 1, 20)
+    reading(control, 1, 2, 40)
+    reading(control, 1, 3, 40)  # unknown zone: not controlled
+    assert control.client.published == []
+    assert control.evaluate() == 2
+    assert sorted(control.client.published) == [(topic(1, 1), "ON"), (topic(1, 2), "OFF")]
+
+    reading(control, 1, 1, 25)
+    reading(control, 1, 2, 20)
+    assert control.evaluate() == 2
+    assert control.client.published[2:] == [(topic(1, 2), "ON")]
+    assert catalog.requests == [1]
@@ -0,0 +1,369 @@
+import asyncio
+import json
+import struct
+import threading
+
+# MQTT 3.1.1 control packet types
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def topic_matches(topicFilter, topic):
+    """
+    Check if a topic matches a subscription filter, with the + and # wildcards.
+    The topics starting with $ are not matched by a filter starting with a wildcard.
+
+    Parameters:
+        topicFilter (str): subscription filter.
+        topic (str): topic of a published message.
+
+    Returns:
+        boolean: true if the topic matches the filter, false otherwise.
+    """
+    if topic.startswith("$") and topicFilter[:1] in ("+", "#"):
+        return False
+    filterLevels = topicFilter.split("/")
+    topicLevels = topic.split("/")
+    for i, level in enumerate(filterLevels):
+        if level == "#":
+            return True
+        if i >= len(topicLevels):
+            return False
+        if level != "+" and level != topicLevels[i]:
+            return False
+    return len(filterLevels) == len(topicLevels)
+
+
+def encode_string(value):
+    data = value.encode("utf-8")
+    return struct.pack("!H", len(data)) + data
+
+
+def encode_packet(packetType, flags, body):
+    # fixed header: type and flags, then the remaining length as a variable length integer
+    header = bytearray([(packetType << 4) | flags])
+    length = len(body)
+    while True:
+        byte = length % 128
+        length //= 128
+        header.append(byte | 0x80 if length > 0 else byte)
+        if length == 0:
+            break
+    return bytes(header) + body
+
+
+class Session:
+    """
+    Connection of a client to the broker (the sessions are always clean).
+    """
+
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.clientID = None
+        self.keepalive = 0
+        self.subscriptions = {}  # filter: granted QoS
+        self.will = None  # (topic, payload, qos, retain)
+        self.awaitingRelease = set()  # ids of the received QoS 2 messages waiting for PUBREL
+        self.inflight = {}  # ids of the sent QoS 1 and 2 messages waiting for their acknowledgement
+        self._nextPacketID = 1
+
+    def nextPacketID(self):
+        packetID = self._nextPacketID
+        self._nextPacketID = packetID % 65535 + 1
+        return packetID
+
+    def send(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def deliver(self, topic, payload, qos, retain=False):
+        # send a PUBLISH to the client, with the QoS granted to it
+        body = encode_string(topic)
+        if qos > 0:
+            packetID = self.nextPacketID()
+            self.inflight[packetID] = qos
+            body += struct.pack("!H", packetID)
+        self.send(encode_packet(PUBLISH, (qos << 1) | int(retain), body + payload))
+        self.broker.delivered += 1
+
+    async def readPacket(self):
+        # read the fixed header, the remaining length and the body of a packet
+        first = await self.reader.readexactly(1)
+        multiplier, length = 1, 0
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await self.reader.readexactly(length) if length else b""
+        return first[0] >> 4, first[0] & 0x0F, body
+
+    async def run(self):
+        clean = False
+        try:
+            packetType, flags, body = await asyncio.wait_for(self.readPacket(), timeout=10)
+            if packetType != CONNECT:
+                return
+            self.handleConnect(body)
+            while True:
+                # the client is disconnected if nothing is received for 1.5 times the keepalive
+                timeout = self.keepalive * 1.5 if self.keepalive else None
+                packetType, flags, body = await asyncio.wait_for(self.readPacket(), timeout=timeout)
+                if packetType == DISCONNECT:
+                    clean = True
+                    break
+                self.handlePacket(packetType, flags, body)
+                if self.writer.transport.get_write_buffer_size() > 1024 * 1024:
+                    await self.writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError, IndexError, struct.error):
+            pass
+        finally:
+            self.broker.removeSession(self)
+            # the will message is published if the client did not disconnect properly
+            if not clean and self.will is not None:
+                self.broker.publish(*self.will)
+            self.writer.close()
+
+    def handleConnect(self, body):
+        position = 0
+        nameLength = struct.unpack_from("!H", body, position)[0]
+        position += 2 + nameLength
+        connectFlags = body[position + 1]
+        self.keepalive = struct.unpack_from("!H", body, position + 2)[0]
+        position += 4
+        values = []
+        # client id, will topic, will message, user name, password
+        fields = [True, bool(connectFlags & 0x04), bool(connectFlags & 0x04), bool(connectFlags & 0x80), bool(connectFlags & 0x40)]
+        for present in fields:
+            if not present:
+                values.append(None)
+                continue
+            length = struct.unpack_from("!H", body, position)[0]
+            values.append(body[position + 2:position + 2 + length])
+            position += 2 + length
+        self.clientID = values[0].decode("utf-8")
+        if connectFlags & 0x04:
+            self.will = (values[1].decode("utf-8"), values[2], (connectFlags >> 3) & 0x03, bool(connectFlags & 0x20))
+        self.broker.addSession(self)
+        # session present = 0, return code = 0 (accepted)
+        self.send(encode_packet(CONNACK, 0, b"\x00\x00"))
+
+    def handlePacket(self, packetType, flags, body):
+        if packetType == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            retain = bool(flags & 0x01)
+            topicLength = struct.unpack_from("!H", body)[0]
+            topic = body[2:2 + topicLength].decode("utf-8")
+            position = 2 + topicLength
+            if qos > 0:
+                packetID = struct.unpack_from("!H", body, position)[0]
+                position += 2
+            payload = body[position:]
+            if qos == 0:
+                self.broker.publish(topic, payload, qos, retain)
+            elif qos == 1:
+                self.broker.publish(topic, payload, qos, retain)
+                self.send(encode_packet(PUBACK, 0, struct.pack("!H", packetID)))
+            else:
+                # the message is delivered once, the retries with the same id are only acknowledged
+                if packetID not in self.awaitingRelease:
+                    self.awaitingRelease.add(packetID)
+                    self.broker.publish(topic, payload, qos, retain)
+                self.send(encode_packet(PUBREC, 0, struct.pack("!H", packetID)))
+
+        elif packetType == PUBREL:
+            packetID = struct.unpack_from("!H", body)[0]
+            self.awaitingRelease.discard(packetID)
+            self.send(encode_packet(PUBCOMP, 0, body[:2]))
+
+        elif packetType == PUBACK or packetType == PUBCOMP:
+            self.inflight.pop(struct.unpack_from("!H", body)[0], None)
+
+        elif packetType == PUBREC:
+            self.send(encode_packet(PUBREL, 0x02, body[:2]))
+
+        elif packetType == SUBSCRIBE:
+            packetID = body[:2]
+            position = 2
+            granted = bytearray()
+            newFilters = []
+            while position < len(body):
+                length = struct.unpack_from("!H", body, position)[0]
+                topicFilter = body[position + 2:position + 2 + length].decode("utf-8")
+                qos = min(body[position + 2 + length] & 0x03, 2)
+                position += 3 + length
+                self.subscriptions[topicFilter] = qos
+                granted.append(qos)
+                newFilters.append((topicFilter, qos))
+            self.broker.subscriptionsChanged()
+            self.send(encode_packet(SUBACK, 0, packetID + bytes(granted)))
+            # send the retained messages matching the new subscriptions
+            for topicFilter, qos in newFilters:
+                for topic, (payload, retainedQoS) in list(self.broker.retained.items()):
+                    if topic_matches(topicFilter, topic):
+                        self.deliver(topic, payload, min(qos, retainedQoS), True)
+
+        elif packetType == UNSUBSCRIBE:
+            position = 2
+            while position < len(body):
+                length = struct.unpack_from("!H", body, position)[0]
+                self.subscriptions.pop(body[position + 2:position + 2 + length].decode("utf-8"), None)
+                position += 2 + length
+            self.broker.subscriptionsChanged()
+            self.send(encode_packet(UNSUBACK, 0, body[:2]))
+
+        elif packetType == PINGREQ:
+            self.send(encode_packet(PINGRESP, 0, b""))
+
+
+class LocalBroker:
+    """
+    Lightweight in-process MQTT 3.1.1 broker, implementing the subset used by MyMQTT:
+    QoS 0, 1 and 2, + and # wildcards, retained messages, will messages and keepalive.
+    It can replace the public broker for the tests and the benchmarks, without network.
+    """
+
+    def __init__(self, host="127.0.0.1", port=1883):
+        """
+        Initialize LocalBroker.
+
+        Parameters:
+            host (str): address on which the broker listens.
+            port (int): port on which the broker listens (0 to use a free port).
+        """
+        self.host = host
+        self.port = port
+        self.sessions = {}  # clientID: session
+        self.retained = {}  # topic: (payload, qos)
+        self.received = 0
+        self.delivered = 0
+        self._routes = {}  # cache of the subscribers of each topic
+        self._tasks = set()  # tasks of the connections of the clients
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    def addSession(self, session):
+        # a new connection with the same client id replaces the previous one
+        previous = self.sessions.get(session.clientID)
+        if previous is not None and previous is not session:
+            previous.writer.close()
+        self.sessions[session.clientID] = session
+        self.subscriptionsChanged()
+
+    def removeSession(self, session):
+        if self.sessions.get(session.clientID) is session:
+            del self.sessions[session.clientID]
+            self.subscriptionsChanged()
+
+    def subscriptionsChanged(self):
+        self._routes = {}
+
+    def route(self, topic):
+        # return the sessions subscribed to a topic with the maximum QoS of their matching subscriptions
+        routes = self._routes.get(topic)
+        if routes is None:
+            routes = []
+            for session in self.sessions.values():
+                qos = max((q for f, q in session.subscriptions.items() if topic_matches(f, topic)), default=None)
+                if qos is not None:
+                    routes.append((session, qos))
+            self._routes[topic] = routes
+        return routes
+
+    def publish(self, topic, payload, qos, retain=False):
+        """
+        Publish a message to the subscribers of its topic.
+
+        Parameters:
+            topic (str): topic of the message.
+            payload (bytes): payload of the message.
+            qos (int): QoS of the message.
+            retain (boolean): true if the message has to be retained (an empty payload removes the retained message).
+        """
+        self.received += 1
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        for session, subscriptionQoS in self.route(topic):
+            session.deliver(topic, payload, min(qos, subscriptionQoS))
+
+    async def _handleClient(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            await Session(self, reader, writer).run()
+        except asyncio.CancelledError:
+            # cancelled by stop(): the task ends normally, asyncio reports the connection tasks ended by an error
+            pass
+        finally:
+            self._tasks.discard(task)
+
+    async def start(self):
+        """
+        Start listening in the running event loop.
+        """
+        self._server = await asyncio.start_server(self._handleClient, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"Local broker listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        """
+        Close the server and the connections of the clients.
+        """
+        self._server.close()
+        for session in list(self.sessions.values()):
+            session.writer.close()
+        # the tasks of the connections are cancelled and awaited, so none is left pending when the loop stops
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def startInThread(self):
+        """
+        Run the broker in its own event loop in a background thread, returns once it is listening.
+
+        Returns:
+            LocalBroker: the broker, with its actual port.
+        """
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stopThread(self):
+        """
+        Stop the broker started with startInThread.
+        """
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+if __name__ == "__main__":
+    settings = json.load(open("settings.json"))
+    broker = LocalBroker(settings["host"], settings["port"])
+
+    async def main():
+        await broker.start()
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Local broker stopped")
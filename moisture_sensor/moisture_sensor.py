@@ -1,13 +1,15 @@
 import json
+import os
 import time
-import random
 import requests
 import uuid
-from MyMQTT import MyMQTT
+from clock import clock
+from mymqtt import CatalogWatcher, MyMQTT, ReportByException, SenMLPacker, WindowStats
+from simulator import HashRing, Scheduler, ShardedRunner, SimulationEngine, TopicRouter, TraceWriter, clientCounters, createModel
 
 class MoistureSensor:
 
-    def __init__(self, settings, greenhouse_id, zone_id):
+    def __init__(self, settings, greenhouse_id, zone_id, packer=None, engine=None, recorder=None, client=None):
         """
         Initialize MoistureSensor.
         
@@ -15,6 +17,12 @@ class MoistureSensor:
             settings (dict): Settings of MoistureSensor.
             greenhouse_id (int): ID of the greenhouse in which the sensor is.
             zone°id (int): ID of the zone in which the sensor is.
+            packer (SenMLPacker): SenML packer of the greenhouse, if the readings are published in packs.
+            engine (SimulationEngine): engine simulating all the zones, stepped by the caller
+                (if not given, the sensor has its own engine and steps it at each reading).
+            recorder (TraceWriter): trace in which the published readings are recorded, if any.
+            client (MyMQTT): client shared by the sensors of the process, started and subscribed by the caller,
+                which delivers the commands to the sensor (if not given, the sensor has its own client).
         """
 
         self.settings = settings
@@ -23,15 +31,32 @@ class MoistureSensor:
 
         self.device_id = f"MoistureSensor{zone_id}"
         self.device_info['deviceID'] = self.device_id
-        self.moisture_level = random.randint(30, 60)
-        self.irrigation_on = False
+        #the state of the zone is kept by the simulation engine, the sensor is a view on its index
+        self.own_engine = engine is None
+        self.engine = engine if engine is not None else SimulationEngine(startTime=clock.time())
+        self.engine.addZone((greenhouse_id, zone_id), greenhouse_id)
 
         self.mqtt_broker = settings['brokerIP']
         self.mqtt_port = settings['brokerPort']
         self.moisture_topic = settings['moistureTopic'].format(greenhouseID=greenhouse_id, zoneID=zone_id)
         self.irrigation_topic = settings['irrigationTopic'].format(greenhouseID=greenhouse_id, zoneID=zone_id)
-        self.client_id = str(uuid.uuid1())
-        self.client = MyMQTT(self.client_id, self.mqtt_broker, self.mqtt_port, self)
+        self.own_client = client is None
+        if self.own_client:
+            self.client_id = str(uuid.uuid1())
+            self.client = MyMQTT(self.client_id, self.mqtt_broker, self.mqtt_port, self, settings.get("mqttOptions"), self.device_id)
+        else:
+            self.client = client
+        self.packer = packer
+        self.recorder = recorder
+        #if enabled, only the moisture levels that changed more than the deadband are published, with a "still alive"
+        #marker after maxSilence seconds without changes
+        report_settings = settings.get("reportByException", {})
+        self.reporter = None
+        if report_settings.get("enabled", False):
+            self.reporter = ReportByException(report_settings["deadband"]["moisture"], report_settings["maxSilence"])
+        #if enabled, the moisture is sampled at every sample period and the mean, min, max and count of the
+        #samples of the window are published at every publish period
+        self.window = WindowStats() if settings.get("aggregation", {}).get("enabled", False) else None
 
         self.zone_id = zone_id
         self.greenhouse_id = greenhouse_id
@@ -52,7 +77,7 @@ class MoistureSensor:
         Register the device in the catalog.
         """  
         try:   
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.device_info["lastUpdate"] = actualTime
             params = {"zoneID": self.zone_id}
             response = requests.post(f"{self.catalog_url}/devices", params=params, data=json.dumps(self.device_info))
@@ -67,7 +92,7 @@ class MoistureSensor:
         Update the device registration in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.device_info["lastUpdate"] = actualTime
             response = requests.put(f"{self.catalog_url}/devices", data=json.dumps(self.device_info))
             response.raise_for_status()
@@ -83,78 +108,229 @@ class MoistureSensor:
         
         Parameters:
             topic (str): topic of the message.
-            payload (json): payload of the message.
+            payload (dict): decoded payload of the message.
         """
         try:
-            message = json.loads(payload)
+            message = payload
             self.irrigation_on = (message.get("command") == "ON")
         except Exception as e:
             print(f"[Greenhouse {self.greenhouse_id} zone {self.zone_id}] Error in message processing: {e}")
             
+    @property
+    def index(self):
+        #index of the zone in the engine, it changes when other zones are removed
+        return self.engine.zoneIndex((self.greenhouse_id, self.zone_id))
+
+    @property
+    def irrigation_on(self):
+        return bool(self.engine.irrigation[self.index])
+
+    @irrigation_on.setter
+    def irrigation_on(self, value):
+        self.engine.irrigation[self.index] = value
+
+    @property
+    def moisture_level(self):
+        return float(self.engine.moisture[self.index])
+
     def update_moisture(self):
         """
         Update the moisture level of the zone with respect to the irrigation status.
         """
-        if self.irrigation_on:
-            self.moisture_level = min(100, self.moisture_level + 10)
-        else:
-            self.moisture_level = max(0, self.moisture_level - random.randint(1, 3))
+        if self.own_engine:
+            self.engine.step()
         return round(self.moisture_level, 2)
 
     def startSim(self):
         """
-        Start the MQTT client and subscribe to the topic.
+        Start the MQTT client and subscribe to the topic (unless the client is shared).
         """
-        self.client.start()
-        self.client.mySubscribe(self.irrigation_topic)
+        if self.own_client:
+            self.client.start()
+            self.client.mySubscribe(self.irrigation_topic)
 
     def stopSim(self):
         """
-        Stop the MQTT client.
+        Stop the MQTT client (unless the client is shared).
+        """
+        if self.own_client:
+            self.client.stop()
+
+    def sample(self):
+        """
+        Update the moisture level of the zone and add it to the statistics of the window.
         """
-        self.client.stop()
+        self.window.add(self.update_moisture())
 
     def publish(self):
         """
-        Update the moisture level of the zone and publish it. 
+        Update the moisture level of the zone and publish it, or the aggregates of the window if the moisture is sampled.
         """
-        moisture = self.update_moisture()
         message = self._message.copy()
+        window = self.window.take() if self.window is not None else None
+        if window is not None:
+            moisture = round(window["mean"], 2)
+            message["min"] = window["min"]
+            message["max"] = window["max"]
+            message["count"] = window["count"]
+        else:
+            moisture = self.update_moisture()
         message["v"] = moisture
-        message["t"] = time.time()
-        self.client.myPublish(self.moisture_topic, message) # publish the moisture
-        print(f"[Greenhouse {self.greenhouse_id} zone {self.zone_id}] Published moisture {moisture} %") # print the complete message
+        message["t"] = clock.time()
+        if self.reporter is not None:
+            report = self.reporter.check(moisture, message["t"])
+            if report is None:
+                return #the moisture has not changed enough to be published
+            if report == "alive":
+                message["alive"] = True
+        if self.recorder is not None:
+            self.recorder.record(message["t"], self.moisture_topic, message) #record the reading in the trace
+        if self.packer is not None:
+            self.packer.add(self.moisture_topic, message) # buffer the moisture in the pack of the greenhouse
+            print(f"[Greenhouse {self.greenhouse_id} zone {self.zone_id}] Buffered moisture {moisture} %")
+        else:
+            self.client.myPublish(self.moisture_topic, message) # publish the moisture
+            print(f"[Greenhouse {self.greenhouse_id} zone {self.zone_id}] Published moisture {moisture} %") # print the complete message
 
-if __name__ == '__main__':
-    with open('settings.json') as f:
-        settings = json.load(f)
+def run(settings, shard=0, shards=1, statsQueue=None):
+    """
+    Run the moisture sensors of the zones of the greenhouses of a shard, until interrupted.
+    The zones are sharded by greenhouse, so that the readings of a greenhouse are packed by one process.
 
-    try:
-        #make a list of greenhouses from the catalog
-        greenhouses = requests.get(f"{settings['catalogURL']}/greenhouses").json().get('greenhousesList', [])
-    except Exception as e:
-        print(f"Error in retreiving greenhouses: {e}")
-        greenhouses = []
-
-    sensors = []
-    #for each greenhouse, take the relative zones and for each zone create a moisture sensor
-    for greenhouse in greenhouses:
-        greenhouse_id = greenhouse["greenhouseID"]
-        for zone in greenhouse.get('zones', []):
-            zone_id = zone['zoneID']
-            sensor = MoistureSensor(settings, greenhouse_id, zone_id)
-            sensors.append(sensor)
-
-    print("Moisture sensors on.")
+    Parameters:
+        settings (dict): settings of the sensors.
+        shard (int): index of the shard whose greenhouses are simulated by this process.
+        shards (int): number of shards (processes) of the fleet.
+        statsQueue (multiprocessing.Queue): queue in which the stats of the process are put, if run by a ShardedRunner.
+    """
+    shard_settings = settings.get("sharding", {})
+    ring = HashRing(shards, shard_settings.get("replicas", 100))
+
+    #the sensors of the process share one MQTT client, which delivers the commands to the sensor of their zone
+    router = TopicRouter()
+    client = MyMQTT(str(uuid.uuid1()), settings['brokerIP'], settings['brokerPort'], router, settings.get("mqttOptions"), f"MoistureSensors{shard}")
+    client.start()
+    client.mySubscribe(settings['irrigationTopic'].format(greenhouseID="+", zoneID="+"))
+
+    #if enabled, the readings of all the zones of a greenhouse are published in SenML packs
+    pack_settings = settings.get("senmlPack", {})
+
+    #the moistures of all the zones of the shard are simulated together by one engine, with the model of the settings
+    simulation_settings = settings.get("simulation", {})
+    model = createModel(simulation_settings.get("model", "randomWalk"), simulation_settings.get("parameters"))
+    seed = simulation_settings.get("seed")
+    start_time = clock.time()
+    engine = SimulationEngine(seed + shard if seed is not None else None, model, simulation_settings.get("dt", 15), start_time)
+    time_scale = simulation_settings.get("timeScale", 1)
+
+    def simulated_time():
+        #the simulation follows the clock (timeScale times faster), so the time of the engine and the time of the
+        #readings do not drift apart when the jobs are late
+        return start_time + (clock.time() - start_time) * time_scale
+
+    #if enabled, the published readings are recorded in a trace file (one per shard), to be replayed later
+    trace_settings = settings.get("trace", {})
+    recorder = None
+    if trace_settings.get("enabled", False):
+        root, extension = os.path.splitext(trace_settings["path"])
+        recorder = TraceWriter(f"{root}.shard{shard}{extension}" if shards > 1 else trace_settings["path"])
+
+    #each sensor publishes its moisture and updates its registration in the catalog at its own period
+    schedule_settings = settings["schedule"]
+    scheduler = Scheduler(schedule_settings["workers"], clock.speed)
+
+    sensors = {} #(greenhouse_id, zone_id): sensor
+    packers = {} #greenhouse_id: packer shared by the zones of the greenhouse
+    jobs = {} #(greenhouse_id, zone_id): scheduled jobs of the sensor
+
+    #if the readings are aggregated, the simulation advances and all the sensors sample at every sample period,
+    #otherwise the simulation advances at every publish period (timeScale times faster than the clock if > 1)
+    aggregation_settings = settings.get("aggregation", {})
+    if aggregation_settings.get("enabled", False):
+        sample_period = aggregation_settings["samplePeriod"]
+        def sample_all():
+            engine.advanceTo(simulated_time())
+            for sensor in list(sensors.values()):
+                sensor.sample()
+        scheduler.every(sample_period, sample_all, 0, "sampling")
+    else:
+        scheduler.every(schedule_settings["publishPeriod"], lambda: engine.advanceTo(simulated_time()), 0, "simulation step")
+
+    def add_sensor(greenhouse_id, zone_id):
+        #create a sensor for a new zone, if its greenhouse belongs to the shard
+        if ring.shardOf(greenhouse_id) != shard:
+            return
+        packer = None
+        if pack_settings.get("enabled", False):
+            if greenhouse_id not in packers:
+                packers[greenhouse_id] = SenMLPacker(client, pack_settings["packTopic"].format(greenhouseID=greenhouse_id), pack_settings["flushInterval"], pack_settings["maxRecords"])
+            packer = packers[greenhouse_id]
+        sensor = MoistureSensor(settings, greenhouse_id, zone_id, packer, engine, recorder, client)
+        sensors[(greenhouse_id, zone_id)] = sensor
+        router.add(sensor.irrigation_topic, sensor)
+        jobs[(greenhouse_id, zone_id)] = [
+            scheduler.every(schedule_settings["publishPeriod"], sensor.publish, schedule_settings["jitter"], f"{sensor.device_id} publish"),
+            scheduler.every(schedule_settings["heartbeatPeriod"], sensor.updateDevice, schedule_settings["jitter"], f"{sensor.device_id} update")
+        ]
+        print(f"[Greenhouse {greenhouse_id} - Zone {zone_id}] Moisture sensor created")
+
+    def remove_sensor(greenhouse_id, zone_id):
+        #stop the sensor of a removed zone
+        sensor = sensors.pop((greenhouse_id, zone_id), None)
+        if sensor is None:
+            return #not in the shard
+        for job in jobs.pop((greenhouse_id, zone_id), []):
+            job.cancel()
+        router.remove(sensor.irrigation_topic)
+        sensor.stopSim()
+        engine.removeZone((greenhouse_id, zone_id)) #no longer simulated
+        #the packer is flushed when the last zone of its greenhouse is removed
+        if greenhouse_id in packers and not any(key[0] == greenhouse_id for key in sensors):
+            packers.pop(greenhouse_id).flush()
+        print(f"[Greenhouse {greenhouse_id} - Zone {zone_id}] Moisture sensor removed")
+
+    #the sensors follow the zones added and removed in the catalog
+    watcher = CatalogWatcher(settings['catalogURL'], onZoneAdded=add_sensor, onZoneRemoved=remove_sensor)
+    watcher.poll()
+    scheduler.every(schedule_settings["discoveryPeriod"], watcher.poll, 0, "discovery", schedule_settings["discoveryPeriod"])
+
+    #if run by a ShardedRunner, the stats of the process are sent to it periodically
+    if statsQueue is not None:
+        def send_stats():
+            all_jobs = [job for sensor_jobs in list(jobs.values()) for job in sensor_jobs]
+            statsQueue.put({
+                "shard": shard,
+                "sensors": len(sensors),
+                "jobRuns": sum(job.runs for job in all_jobs),
+                "jobsSkipped": sum(job.skipped for job in all_jobs),
+                "mqtt": clientCounters(client.getStats())
+            })
+        scheduler.every(shard_settings.get("statsInterval", 30), send_stats, 0, "stats")
+    scheduler.start()
+
+    print(f"Moisture sensors of shard {shard}/{shards} on.")
 
     try:
         while True:
-            for sensor in sensors:
-                time.sleep(15)
-                sensor.publish()
-                sensor.updateDevice()
-            time.sleep(10)
+            time.sleep(1)
     except KeyboardInterrupt:
         print("Sensors stopping...")
-        for sensor in sensors:
-            sensor.stopSim()
+        scheduler.stop()
+        for packer in packers.values():
+            packer.flush() #publish the readings still buffered
+        client.stop()
+        if recorder is not None:
+            recorder.close()
+
+if __name__ == '__main__':
+    with open('settings.json') as f:
+        settings = json.load(f)
+
+    #the zones are partitioned on workers processes (0 for one per core), supervised by a ShardedRunner
+    shard_settings = settings.get("sharding", {})
+    workers = shard_settings.get("workers", 1) or os.cpu_count()
+    if workers == 1:
+        run(settings)
+    else:
+        runner = ShardedRunner(run, workers, (settings,), shard_settings.get("statsInterval", 30), shard_settings.get("restartDelay", 5))
+        runner.run()
@@ -0,0 +1,28 @@
+# MQTT client shared by the services of the Smart Greenhouse:
+# - client: MyMQTT, with per-topic QoS/retain/codec policy, reconnection with backoff, offline buffer,
+#   deduplication of the readings and statistics
+# - aio: MyAsyncMQTT, asyncio variant of MyMQTT, and AsyncCatalog
+# - discovery: CatalogWatcher, keeps the devices of a process in sync with the catalog with delta polls
+# - cache: CatalogCache, TTL/LRU cache of values read from the catalog, revalidated with ETags
+# - report: ReportByException, deadband and max-silence filter of the readings published by the sensors,
+#   and WindowStats, running statistics of the readings aggregated by the sensors
+# - state: ActuatorState, state machine of an actuator with command coalescing and duty cycle
+# - latest: LatestValues, table of the last reading of each device, for the controls that work in batches
+# - codecs, senml, buffer, dedup, stats: building blocks of the client
+from .aio import AsyncCatalog, MyAsyncMQTT
+from .buffer import OfflineBuffer
+from .cache import CatalogCache
+from .client import MyMQTT
+from .codecs import CODECS, CBORCodec, JSONCodec, MsgPackCodec, StructCodec
+from .dedup import Deduplicator
+from .latest import LatestValues
+from .discovery import CatalogWatcher
+from .report import ReportByException, WindowStats
+from .senml import SenMLPacker, unpackSenML
+from .state import ActuatorState
+from .stats import MQTTStats
+
+__all__ = [
+    "MyMQTT", "MyAsyncMQTT", "AsyncCatalog", "CatalogWatcher", "CatalogCache", "LatestValues", "ReportByException", "SenMLPacker", "unpackSenML", "OfflineBuffer", "Deduplicator", "ActuatorState",
+    "MQTTStats", "WindowStats", "CODECS", "JSONCodec", "StructCodec", "MsgPackCodec", "CBORCodec"
+]
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import random
+
+import requests
+
+from .client import MyMQTT
+
+# optional asynchronous HTTP client for the catalog requests of MyAsyncMQTT
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class MyAsyncMQTT(MyMQTT):
+    # asyncio variant of MyMQTT: the network events are processed by the event loop instead of a thread,
+    # publish and subscribe are coroutines and the received messages are read with
+    # "async for topic, message in client" (the messages are decoded as for the notifiers of MyMQTT)
+    def __init__(self, clientID, broker, port, options=None, name=None, queueSize=10000):
+        super().__init__(clientID, broker, port, notifier=self, options=options, name=name)
+        # the queue, the events and the tasks are created in start(), inside the event loop
+        self.queueSize = queueSize
+        self.droppedMessages = 0
+        self._messages = None
+        self._connectedEvent = None
+        self._loop = None
+        self._task = None
+
+        # the socket of paho is watched by the event loop
+        self._paho_mqtt.on_socket_open = self._onSocketOpen
+        self._paho_mqtt.on_socket_close = self._onSocketClose
+        self._paho_mqtt.on_socket_register_write = self._onSocketRegisterWrite
+        self._paho_mqtt.on_socket_unregister_write = self._onSocketUnregisterWrite
+
+    def _onSocketOpen(self, paho_mqtt, userdata, sock):
+        self._loop.add_reader(sock, paho_mqtt.loop_read)
+
+    def _onSocketClose(self, paho_mqtt, userdata, sock):
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+
+    def _onSocketRegisterWrite(self, paho_mqtt, userdata, sock):
+        self._loop.add_writer(sock, paho_mqtt.loop_write)
+
+    def _onSocketUnregisterWrite(self, paho_mqtt, userdata, sock):
+        self._loop.remove_writer(sock)
+
+    def myOnConnect(self, paho_mqtt, userdata, flags, rc):
+        super().myOnConnect(paho_mqtt, userdata, flags, rc)
+        if rc == 0:
+            self._connectedEvent.set()
+
+    def myOnDisconnect(self, paho_mqtt, userdata, rc):
+        super().myOnDisconnect(paho_mqtt, userdata, rc)
+        self._connectedEvent.clear()
+
+    def notify(self, topic, message):
+        # the decoded messages are queued for the readers, when the queue is full the new messages are dropped
+        try:
+            self._messages.put_nowait((topic, message))
+        except asyncio.QueueFull:
+            self.droppedMessages += 1
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._messages.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+    async def myPublish(self, topic, msg):
+        super().myPublish(topic, msg)
+
+    async def mySubscribe(self, topic):
+        super().mySubscribe(topic)
+
+    async def waitConnected(self):
+        await self._connectedEvent.wait()
+
+    async def start(self):
+        # connect to the broker in a task of the event loop, which also reconnects the client when needed
+        self._loop = asyncio.get_running_loop()
+        self._messages = asyncio.Queue(self.queueSize)
+        self._connectedEvent = asyncio.Event()
+        self._stopEvent.clear()
+        self._task = self._loop.create_task(self._connectionLoop())
+
+    async def _connectionLoop(self):
+        delay = self.reconnectMinDelay
+        firstConnection = True
+        while not self._stopEvent.is_set():
+            if self._paho_mqtt.socket() is None:
+                # wait before reconnecting, with an exponential backoff with jitter
+                if not firstConnection:
+                    await asyncio.sleep(random.uniform(delay / 2, delay))
+                    delay = min(delay * 2, self.reconnectMaxDelay)
+                try:
+                    if firstConnection:
+                        firstConnection = False
+                        self._paho_mqtt.connect(self.broker, self.port)
+                    else:
+                        self._paho_mqtt.reconnect()
+                except (OSError, ValueError) as e:
+                    print("Connection to %s failed (%s)" % (self.broker, e))
+                    continue
+            else:
+                if self._connected:
+                    delay = self.reconnectMinDelay
+                    self._drainBuffer()
+                    self._publishStatsIfDue()
+                # keepalive and retries of the QoS 1 and 2 messages
+                self._paho_mqtt.loop_misc()
+            await asyncio.sleep(0.1 if len(self._buffer) else 1)
+
+    async def stop(self):
+        self.unsubscribe()
+        self._stopEvent.set()
+        self._paho_mqtt.disconnect()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._buffer.close()
+        # stop the readers, if the queue is full the oldest message is dropped to make room for the end marker
+        if self._messages is not None:
+            try:
+                self._messages.put_nowait(None)
+            except asyncio.QueueFull:
+                self._messages.get_nowait()
+                self.droppedMessages += 1
+                self._messages.put_nowait(None)
+
+
+class AsyncCatalog:
+    # asynchronous requests to the catalog for the clients running in an event loop:
+    # aiohttp is used if it is installed, otherwise the requests are made with requests in the default executor
+    def __init__(self, catalogURL):
+        self.catalogURL = catalogURL
+        self._session = None
+
+    async def request(self, method, path, params=None, body=None):
+        url = f"{self.catalogURL}/{path}"
+        params = {key: str(value) for key, value in (params or {}).items()}
+        data = json.dumps(body) if body is not None else None
+        if aiohttp is not None:
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+            async with self._session.request(method, url, params=params, data=data) as response:
+                response.raise_for_status()
+                return json.loads(await response.text())
+        response = await asyncio.to_thread(requests.request, method, url, params=params, data=data)
+        response.raise_for_status()
+        return response.json()
+
+    async def get(self, path, params=None):
+        return await self.request("GET", path, params)
+
+    async def post(self, path, body, params=None):
+        return await self.request("POST", path, params, body)
+
+    async def put(self, path, body, params=None):
+        return await self.request("PUT", path, params, body)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
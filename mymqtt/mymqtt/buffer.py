@@ -0,0 +1,95 @@
+import collections
+import os
+import struct
+import threading
+
+
+class OfflineBuffer:
+    # ring buffer of the messages that could not be published because the client was disconnected
+    # if a path is given, the buffer is also written on disk so that the messages survive a restart
+    # when the buffer is full, the oldest messages are dropped
+    _header = struct.Struct("<BBHI")  # qos, retain, topic length, payload length
+
+    def __init__(self, path=None, maxMessages=1000):
+        self.path = path
+        self.maxMessages = maxMessages
+        self._messages = collections.deque(maxlen=maxMessages)
+        self._lock = threading.Lock()
+        self._file = None
+        self._written = 0
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._load()
+            self._rewrite()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def _load(self):
+        # read the messages left by a previous run
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        position = 0
+        while position + self._header.size <= len(data):
+            qos, retain, topicLength, payloadLength = self._header.unpack_from(data, position)
+            position += self._header.size
+            if position + topicLength + payloadLength > len(data):
+                break  # truncated record
+            topic = data[position:position + topicLength].decode("utf-8")
+            position += topicLength
+            payload = data[position:position + payloadLength]
+            position += payloadLength
+            self._messages.append((topic, payload, qos, bool(retain)))
+        if self._messages:
+            print(f"{len(self._messages)} buffered messages loaded from {self.path}")
+
+    def _write(self, message):
+        topic, payload, qos, retain = message
+        topic = topic.encode("utf-8")
+        self._file.write(self._header.pack(qos, retain, len(topic), len(payload)) + topic + payload)
+        self._written += 1
+
+    def _rewrite(self):
+        # rewrite the file with the messages still in the buffer, so that it does not grow forever
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "wb")
+        self._written = 0
+        for message in self._messages:
+            self._write(message)
+        self._file.flush()
+
+    def append(self, topic, payload, qos, retain):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        message = (topic, payload, qos, retain)
+        with self._lock:
+            self._messages.append(message)
+            if self._file is not None:
+                if self._written >= 2 * self.maxMessages:
+                    self._rewrite()
+                else:
+                    self._write(message)
+                    self._file.flush()
+
+    def pop(self):
+        # return the oldest message, or None if the buffer is empty
+        with self._lock:
+            if not self._messages:
+                return None
+            message = self._messages.popleft()
+            # the file is emptied once everything has been sent
+            if self._file is not None and not self._messages:
+                self._rewrite()
+            return message
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._rewrite()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,84 @@
+import collections
+import threading
+import time
+
+import requests
+
+
+class CatalogCache:
+    # in-process cache of values read from the catalog (e.g. the temperature range of a greenhouse), by key:
+    # - an entry is read lazily at the first get, then served from memory for ttl seconds
+    # - after ttl seconds it is revalidated with its ETag: the catalog answers 304 without the body if it has not changed
+    # - invalidate() expires an entry at once (e.g. on a change event of the catalog, see CatalogWatcher), it is
+    #   revalidated at the next get; discard() removes it (e.g. when the greenhouse is removed)
+    # - at most maxEntries entries are kept, the least recently used is evicted first
+    # - if the catalog cannot be reached, the last known value is returned (stale) instead of failing
+    def __init__(self, catalogURL, ttl=300, maxEntries=1024, timeout=5):
+        self.catalogURL = catalogURL
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.stale = 0
+        self._entries = collections.OrderedDict()  # key: [value, etag, time of the last check]
+        self._lock = threading.Lock()
+
+    def get(self, key, path, params=None, parse=None):
+        # return the value of key, read from GET path with params and converted by parse (the JSON by default)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if time.monotonic() - entry[2] < self.ttl:
+                    self.hits += 1
+                    return entry[0]
+
+        headers = {"If-None-Match": entry[1]} if entry is not None and entry[1] else {}
+        try:
+            response = requests.get(f"{self.catalogURL}/{path}", params=params, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and entry is not None:
+                with self._lock:
+                    entry[2] = time.monotonic()
+                    self.revalidations += 1
+                return entry[0]
+            response.raise_for_status()
+            data = response.json()
+            value = parse(data) if parse is not None else data
+        except Exception as e:
+            if entry is None:
+                raise
+            print(f"Catalog unavailable for {key} ({e}), using the last known value")
+            with self._lock:
+                self.stale += 1
+            return entry[0]
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = [value, response.headers.get("ETag"), time.monotonic()]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+        return value
+
+    def peek(self, key):
+        # return the cached value of key without reading the catalog (None if not cached)
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def invalidate(self, key):
+        # the value is kept as last known value, in case the catalog cannot be reached at the next get
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[2] = float("-inf")
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
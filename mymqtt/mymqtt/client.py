@@ -0,0 +1,322 @@
+import json
+import random
+import struct
+import threading
+import time
+
+import paho.mqtt.client as PahoMQTT
+
+from .buffer import OfflineBuffer
+from .codecs import CODECS
+from .dedup import Deduplicator
+from .senml import unpackSenML
+from .stats import MQTTStats
+
+
+class MyMQTT:
+    def __init__(self, clientID, broker, port, notifier=None, options=None, name=None):
+        self.broker = broker
+        self.port = port
+        # we need to give a notifier that it will use if it's a subscriber (if not no need)
+        self.notifier = notifier
+        self.clientID = clientID
+        # readable name of the client (device or service), used for its offline buffer file
+        self.name = name or clientID
+        # subscriptions of the client (topic: qos), they are renewed at every connection
+        self._topics = {}
+        self._subscribedCache = {}
+        self._subscriptionCache = {}
+        self._isSubscriber = False
+
+        # QoS, retain flag and codec are chosen per topic from the "topicPolicy" of the settings:
+        # the first pattern (MQTT wildcards allowed) matching the topic wins, otherwise the defaults are used
+        options = options or {}
+        self.defaultQoS = options.get("defaultQoS", 2)
+        self.defaultRetain = options.get("defaultRetain", False)
+        self.defaultCodec = options.get("defaultCodec", "json")
+        self.topicPolicy = options.get("topicPolicy", [])
+        self._policyCache = {}
+
+        # the connection is retried with an exponential backoff (with jitter) between minDelay and maxDelay seconds
+        reconnect = options.get("reconnect", {})
+        self.reconnectMinDelay = reconnect.get("minDelay", 1)
+        self.reconnectMaxDelay = reconnect.get("maxDelay", 60)
+        self.reconnections = 0
+
+        # the messages published while disconnected are kept in the offline buffer,
+        # then sent at drainRate messages per second once connected again
+        bufferSettings = options.get("offlineBuffer", {})
+        bufferPath = bufferSettings.get("path")
+        if bufferPath:
+            bufferPath = bufferPath.format(name=self.name)
+        self._buffer = OfflineBuffer(bufferPath, bufferSettings.get("maxMessages", 1000))
+        self.drainRate = bufferSettings.get("drainRate", 20)
+        self._drainAllowance = 0
+        self._lastDrain = time.time()
+
+        # optional filter of the duplicated and out of order readings, before the notifier
+        dedupSettings = options.get("dedup", {})
+        self._dedup = None
+        if dedupSettings.get("enabled", False):
+            self._dedup = Deduplicator(dedupSettings.get("maxEntries", 1024), dedupSettings.get("dropOutOfOrder", True))
+
+        # the statistics of the client can be read with getStats() and published every interval seconds on a topic
+        self.stats = MQTTStats()
+        statsSettings = options.get("stats", {})
+        self.statsInterval = statsSettings.get("interval", 0)
+        self.statsTopic = statsSettings.get("topic", "").format(name=self.name)
+        self._nextStats = time.time() + self.statsInterval
+
+        self._connected = False
+        self._hasConnected = False
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+        # create an instance of paho.mqtt.client
+        self._paho_mqtt = PahoMQTT.Client(clientID, True)
+        # register the callback
+        self._paho_mqtt.on_connect = self.myOnConnect
+        self._paho_mqtt.on_disconnect = self.myOnDisconnect
+        self._paho_mqtt.on_message = self.myOnMessageReceived
+
+    def myOnConnect(self, paho_mqtt, userdata, flags, rc):
+        print("Connected to %s with result code: %d" % (self.broker, rc))
+        if rc == 0:
+            self._connected = True
+            if self._hasConnected:
+                self.reconnections += 1
+            self._hasConnected = True
+            # the session is clean, so the subscriptions have to be made again at each connection
+            for topic, qos in list(self._topics.items()):
+                self._paho_mqtt.subscribe(topic, qos)
+
+    def myOnDisconnect(self, paho_mqtt, userdata, rc):
+        self._connected = False
+        if rc != 0:
+            print("Connection to %s lost with result code: %d" % (self.broker, rc))
+
+    def myOnMessageReceived(self, paho_mqtt, userdata, msg):
+        # A new message is received
+        start = time.perf_counter()
+
+        # the codec is announced by the last level of the topic (no suffix means JSON),
+        # the suffix is removed so that the notifier always sees the plain topic
+        topic = msg.topic
+        prefix, _, suffix = topic.rpartition("/")
+        codec = CODECS.get(suffix)
+        if codec is not None and codec.name != "json":
+            topic = prefix
+        else:
+            codec = CODECS["json"]
+
+        try:
+            message = codec.decode(topic, msg.payload)
+        except Exception as e:
+            print(f"Error decoding {codec.name} message on {msg.topic}: {e}")
+            self.stats.decodeErrors += 1
+            return
+        decoded = time.perf_counter()
+
+        try:
+            # a SenML pack is delivered record by record, on the topic the reading would have been published on
+            if isinstance(message, list):
+                for recordTopic, record in unpackSenML(message):
+                    if self.isSubscribedTo(recordTopic) and (self._dedup is None or self._dedup.accept(recordTopic, record)):
+                        self.notifier.notify(recordTopic, record)
+            # the notifier receives the decoded message
+            elif self._dedup is None or self._dedup.accept(topic, message):
+                self.notifier.notify(topic, message)
+        except Exception as e:
+            # an error of the notifier must not stop the network loop
+            print(f"Error in the notifier for the message on {topic}: {e}")
+            self.stats.handlerErrors += 1
+
+        self.stats.recordMessage(self.subscriptionOf(msg.topic), len(msg.payload), decoded - start, time.perf_counter() - decoded)
+
+    def subscriptionOf(self, topic):
+        # return the subscription through which a topic is received (cached per topic),
+        # the sub-topics of the codecs are counted with their main subscription
+        subscription = self._subscriptionCache.get(topic)
+        if subscription is None:
+            subscription = next((sub for sub in self._topics if PahoMQTT.topic_matches_sub(sub, topic)), topic)
+            prefix, _, suffix = subscription.rpartition("/")
+            if suffix in CODECS and prefix in self._topics:
+                subscription = prefix
+            self._subscriptionCache[topic] = subscription
+        return subscription
+
+    def isSubscribedTo(self, topic):
+        # check if a topic matches one of the subscriptions of the client (cached per topic)
+        subscribed = self._subscribedCache.get(topic)
+        if subscribed is None:
+            subscribed = any(PahoMQTT.topic_matches_sub(sub, topic) for sub in self._topics)
+            self._subscribedCache[topic] = subscribed
+        return subscribed
+
+    def getTopicPolicy(self, topic):
+        # return the (qos, retain, codec, stats key) of a topic or a subscription filter
+        # the result is cached since the topics of a client do not change
+        policy = self._policyCache.get(topic)
+        if policy is None:
+            qos, retain, codecName = self.defaultQoS, self.defaultRetain, self.defaultCodec
+            # the published messages are counted per rule of the policy, or per topic if no rule matches
+            statsKey = topic
+            for rule in self.topicPolicy:
+                if PahoMQTT.topic_matches_sub(rule["topic"], topic):
+                    qos = rule.get("qos", qos)
+                    retain = rule.get("retain", retain)
+                    codecName = rule.get("codec", codecName)
+                    statsKey = rule["topic"]
+                    break
+            if codecName not in CODECS:
+                print(f"Codec {codecName} not available for {topic}, using json")
+                codecName = "json"
+            policy = (qos, retain, CODECS[codecName], statsKey)
+            self._policyCache[topic] = policy
+        return policy
+
+    def myPublish(self, topic, msg):
+        # publish a message with a certain topic
+        qos, retain, codec, statsKey = self.getTopicPolicy(topic)
+        if codec.name != "json":
+            try:
+                # the binary payloads are published on a sub-topic named after their codec
+                payload = codec.encode(topic, msg)
+                self.stats.recordPublish(statsKey, len(payload))
+                self._send(f"{topic}/{codec.name}", payload, qos, retain)
+                return
+            except (KeyError, TypeError, ValueError, struct.error):
+                # the message cannot be encoded with this codec (e.g. a command for the struct codec)
+                pass
+        payload = json.dumps(msg)
+        self.stats.recordPublish(statsKey, len(payload))
+        self._send(topic, payload, qos, retain)
+
+    def _send(self, topic, payload, qos, retain):
+        # publish the payload, or keep it in the offline buffer if the client is disconnected, whatever its QoS:
+        # the buffer is written on disk (if it has a path), so the messages survive a restart, and they are sent
+        # again with their own QoS once connected
+        # (if the connection is lost during the publish, paho keeps the QoS 1 and 2 messages in its own queue
+        # until the reconnection, only the QoS 0 ones are buffered)
+        if self._connected:
+            info = self._paho_mqtt.publish(topic, payload, qos, retain)
+            if info.rc != PahoMQTT.MQTT_ERR_NO_CONN or qos > 0:
+                return
+        self._buffer.append(topic, payload, qos, retain)
+
+    def _drainBuffer(self):
+        # send the buffered messages, at most drainRate messages per second
+        now = time.time()
+        self._drainAllowance = min(self._drainAllowance + (now - self._lastDrain) * self.drainRate, self.drainRate)
+        self._lastDrain = now
+        while self._connected and self._drainAllowance >= 1:
+            message = self._buffer.pop()
+            if message is None:
+                break
+            topic, payload, qos, retain = message
+            self._paho_mqtt.publish(topic, payload, qos, retain)
+            self._drainAllowance -= 1
+
+    def mySubscribe(self, topic):
+        # subscribe to a topic
+        qos = self.getTopicPolicy(topic)[0]
+        # also subscribe to the sub-topic of each binary codec ("#" already includes them), only those: a "+"
+        # would also deliver the deeper topics that do not announce a codec
+        topics = [topic]
+        if not topic.endswith("#"):
+            topics += [f"{topic}/{name}" for name in CODECS if name != "json"]
+        for subscription in topics:
+            self._topics[subscription] = qos
+        self._subscribedCache = {}
+        self._subscriptionCache = {}
+        # if not connected yet, the subscription is made when the connection is established
+        if self._connected:
+            for subscription in topics:
+                self._paho_mqtt.subscribe(subscription, qos)
+        # just to remember that it works also as a subscriber
+        self._isSubscriber = True
+        print("subscribed to %s with QoS %d" % (topic, qos))
+
+    def isConnected(self):
+        return self._connected
+
+    def getStats(self):
+        # return a snapshot of the statistics of the client
+        stats = self.stats.snapshot()
+        stats["name"] = self.name
+        stats["clientID"] = self.clientID
+        stats["connected"] = self._connected
+        stats["reconnections"] = self.reconnections
+        # QoS 1 and 2 messages not yet acknowledged by the broker (paho has no public accessor)
+        stats["inflight"] = len(self._paho_mqtt._out_messages)
+        stats["buffered"] = len(self._buffer)
+        if self._dedup is not None:
+            stats["duplicates"] = self._dedup.duplicates
+            stats["outOfOrder"] = self._dedup.outOfOrder
+        return stats
+
+    def _publishStatsIfDue(self):
+        if self.statsInterval > 0 and self.statsTopic and time.time() >= self._nextStats:
+            self._nextStats = time.time() + self.statsInterval
+            # (MyMQTT.myPublish is called directly since it is a coroutine in MyAsyncMQTT)
+            MyMQTT.myPublish(self, self.statsTopic, self.getStats())
+
+    def start(self):
+        # manage connection to broker in a background thread, which also reconnects the client when needed
+        self._stopEvent.clear()
+        self._thread = threading.Thread(target=self._networkLoop, daemon=True)
+        self._thread.start()
+
+    def _networkLoop(self):
+        delay = self.reconnectMinDelay
+        firstConnection = True
+        while not self._stopEvent.is_set():
+            # (re)connect to the broker if there is no connection
+            if self._paho_mqtt.socket() is None:
+                try:
+                    if firstConnection:
+                        self._paho_mqtt.connect(self.broker, self.port)
+                        firstConnection = False
+                    else:
+                        self._paho_mqtt.reconnect()
+                except (OSError, ValueError) as e:
+                    wait = random.uniform(delay / 2, delay)
+                    print("Connection to %s failed (%s), retrying in %.1f s" % (self.broker, e, wait))
+                    self._stopEvent.wait(wait)
+                    delay = min(delay * 2, self.reconnectMaxDelay)
+                    continue
+
+            # process the network events, faster while there are buffered messages to send
+            rc = self._paho_mqtt.loop(timeout=0.1 if len(self._buffer) else 1.0)
+            if rc == PahoMQTT.MQTT_ERR_SUCCESS:
+                if self._connected:
+                    delay = self.reconnectMinDelay
+                    self._drainBuffer()
+                    self._publishStatsIfDue()
+            elif not self._stopEvent.is_set():
+                # the connection was lost: wait before trying to reconnect
+                self._connected = False
+                wait = random.uniform(delay / 2, delay)
+                self._stopEvent.wait(wait)
+                delay = min(delay * 2, self.reconnectMaxDelay)
+
+    def unsubscribe(self):
+        if (self._isSubscriber):
+            # remember to unsuscribe if it is working also as subscriber
+            if self._connected:
+                for topic in self._topics:
+                    self._paho_mqtt.unsubscribe(topic)
+            self._topics = {}
+            self._subscribedCache = {}
+            self._subscriptionCache = {}
+            self._isSubscriber = False
+
+    def stop(self):
+        # remember to unsuscribe if it is working also as subscriber
+        self.unsubscribe()
+
+        self._stopEvent.set()
+        self._paho_mqtt.disconnect()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._buffer.close()
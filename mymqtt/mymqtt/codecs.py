@@ -0,0 +1,90 @@
+import json
+import struct
+
+# optional binary codecs, only available if the library is installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class JSONCodec:
+    # default codec, the payload is published on the plain topic
+    name = "json"
+
+    def encode(self, topic, msg):
+        return json.dumps(msg)
+
+    def decode(self, topic, payload):
+        return json.loads(payload)
+
+
+class StructCodec:
+    # fixed struct of value and timestamp (16 bytes) for the SenML readings
+    # name and unit are constant per topic so they are not sent: the name is the last level of the topic
+    # a "still alive" marker of report by exception is sent with one more byte, and the aggregates of a window
+    # (min, max, count, with the mean as value) with 20 more bytes: the plain readings are unchanged
+    name = "struct"
+    units = {"temperature": "°C", "moisture": "%"}
+
+    def __init__(self):
+        self._struct = struct.Struct("<dd")
+        self._aliveStruct = struct.Struct("<dd?")
+        self._windowStruct = struct.Struct("<dd?ddI")
+
+    def encode(self, topic, msg):
+        # only a reading can be encoded, the other messages (e.g. a SenML pack, a list) raise TypeError so that the
+        # client publishes them in JSON
+        if not isinstance(msg, dict):
+            raise TypeError(f"struct codec cannot encode a {type(msg).__name__}")
+        if "count" in msg:
+            return self._windowStruct.pack(msg["v"], msg["t"], bool(msg.get("alive")), msg["min"], msg["max"], msg["count"])
+        if msg.get("alive"):
+            return self._aliveStruct.pack(msg["v"], msg["t"], True)
+        return self._struct.pack(msg["v"], msg["t"])
+
+    def decode(self, topic, payload):
+        name = topic.rsplit("/", 1)[-1]
+        if len(payload) == self._windowStruct.size:
+            value, timestamp, alive, minimum, maximum, count = self._windowStruct.unpack(payload)
+            message = {"v": value, "u": self.units.get(name, ""), "t": timestamp, "n": name, "min": minimum, "max": maximum, "count": count}
+            if alive:
+                message["alive"] = True
+            return message
+        if len(payload) == self._aliveStruct.size:
+            value, timestamp, alive = self._aliveStruct.unpack(payload)
+            return {"v": value, "u": self.units.get(name, ""), "t": timestamp, "n": name, "alive": alive}
+        value, timestamp = self._struct.unpack(payload)
+        return {"v": value, "u": self.units.get(name, ""), "t": timestamp, "n": name}
+
+
+class MsgPackCodec:
+    name = "msgpack"
+
+    def encode(self, topic, msg):
+        return msgpack.packb(msg)
+
+    def decode(self, topic, payload):
+        return msgpack.unpackb(payload, raw=False)
+
+
+class CBORCodec:
+    name = "cbor"
+
+    def encode(self, topic, msg):
+        return cbor2.dumps(msg)
+
+    def decode(self, topic, payload):
+        return cbor2.loads(payload)
+
+
+# codecs that can be used by the clients, indexed by the topic suffix announcing them
+CODECS = {"json": JSONCodec(), "struct": StructCodec()}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgPackCodec()
+if cbor2 is not None:
+    CODECS["cbor"] = CBORCodec()
@@ -0,0 +1,39 @@
+import collections
+
+
+class Deduplicator:
+    # filter of the received readings, by topic and timestamp "t" (the messages without timestamp are always accepted):
+    # - the readings already received are dropped, they are remembered in a LRU of maxEntries (topic, t) pairs
+    # - if dropOutOfOrder, the readings older than the last one accepted on their topic are dropped too
+    def __init__(self, maxEntries=1024, dropOutOfOrder=True):
+        self.maxEntries = maxEntries
+        self.dropOutOfOrder = dropOutOfOrder
+        self.duplicates = 0
+        self.outOfOrder = 0
+        self._seen = collections.OrderedDict()
+        self._latest = collections.OrderedDict()
+
+    def accept(self, topic, message):
+        timestamp = message.get("t") if isinstance(message, dict) else None
+        if timestamp is None:
+            return True
+
+        key = (topic, timestamp)
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            self.duplicates += 1
+            return False
+        self._seen[key] = None
+        if len(self._seen) > self.maxEntries:
+            self._seen.popitem(last=False)
+
+        if self.dropOutOfOrder:
+            latest = self._latest.get(topic)
+            if latest is not None and timestamp < latest:
+                self.outOfOrder += 1
+                return False
+            self._latest[topic] = timestamp
+            self._latest.move_to_end(topic)
+            if len(self._latest) > self.maxEntries:
+                self._latest.popitem(last=False)
+        return True
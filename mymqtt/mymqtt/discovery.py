@@ -0,0 +1,123 @@
+import requests
+
+
+class CatalogWatcher:
+    # keep the devices of a process in sync with the greenhouses and zones of the catalog, with delta polls:
+    # poll() asks the catalog for the changes since the last version seen (GET /changes) and calls the callbacks
+    # only for the greenhouses and zones added or removed since; the full list of greenhouses is read only at the
+    # first poll, or when the catalog cannot give the changes (catalog restarted, or too many changes since the last poll)
+    # the callbacks receive the greenhouse ID, and the zone ID for the zones; onZoneUpdated is called when a zone
+    # is modified (temperature range, moisture threshold), and for all the known zones after a full resync
+    def __init__(self, catalogURL, onGreenhouseAdded=None, onGreenhouseRemoved=None, onZoneAdded=None, onZoneRemoved=None, onZoneUpdated=None):
+        self.catalogURL = catalogURL
+        self.onGreenhouseAdded = onGreenhouseAdded
+        self.onGreenhouseRemoved = onGreenhouseRemoved
+        self.onZoneAdded = onZoneAdded
+        self.onZoneRemoved = onZoneRemoved
+        self.onZoneUpdated = onZoneUpdated
+        self.greenhouses = {}  # greenhouseID: set of the zone IDs
+        self.epoch = None
+        self.version = None
+
+    def poll(self):
+        try:
+            if self.epoch is None:
+                self._fullSync()
+                return
+            delta = self._getChanges({"since": self.version, "epoch": self.epoch})
+            if delta["reset"]:
+                self._fullSync()
+                return
+            for change in delta["changes"]:
+                self._apply(change)
+            self.version = delta["version"]
+        except Exception as e:
+            print(f"Error polling the changes of the catalog: {e}")
+
+    def _getChanges(self, params=None):
+        response = requests.get(f"{self.catalogURL}/changes", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def _fullSync(self):
+        # the version is read before the list: the changes made in between are applied again at the next poll,
+        # which has no effect since the callbacks are only called for actual additions and removals
+        delta = self._getChanges()
+        response = requests.get(f"{self.catalogURL}/greenhouses")
+        response.raise_for_status()
+        current = {greenhouse["greenhouseID"]: {zone["zoneID"] for zone in greenhouse.get("zones", [])}
+                   for greenhouse in response.json().get("greenhousesList", [])}
+
+        for greenhouseID in list(self.greenhouses):
+            if greenhouseID not in current:
+                self._removeGreenhouse(greenhouseID)
+        for greenhouseID, zoneIDs in current.items():
+            self._addGreenhouse(greenhouseID)
+            for zoneID in self.greenhouses[greenhouseID] - zoneIDs:
+                self._removeZone(greenhouseID, zoneID)
+            for zoneID in zoneIDs:
+                # the zones already known may have been modified since the last poll
+                if zoneID in self.greenhouses[greenhouseID]:
+                    self._updateZone(greenhouseID, zoneID)
+                else:
+                    self._addZone(greenhouseID, zoneID)
+        self.epoch = delta["epoch"]
+        self.version = delta["version"]
+
+    def _apply(self, change):
+        greenhouseID = change["greenhouseID"]
+        zoneID = change.get("zoneID")
+        if change["action"] == "added":
+            if zoneID is None:
+                self._addGreenhouse(greenhouseID)
+            else:
+                self._addZone(greenhouseID, zoneID)
+        elif change["action"] == "updated":
+            if zoneID is not None:
+                self._updateZone(greenhouseID, zoneID)
+        elif zoneID is None:
+            self._removeGreenhouse(greenhouseID)
+        else:
+            self._removeZone(greenhouseID, zoneID)
+
+    def _addGreenhouse(self, greenhouseID):
+        if greenhouseID in self.greenhouses:
+            return
+        self.greenhouses[greenhouseID] = set()
+        if self.onGreenhouseAdded is not None:
+            self.onGreenhouseAdded(greenhouseID)
+
+    def _removeGreenhouse(self, greenhouseID):
+        if greenhouseID not in self.greenhouses:
+            return
+        for zoneID in list(self.greenhouses[greenhouseID]):
+            self._removeZone(greenhouseID, zoneID)
+        del self.greenhouses[greenhouseID]
+        if self.onGreenhouseRemoved is not None:
+            self.onGreenhouseRemoved(greenhouseID)
+
+    def _addZone(self, greenhouseID, zoneID):
+        self._addGreenhouse(greenhouseID)
+        if zoneID in self.greenhouses[greenhouseID]:
+            return
+        self.greenhouses[greenhouseID].add(zoneID)
+        if self.onZoneAdded is not None:
+            self.onZoneAdded(greenhouseID, zoneID)
+
+    def _removeZone(self, greenhouseID, zoneID):
+        # the greenhouse of a removed zone may be unknown to the catalog (None), it is then looked up here
+        if greenhouseID is None:
+            greenhouseID = next((g for g, zoneIDs in self.greenhouses.items() if zoneID in zoneIDs), None)
+        if greenhouseID not in self.greenhouses or zoneID not in self.greenhouses[greenhouseID]:
+            return
+        self.greenhouses[greenhouseID].discard(zoneID)
+        if self.onZoneRemoved is not None:
+            self.onZoneRemoved(greenhouseID, zoneID)
+
+    def _updateZone(self, greenhouseID, zoneID):
+        if greenhouseID is None:
+            greenhouseID = next((g for g, zoneIDs in self.greenhouses.items() if zoneID in zoneIDs), None)
+        if greenhouseID not in self.greenhouses or zoneID not in self.greenhouses[greenhouseID]:
+            return
+        if self.onZoneUpdated is not None:
+            self.onZoneUpdated(greenhouseID, zoneID)
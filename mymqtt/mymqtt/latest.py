@@ -0,0 +1,48 @@
+import threading
+
+
+class LatestValues:
+    # table of the last value received for each key (e.g. the temperature of a greenhouse, the moisture of a zone),
+    # for the services that control in batches: the MQTT thread put()s the readings, a newer reading replaces the
+    # pending one of the same key, and the control loop take()s the keys updated since the last take once per tick
+    def __init__(self):
+        self.received = 0
+        self.replaced = 0  # readings replaced by a newer one before being taken
+        self._values = {}  # key: (value, timestamp)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def put(self, key, value, timestamp):
+        with self._lock:
+            self.received += 1
+            if key in self._pending:
+                self.replaced += 1
+            self._values[key] = (value, timestamp)
+            self._pending.add(key)
+
+    def take(self):
+        # return the keys updated since the last take, with their values and timestamps (three lists)
+        with self._lock:
+            keys = list(self._pending)
+            self._pending.clear()
+            entries = [self._values[key] for key in keys]
+        return keys, [value for value, _ in entries], [timestamp for _, timestamp in entries]
+
+    def get(self, key):
+        # last value of key (None if never received)
+        with self._lock:
+            entry = self._values.get(key)
+            return entry[0] if entry is not None else None
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._values
+
+    def __len__(self):
+        with self._lock:
+            return len(self._values)
+
+    def discard(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+            self._pending.discard(key)
@@ -0,0 +1,61 @@
+import threading
+
+
+class ReportByException:
+    # decide which readings of a sensor are published (report by exception):
+    # - a reading is reported if it differs by more than deadband from the last reported value
+    # - otherwise it is suppressed, unless nothing has been reported for maxSilence seconds: it is then
+    #   published as a "still alive" marker ("alive": true), the sensor works but the value has not changed
+    # the alive markers do not move the reference value, so a slow drift is reported once it exceeds the deadband
+    def __init__(self, deadband=0, maxSilence=300):
+        self.deadband = deadband
+        self.maxSilence = maxSilence
+        self.reported = 0
+        self.alive = 0
+        self.suppressed = 0
+        self._lastValue = None
+        self._lastTime = None
+
+    def check(self, value, timestamp):
+        # return "change" or "alive" if the reading has to be published, None if it is suppressed
+        if self._lastValue is None or abs(value - self._lastValue) > self.deadband:
+            self._lastValue = value
+            self._lastTime = timestamp
+            self.reported += 1
+            return "change"
+        if timestamp - self._lastTime >= self.maxSilence:
+            self._lastTime = timestamp
+            self.alive += 1
+            return "alive"
+        self.suppressed += 1
+        return None
+
+
+class WindowStats:
+    # running statistics of the readings sampled by a sensor in a window (edge aggregation):
+    # add() updates count, mean (Welford), min and max in O(1), take() returns them and starts a new window
+    def __init__(self):
+        self._lock = threading.Lock()  # the readings are sampled and taken by different scheduler workers
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        with self._lock:
+            self.count += 1
+            self.mean += (value - self.mean) / self.count
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def take(self):
+        # return the statistics of the window (None if no reading was sampled) and reset them
+        with self._lock:
+            if self.count == 0:
+                return None
+            window = {"mean": self.mean, "min": self.min, "max": self.max, "count": self.count}
+            self._reset()
+            return window
@@ -0,0 +1,92 @@
+import threading
+
+# aggregates of a window of readings, carried with the mean as value
+WINDOW_FIELDS = ("min", "max", "count")
+
+
+def unpackSenML(pack):
+    # resolve the records of a SenML pack (RFC 8428): the base name, base time and base unit apply
+    # to the following records until they are redefined
+    # yield the full name of each record (the topic of the reading) and the reading as published by the sensors
+    baseName, baseTime, baseUnit = "", 0, ""
+    for record in pack:
+        baseName = record.get("bn", baseName)
+        baseTime = record.get("bt", baseTime)
+        baseUnit = record.get("bu", baseUnit)
+        if "v" not in record:
+            continue
+        name = baseName + record.get("n", "")
+        reading = {
+            "v": record["v"],
+            "u": record.get("u", baseUnit),
+            "t": baseTime + record.get("t", 0),
+            "n": name.rsplit("/", 1)[-1]
+        }
+        # "still alive" marker of report by exception and aggregates of a window (extension fields,
+        # ignored by the other SenML readers)
+        if record.get("alive"):
+            reading["alive"] = True
+        for field in WINDOW_FIELDS:
+            if field in record:
+                reading[field] = record[field]
+        yield name, reading
+
+
+class SenMLPacker:
+    # buffer the readings of a greenhouse and publish them together as one SenML pack on packTopic,
+    # when maxRecords readings are buffered or at most flushInterval seconds after the first one
+    def __init__(self, mqttClient, packTopic, flushInterval=30, maxRecords=20):
+        self.mqttClient = mqttClient
+        self.packTopic = packTopic
+        # the names of the records are relative to the level of the pack topic (e.g. "group06/SmartGreenhouse/1/")
+        self.baseName = packTopic.rpartition("/")[0] + "/"
+        self.flushInterval = flushInterval
+        self.maxRecords = maxRecords
+        self._records = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, topic, message):
+        # buffer a reading that would have been published on topic
+        with self._lock:
+            self._records.append((topic[len(self.baseName):], message))
+            records = None
+            if len(self._records) >= self.maxRecords:
+                records = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flushInterval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if records:
+            self._publish(records)
+
+    def flush(self):
+        # publish the buffered readings now
+        with self._lock:
+            records = self._take()
+        if records:
+            self._publish(records)
+
+    def _take(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        records = self._records
+        self._records = []
+        return records
+
+    def _publish(self, records):
+        baseTime = records[0][1]["t"]
+        baseUnit = records[0][1]["u"]
+        pack = [{"bn": self.baseName, "bt": baseTime, "bu": baseUnit}]
+        for name, message in records:
+            record = {"n": name, "v": message["v"], "t": round(message["t"] - baseTime, 3)}
+            if message["u"] != baseUnit:
+                record["u"] = message["u"]
+            if message.get("alive"):
+                record["alive"] = True
+            for field in WINDOW_FIELDS:
+                if field in message:
+                    record[field] = message[field]
+            pack.append(record)
+        self.mqttClient.myPublish(self.packTopic, pack)
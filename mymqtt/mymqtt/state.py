@@ -0,0 +1,57 @@
+import threading
+
+
+class ActuatorState:
+    # state machine of an actuator, the commands are the target states:
+    # - a command equal to the current state is ignored (coalesced), apply() returns False
+    # - a transition returns True, so the actuator does its work and reports the change only then
+    # the time spent in each state is accumulated, the duty cycle is the fraction of time in the "on" states
+    # the timestamps are given by the caller (seconds of the clock of the service)
+    def __init__(self, states, initial, onStates, timestamp):
+        self.states = tuple(states)
+        self.onStates = set(onStates)
+        self.state = initial
+        self.since = timestamp  # time of the last transition
+        self.start = timestamp
+        self.transitions = 0
+        self.ignored = 0
+        self._timeIn = {state: 0.0 for state in self.states}
+        self._lock = threading.Lock()
+
+    def apply(self, state, timestamp):
+        if state not in self._timeIn:
+            raise ValueError(f"unknown state {state}")
+        with self._lock:
+            if state == self.state:
+                self.ignored += 1
+                return False
+            self._timeIn[self.state] += timestamp - self.since
+            self.state = state
+            self.since = timestamp
+            self.transitions += 1
+            return True
+
+    def timeIn(self, state, timestamp):
+        # cumulative time spent in state, including the current period
+        with self._lock:
+            current = timestamp - self.since if state == self.state else 0
+            return self._timeIn[state] + current
+
+    def onTime(self, timestamp):
+        return sum(self.timeIn(state, timestamp) for state in self.onStates)
+
+    def dutyCycle(self, timestamp):
+        elapsed = timestamp - self.start
+        return self.onTime(timestamp) / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self, timestamp):
+        # state and metrics, as published on the state changes and sent to the catalog
+        return {
+            "state": self.state,
+            "since": self.since,
+            "transitions": self.transitions,
+            "ignored": self.ignored,
+            "onTime": round(self.onTime(timestamp), 1),
+            "dutyCycle": round(self.dutyCycle(timestamp), 4),
+            "timeIn": {state: round(self.timeIn(state, timestamp), 1) for state in self.states}
+        }
@@ -0,0 +1,82 @@
+import time
+
+
+class MQTTStats:
+    # counters of a client, updated on the hot path with a few additions only:
+    # - per subscription: messages, payload bytes, decoding time and latency histogram of the notifier
+    # - per published topic pattern (rule of the topic policy, or the topic itself): messages and bytes
+    # the rates are computed over the time since the previous snapshot
+    latencyBuckets = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)  # upper bounds in seconds
+
+    def __init__(self):
+        self.startTime = time.time()
+        self.subscriptions = {}
+        self.published = {}
+        self.decodeErrors = 0
+        self.handlerErrors = 0
+        self._lastSnapshot = self.startTime
+        self._lastCounts = {}
+
+    def recordMessage(self, subscription, size, decodeTime, handlerTime):
+        entry = self.subscriptions.get(subscription)
+        if entry is None:
+            # messages, bytes, total decoding time, total handler time, max handler time, histogram
+            entry = [0, 0, 0.0, 0.0, 0.0, [0] * (len(self.latencyBuckets) + 1)]
+            self.subscriptions[subscription] = entry
+        entry[0] += 1
+        entry[1] += size
+        entry[2] += decodeTime
+        entry[3] += handlerTime
+        if handlerTime > entry[4]:
+            entry[4] = handlerTime
+        bucket = 0
+        for bound in self.latencyBuckets:
+            if handlerTime <= bound:
+                break
+            bucket += 1
+        entry[5][bucket] += 1
+
+    def recordPublish(self, key, size):
+        entry = self.published.get(key)
+        if entry is None:
+            entry = [0, 0]
+            self.published[key] = entry
+        entry[0] += 1
+        entry[1] += size
+
+    def _rate(self, key, count, elapsed):
+        rate = (count - self._lastCounts.get(key, 0)) / elapsed if elapsed > 0 else 0
+        self._lastCounts[key] = count
+        return round(rate, 3)
+
+    def snapshot(self):
+        now = time.time()
+        elapsed = now - self._lastSnapshot
+        self._lastSnapshot = now
+        subscriptions = {}
+        for subscription, (messages, size, decodeTime, handlerTime, maxHandlerTime, histogram) in list(self.subscriptions.items()):
+            subscriptions[subscription] = {
+                "messages": messages,
+                "rate": self._rate(("sub", subscription), messages, elapsed),
+                "bytes": size,
+                "avgBytes": round(size / messages, 1),
+                "avgDecodeTime": decodeTime / messages,
+                "avgHandlerTime": handlerTime / messages,
+                "maxHandlerTime": maxHandlerTime,
+                "handlerHistogram": {"buckets": list(self.latencyBuckets), "counts": list(histogram)}
+            }
+        published = {}
+        for key, (messages, size) in list(self.published.items()):
+            published[key] = {
+                "messages": messages,
+                "rate": self._rate(("pub", key), messages, elapsed),
+                "bytes": size
+            }
+        return {
+            "t": now,
+            "uptime": round(now - self.startTime, 1),
+            "decodeErrors": self.decodeErrors,
+            "handlerErrors": self.handlerErrors,
+            "subscriptions": subscriptions,
+            "published": published
+        }
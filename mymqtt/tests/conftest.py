@@ -0,0 +1,92 @@
+import os
+import sys
+import threading
+import time
+import uuid
+
+import paho.mqtt.client as PahoMQTT
+import pytest
+
+# the tests run against the in-repo LocalBroker, and the package from the sources
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(ROOT, "mymqtt"))
+sys.path.insert(0, os.path.join(ROOT, "local_broker"))
+from local_broker import LocalBroker  # noqa: E402
+from mymqtt import MyMQTT  # noqa: E402
+
+
+def waitFor(condition, timeout=5):
+    # poll condition until it is true, return its last value
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class Notifier:
+    # notifier of the dict contract of MyMQTT: notify(topic, payload) with the decoded message
+    def __init__(self):
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def notify(self, topic, payload):
+        with self._lock:
+            self.messages.append((topic, payload))
+
+    def wait(self, count, timeout=5):
+        return waitFor(lambda: len(self.messages) >= count, timeout)
+
+
+class Observer:
+    # raw paho client subscribed to "#" with QoS 2, to see the topics, payloads, QoS and retain flags on the wire
+    def __init__(self, port, topicFilter="#"):
+        self.messages = []
+        self._client = PahoMQTT.Client(f"observer-{uuid.uuid4()}", True)
+        self._client.on_message = lambda client, userdata, msg: self.messages.append((msg.topic, msg.payload, msg.qos, bool(msg.retain)))
+        subscribed = threading.Event()
+        self._client.on_subscribe = lambda *args: subscribed.set()
+        self._client.connect("127.0.0.1", port)
+        self._client.subscribe(topicFilter, 2)
+        self._client.loop_start()
+        assert subscribed.wait(5)
+
+    def wait(self, count, timeout=5):
+        return waitFor(lambda: len(self.messages) >= count, timeout)
+
+    def stop(self):
+        self._client.loop_stop()
+        self._client.disconnect()
+
+
+@pytest.fixture
+def broker():
+    broker = LocalBroker("127.0.0.1", 0).startInThread()
+    yield broker
+    broker.stopThread()
+
+
+@pytest.fixture
+def makeClient(broker):
+    # create started and connected MyMQTT clients, stopped at the end of the test
+    clients = []
+
+    def make(options=None, notifier=None, port=None, connect=True):
+        client = MyMQTT(f"test-{uuid.uuid4()}", "127.0.0.1", port or broker.port, notifier or Notifier(), options)
+        clients.append(client)
+        client.start()
+        if connect:
+            assert waitFor(client.isConnected)
+        return client
+
+    yield make
+    for client in clients:
+        client.stop()
+
+
+@pytest.fixture
+def observer(broker):
+    observer = Observer(broker.port)
+    yield observer
+    observer.stop()
@@ -0,0 +1,23 @@
+import asyncio
+import uuid
+
+from mymqtt import MyAsyncMQTT
+
+
+def test_stop_awaits_the_task_and_ends_the_readers_with_a_full_queue(broker):
+    async def main():
+        client = MyAsyncMQTT(f"test-{uuid.uuid4()}", "127.0.0.1", broker.port, queueSize=2)
+        await client.start()
+        await asyncio.wait_for(client.waitConnected(), 5)
+        for i in range(3):
+            client.notify("g/1/heatingcooling", {"i": i})
+        assert client.droppedMessages == 1
+        task = client._task
+
+        await client.stop()
+        assert task.done() and client._task is None
+        # the oldest message made room for the end of the iteration
+        assert [message async for message in client] == [("g/1/heatingcooling", {"i": 1})]
+        assert client.droppedMessages == 2
+
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+import types
+
+import pytest
+import requests
+
+import mymqtt.cache
+from mymqtt import CatalogCache
+
+
+class StubResponse:
+    def __init__(self, status_code, data=None, etag=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = {"ETag": etag} if etag else {}
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+class StubCatalog:
+    # GET of the catalog: the zones of each greenhouse, with an ETag per version, 304 if the ETag is still valid
+    def __init__(self):
+        self.zones = {}  # greenhouseID: value returned for the zones of the greenhouse
+        self.versions = {}  # greenhouseID: version of its zones
+        self.requests = []  # (greenhouseID, If-None-Match header)
+        self.down = False
+
+    def update(self, greenhouseID, value):
+        self.zones[greenhouseID] = value
+        self.versions[greenhouseID] = self.versions.get(greenhouseID, 0) + 1
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        greenhouseID = params["greenhouseID"]
+        self.requests.append((greenhouseID, (headers or {}).get("If-None-Match")))
+        if self.down:
+            raise requests.ConnectionError("catalog down")
+        etag = f'"{greenhouseID}-{self.versions[greenhouseID]}"'
+        if (headers or {}).get("If-None-Match") == etag:
+            return StubResponse(304)
+        return StubResponse(200, self.zones[greenhouseID], etag)
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    catalog = StubCatalog()
+    monkeypatch.setattr(mymqtt.cache.requests, "get", catalog.get)
+    return catalog
+
+
+@pytest.fixture
+def now(monkeypatch):
+    # monotonic time of the cache, moved by the tests
+    now = [1000.0]
+    monkeypatch.setattr(mymqtt.cache, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def get(cache, greenhouseID):
+    return cache.get(greenhouseID, "zones", {"greenhouseID": greenhouseID})
+
+
+def test_entries_are_served_from_memory_until_the_ttl(catalog, now):
+    catalog.update(1, {"min": 20})
+    cache = CatalogCache("http://catalog", ttl=60)
+    assert get(cache, 1) == {"min": 20}
+    now[0] += 59
+    assert get(cache, 1) == {"min": 20}
+    assert len(catalog.requests) == 1 and (cache.hits, cache.misses) == (1, 1)
+
+    # after the ttl the entry is revalidated with its ETag, and read again if it changed
+    now[0] += 1
+    catalog.update(1, {"min": 22})
+    assert get(cache, 1) == {"min": 22}
+    assert catalog.requests[-1] == (1, '"1-1"')
+    assert cache.misses == 2
+
+
+def test_not_modified_reuses_the_cached_value(catalog, now):
+    catalog.update(1, {"min": 20})
+    cache = CatalogCache("http://catalog", ttl=60)
+    value = get(cache, 1)
+    now[0] += 60
+    assert get(cache, 1) is value
+    assert catalog.requests == [(1, None), (1, '"1-1"')]
+    assert cache.revalidations == 1
+    # the revalidation starts a new ttl
+    now[0] += 30
+    assert get(cache, 1) is value and len(catalog.requests) == 2
+
+
+def test_invalidate_revalidates_at_the_next_get(catalog, now):
+    catalog.update(1, {"min": 20})
+    cache = CatalogCache("http://catalog", ttl=60)
+    get(cache, 1)
+    cache.invalidate(1)
+    assert cache.peek(1) == {"min": 20}  # still the last known value
+    assert get(cache, 1) == {"min": 20}
+    assert catalog.requests[-1] == (1, '"1-1"') and cache.revalidations == 1
+
+
+def test_least_recently_used_entry_is_evicted(catalog, now):
+    for greenhouseID in (1, 2, 3):
+        catalog.update(greenhouseID, {"greenhouseID": greenhouseID})
+    cache = CatalogCache("http://catalog", ttl=60, maxEntries=2)
+    get(cache, 1)
+    get(cache, 2)
+    get(cache, 1)  # 2 is now the least recently used
+    get(cache, 3)
+    assert cache.peek(2) is None
+    assert cache.peek(1) == {"greenhouseID": 1} and cache.peek(3) == {"greenhouseID": 3}
+    get(cache, 2)
+    assert catalog.requests[-1] == (2, None)  # read again without ETag
+
+
+def test_last_known_value_when_the_catalog_is_down(catalog, now):
+    catalog.update(1, {"min": 20})
+    cache = CatalogCache("http://catalog", ttl=60)
+    get(cache, 1)
+    catalog.down = True
+    now[0] += 60
+    assert get(cache, 1) == {"min": 20}
+    assert cache.stale == 1
+    # without a known value the error is raised
+    with pytest.raises(requests.ConnectionError):
+        get(cache, 2)
+
+
+def test_parse_converts_the_response_once(catalog, now):
+    catalog.update(1, {"zonesList": [{"temperatureRange": {"min": 20, "max": 25}}]})
+    cache = CatalogCache("http://catalog", ttl=60)
+    parsed = []
+
+    def parse(data):
+        parsed.append(data)
+        return data["zonesList"][0]["temperatureRange"]["min"]
+
+    assert cache.get(1, "zones", {"greenhouseID": 1}, parse) == 20
+    assert cache.get(1, "zones", {"greenhouseID": 1}, parse) == 20
+    assert len(parsed) == 1
@@ -0,0 +1,194 @@
+import json
+
+from conftest import Notifier, Observer, waitFor
+from local_broker import LocalBroker
+from mymqtt import SenMLPacker
+
+POLICY = {
+    "defaultQoS": 2,
+    "defaultRetain": False,
+    "defaultCodec": "json",
+    "topicPolicy": [
+        {"topic": "g/+/temperature", "qos": 0, "retain": False, "codec": "struct"},
+        {"topic": "g/+/heatingcooling", "qos": 1, "retain": False, "codec": "json"},
+        {"topic": "state/#", "qos": 1, "retain": True, "codec": "json"}
+    ]
+}
+
+
+def waitSubscribed(broker, client, topic):
+    # the subscriptions are sent asynchronously, wait until the broker has them
+    assert waitFor(lambda: client.clientID in broker.sessions and topic in broker.sessions[client.clientID].subscriptions)
+
+
+def test_publish_notify_round_trip(broker, makeClient):
+    notifier = Notifier()
+    subscriber = makeClient(POLICY, notifier)
+    subscriber.mySubscribe("g/+/heatingcooling")
+    waitSubscribed(broker, subscriber, "g/+/heatingcooling")
+
+    makeClient(POLICY).myPublish("g/1/heatingcooling", {"command": "heating"})
+    assert notifier.wait(1)
+    assert notifier.messages == [("g/1/heatingcooling", {"command": "heating"})]
+
+
+def test_policy_selects_qos_retain_and_codec(broker, makeClient, observer):
+    publisher = makeClient(POLICY)
+    qos, retain, codec, _ = publisher.getTopicPolicy("g/1/temperature")
+    assert (qos, retain, codec.name) == (0, False, "struct")
+    qos, retain, codec, _ = publisher.getTopicPolicy("other/topic")
+    assert (qos, retain, codec.name) == (2, False, "json")
+
+    publisher.myPublish("g/1/temperature", {"v": 21.5, "u": "°C", "t": 10.0, "n": "temperature"})
+    publisher.myPublish("g/1/heatingcooling", {"command": "off"})
+    publisher.myPublish("state/1", {"state": "off"})
+    publisher.myPublish("other/topic", {"x": 1})
+    assert observer.wait(4)
+
+    byTopic = {topic: (payload, qos, retain) for topic, payload, qos, retain in observer.messages}
+    # the struct payloads are published on the sub-topic of their codec
+    payload, qos, retain = byTopic["g/1/temperature/struct"]
+    assert (len(payload), qos, retain) == (16, 0, False)
+    assert byTopic["g/1/heatingcooling"][1:] == (1, False)
+    assert json.loads(byTopic["g/1/heatingcooling"][0]) == {"command": "off"}
+    assert byTopic["other/topic"][1] == 2
+
+    # the retained message is delivered to a later subscriber
+    late = Observer(broker.port, "state/#")
+    try:
+        assert late.wait(1)
+        assert late.messages[0][0] == "state/1" and late.messages[0][3] is True
+    finally:
+        late.stop()
+
+
+def test_struct_reading_is_notified_as_dict_on_plain_topic(broker, makeClient):
+    notifier = Notifier()
+    subscriber = makeClient(POLICY, notifier)
+    subscriber.mySubscribe("g/+/temperature")
+    waitSubscribed(broker, subscriber, "g/+/temperature/struct")
+
+    makeClient(POLICY).myPublish("g/1/temperature", {"v": 21.5, "u": "°C", "t": 10.0, "n": "temperature"})
+    assert notifier.wait(1)
+    assert notifier.messages == [("g/1/temperature", {"v": 21.5, "u": "°C", "t": 10.0, "n": "temperature"})]
+
+
+def test_deeper_topics_without_codec_are_not_delivered(broker, makeClient):
+    notifier = Notifier()
+    subscriber = makeClient(POLICY, notifier)
+    subscriber.mySubscribe("g/+/temperature")
+    subscriber.mySubscribe("g/+")
+    waitSubscribed(broker, subscriber, "g/+/struct")
+    assert "g/+/temperature/+" not in broker.sessions[subscriber.clientID].subscriptions
+
+    publisher = makeClient(POLICY)
+    publisher.myPublish("g/1/temperature/setpoint", {"v": 22})
+    publisher.myPublish("g/1/2/moisture", {"v": 40})
+    publisher.myPublish("g/1", {"v": 1})
+    publisher.myPublish("g/1/temperature", {"v": 21.5, "u": "°C", "t": 10.0, "n": "temperature"})
+    assert notifier.wait(2)
+    assert not notifier.wait(3, timeout=0.3)
+    assert sorted(topic for topic, _ in notifier.messages) == ["g/1", "g/1/temperature"]
+    assert subscriber.subscriptionOf("g/1/temperature/struct") == "g/+/temperature"
+
+
+def test_message_not_encodable_falls_back_to_json(makeClient, observer):
+    publisher = makeClient(POLICY)
+    publisher.myPublish("g/1/temperature", [{"bn": "g/1/", "v": 1}])
+    publisher.myPublish("g/1/temperature", {"command": "ON"})
+    assert observer.wait(2)
+    assert [(topic, json.loads(payload)) for topic, payload, _, _ in observer.messages] == [
+        ("g/1/temperature", [{"bn": "g/1/", "v": 1}]),
+        ("g/1/temperature", {"command": "ON"})
+    ]
+
+
+def test_senml_pack_is_delivered_reading_by_reading(broker, makeClient):
+    notifier = Notifier()
+    subscriber = makeClient(POLICY, notifier)
+    subscriber.mySubscribe("g/+/temperature")
+    subscriber.mySubscribe("g/+/senml")
+    waitSubscribed(broker, subscriber, "g/+/senml")
+
+    packer = SenMLPacker(makeClient(POLICY), "g/1/senml", flushInterval=60, maxRecords=3)
+    packer.add("g/1/temperature", {"v": 20.0, "u": "°C", "t": 100.0, "n": "temperature"})
+    packer.add("g/1/temperature", {"v": 20.5, "u": "°C", "t": 115.0, "n": "temperature", "alive": True})
+    # not subscribed: dropped by the subscriber
+    packer.add("g/1/2/moisture", {"v": 40.0, "u": "%", "t": 120.0, "n": "moisture"})
+    assert notifier.wait(2)
+    assert not notifier.wait(3, timeout=0.3)
+    assert notifier.messages == [
+        ("g/1/temperature", {"v": 20.0, "u": "°C", "t": 100.0, "n": "temperature"}),
+        ("g/1/temperature", {"v": 20.5, "u": "°C", "t": 115.0, "n": "temperature", "alive": True})
+    ]
+
+
+def test_dedup_drops_duplicated_and_out_of_order_readings(broker, makeClient):
+    options = dict(POLICY, dedup={"enabled": True, "maxEntries": 64, "dropOutOfOrder": True})
+    notifier = Notifier()
+    subscriber = makeClient(options, notifier)
+    subscriber.mySubscribe("g/+/heatingcooling")
+    waitSubscribed(broker, subscriber, "g/+/heatingcooling")
+
+    publisher = makeClient(POLICY)
+    for timestamp in (10, 10, 5, 20):
+        publisher.myPublish("g/1/heatingcooling", {"v": timestamp, "t": timestamp})
+    assert notifier.wait(2)
+    assert not notifier.wait(3, timeout=0.3)
+    assert [payload["t"] for _, payload in notifier.messages] == [10, 20]
+    stats = subscriber.getStats()
+    assert (stats["duplicates"], stats["outOfOrder"]) == (1, 1)
+
+
+def test_offline_buffer_drains_after_reconnection(makeClient):
+    # own broker, stopped and restarted on the same port
+    broker = LocalBroker("127.0.0.1", 0).startInThread()
+    port = broker.port
+    options = dict(POLICY, reconnect={"minDelay": 0.5, "maxDelay": 1}, offlineBuffer={"maxMessages": 100, "drainRate": 1000})
+    publisher = makeClient(options, port=port)
+
+    broker.stopThread()
+    assert waitFor(lambda: not publisher.isConnected())
+    for i in range(10):
+        publisher.myPublish("g/1/heatingcooling", {"command": "on", "i": i})
+    assert publisher.getStats()["buffered"] == 10
+
+    restarted = LocalBroker("127.0.0.1", port).startInThread()
+    observer = Observer(port, "g/#")
+    try:
+        assert waitFor(publisher.isConnected)
+        assert observer.wait(10)
+        assert [json.loads(payload)["i"] for _, payload, _, _ in observer.messages] == list(range(10))
+        assert publisher.getStats()["buffered"] == 0
+        assert publisher.reconnections == 1
+    finally:
+        observer.stop()
+        restarted.stopThread()
+
+
+def test_offline_buffer_on_disk_keeps_every_qos_across_a_restart(makeClient, tmp_path):
+    broker = LocalBroker("127.0.0.1", 0).startInThread()
+    port = broker.port
+    options = dict(POLICY, reconnect={"minDelay": 0.5, "maxDelay": 1}, offlineBuffer={"path": str(tmp_path / "buffer.bin"), "drainRate": 1000})
+    publisher = makeClient(options, port=port)
+
+    broker.stopThread()
+    assert waitFor(lambda: not publisher.isConnected())
+    publisher.myPublish("g/1/heatingcooling", {"command": "heating"})  # QoS 1
+    publisher.myPublish("other/topic", {"x": 1})  # QoS 2
+    publisher.myPublish("g/1/temperature", {"v": 21.5, "u": "°C", "t": 10.0, "n": "temperature"})  # QoS 0
+    publisher.stop()
+
+    # a new client with the same buffer file sends the messages of the previous run with their QoS
+    restarted = LocalBroker("127.0.0.1", port).startInThread()
+    observer = Observer(port, "#")
+    try:
+        makeClient(options, port=port)
+        assert observer.wait(3)
+        # (the messages of different QoS can be delivered in any order)
+        assert {(topic, qos) for topic, _, qos, _ in observer.messages} == {
+            ("g/1/heatingcooling", 1), ("other/topic", 2), ("g/1/temperature/struct", 0)
+        }
+    finally:
+        observer.stop()
+        restarted.stopThread()
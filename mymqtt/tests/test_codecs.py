@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from mymqtt import Deduplicator, JSONCodec, StructCodec, unpackSenML
+
+
+def test_json_round_trip():
+    codec = JSONCodec()
+    message = {"v": 21.5, "u": "°C", "t": 1700000000.0, "n": "temperature"}
+    payload = codec.encode("g/1/temperature", message)
+    assert json.loads(payload) == message
+    assert codec.decode("g/1/temperature", payload) == message
+
+
+def test_struct_reading_is_16_bytes_and_gets_unit_and_name_from_topic():
+    codec = StructCodec()
+    payload = codec.encode("g/1/temperature", {"v": 21.5, "u": "°C", "t": 1700000000.0, "n": "temperature"})
+    assert len(payload) == 16
+    assert codec.decode("g/1/temperature", payload) == {"v": 21.5, "u": "°C", "t": 1700000000.0, "n": "temperature"}
+    assert codec.decode("g/1/2/moisture", codec.encode("g/1/2/moisture", {"v": 40.0, "t": 5.0}))["u"] == "%"
+
+
+def test_struct_alive_marker_and_window():
+    codec = StructCodec()
+    alive = codec.encode("g/1/temperature", {"v": 20.0, "t": 1.0, "alive": True})
+    assert len(alive) == 17
+    assert codec.decode("g/1/temperature", alive)["alive"] is True
+
+    window = {"v": 20.0, "t": 1.0, "min": 19.0, "max": 21.0, "count": 12}
+    decoded = codec.decode("g/1/temperature", codec.encode("g/1/temperature", window))
+    assert {key: decoded[key] for key in window} == window
+    assert "alive" not in decoded
+
+
+@pytest.mark.parametrize("message", [[{"bn": "g/1/", "v": 1}], "ON", {"command": "ON"}])
+def test_struct_rejects_what_is_not_a_reading_with_a_fallback_error(message):
+    # myPublish falls back to JSON on these errors
+    with pytest.raises((KeyError, TypeError)):
+        StructCodec().encode("g/1/temperature", message)
+
+
+def test_senml_pack_expansion():
+    pack = [
+        {"bn": "g/1/", "bt": 100.0, "bu": "°C"},
+        {"n": "temperature", "v": 20.0, "t": 0},
+        {"n": "2/moisture", "v": 40.0, "t": 5, "u": "%", "alive": True},
+        {"n": "temperature", "v": 21.0, "t": 10, "min": 20.0, "max": 22.0, "count": 3},
+        {"bn": "g/2/", "bt": 200.0},
+        {"n": "temperature", "v": 18.0}
+    ]
+    assert list(unpackSenML(pack)) == [
+        ("g/1/temperature", {"v": 20.0, "u": "°C", "t": 100.0, "n": "temperature"}),
+        ("g/1/2/moisture", {"v": 40.0, "u": "%", "t": 105.0, "n": "moisture", "alive": True}),
+        ("g/1/temperature", {"v": 21.0, "u": "°C", "t": 110.0, "n": "temperature", "min": 20.0, "max": 22.0, "count": 3}),
+        ("g/2/temperature", {"v": 18.0, "u": "°C", "t": 200.0, "n": "temperature"})
+    ]
+
+
+def test_dedup_drops_duplicates_and_out_of_order():
+    dedup = Deduplicator(maxEntries=16, dropOutOfOrder=True)
+    assert dedup.accept("a", {"v": 1, "t": 10})
+    assert not dedup.accept("a", {"v": 1, "t": 10})
+    assert not dedup.accept("a", {"v": 1, "t": 5})
+    assert dedup.accept("b", {"v": 1, "t": 5})  # per topic
+    assert dedup.accept("a", {"command": "ON"})  # no timestamp
+    assert (dedup.duplicates, dedup.outOfOrder) == (1, 1)
+
+    keepOrder = Deduplicator(dropOutOfOrder=False)
+    assert keepOrder.accept("a", {"t": 10}) and keepOrder.accept("a", {"t": 5})
@@ -0,0 +1,15 @@
+# tools shared by the sensor simulators of the Smart Greenhouse:
+# - scheduler: Scheduler, runs the periodic jobs of the simulated devices at their own period
+# - engine: SimulationEngine, state of all the greenhouses and zones in NumPy arrays, stepped in batch
+# - models: evolution of the state (RandomWalkModel, PhysicalModel), chosen by name with createModel
+# - trace: record of a published stream in a binary trace file (TraceWriter) and reading of it (readTrace)
+# - shard: run of a simulator in several processes (ShardedRunner), each with the devices of its shard of a
+#   consistent hashing ring (HashRing) behind one shared MQTT connection (TopicRouter)
+from .engine import SimulationEngine
+from .models import MODELS, PhysicalModel, RandomWalkModel, createModel
+from .scheduler import Scheduler
+from .shard import HashRing, ShardedRunner, TopicRouter, clientCounters, mergeStats
+from .trace import TraceWriter, readTrace
+
+__all__ = ["Scheduler", "SimulationEngine", "RandomWalkModel", "PhysicalModel", "MODELS", "createModel", "TraceWriter", "readTrace",
+           "HashRing", "ShardedRunner", "TopicRouter", "clientCounters", "mergeStats"]
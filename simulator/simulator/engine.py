@@ -0,0 +1,182 @@
+import math
+import time
+
+import numpy as np
+
+from .models import RandomWalkModel
+
+
+class SimulationEngine:
+    # state of all the simulated greenhouses (temperature, heating and cooling) and zones (moisture, irrigation)
+    # in NumPy arrays, updated together in one batched step per tick; the sensors are views on one index
+    # the arrays are allocated with a spare capacity, doubled when full, so adding devices one by one stays cheap;
+    # a removed device is replaced by the last one, so the indexes of the devices can change when others are removed
+    # the evolution of the state is computed by a model (random walk by default), over time steps of dt seconds;
+    # time is the simulated time, it can go faster than the real time when the engine is advanced in bigger steps
+    def __init__(self, seed=None, model=None, dt=15, startTime=None, capacity=64):
+        self.rng = np.random.default_rng(seed)
+        self.model = model if model is not None else RandomWalkModel()
+        self.dt = dt
+        self.time = startTime if startTime is not None else time.time()
+        self.steps = 0
+        self._owed = 0.0  # simulated time asked by advance() and not yet stepped (less than dt)
+
+        self.greenhouseIDs = []
+        self.zoneIDs = []
+        self._greenhouseIndex = {}
+        self._zoneIndex = {}
+        self._temperature = np.zeros(capacity)
+        self._heating = np.zeros(capacity, dtype=bool)
+        self._cooling = np.zeros(capacity, dtype=bool)
+        self._moisture = np.zeros(capacity)
+        self._irrigation = np.zeros(capacity, dtype=bool)
+        self._zoneGreenhouse = np.full(capacity, -1)  # index of the greenhouse of each zone, -1 if not simulated
+
+    @staticmethod
+    def _grow(array, size):
+        if size <= len(array):
+            return array
+        grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    # current state, as views of the used part of the arrays
+    @property
+    def temperature(self):
+        return self._temperature[:len(self.greenhouseIDs)]
+
+    @property
+    def heating(self):
+        return self._heating[:len(self.greenhouseIDs)]
+
+    @property
+    def cooling(self):
+        return self._cooling[:len(self.greenhouseIDs)]
+
+    @property
+    def moisture(self):
+        return self._moisture[:len(self.zoneIDs)]
+
+    @property
+    def irrigation(self):
+        return self._irrigation[:len(self.zoneIDs)]
+
+    @property
+    def zoneGreenhouse(self):
+        return self._zoneGreenhouse[:len(self.zoneIDs)]
+
+    def addGreenhouses(self, greenhouseIDs):
+        # add greenhouses with a random initial temperature, return their indexes
+        start = len(self.greenhouseIDs)
+        end = start + len(greenhouseIDs)
+        self._temperature = self._grow(self._temperature, end)
+        self._heating = self._grow(self._heating, end)
+        self._cooling = self._grow(self._cooling, end)
+        self._temperature[start:end] = self.rng.integers(10, 45, end - start, endpoint=True)
+        for index, greenhouseID in enumerate(greenhouseIDs, start):
+            self.greenhouseIDs.append(greenhouseID)
+            self._greenhouseIndex[greenhouseID] = index
+        return list(range(start, end))
+
+    def addZones(self, zoneIDs, greenhouseIDs=None):
+        # add zones with a random initial moisture, return their indexes
+        # greenhouseIDs gives the greenhouse of each zone, used by the models if that greenhouse is simulated too
+        start = len(self.zoneIDs)
+        end = start + len(zoneIDs)
+        self._moisture = self._grow(self._moisture, end)
+        self._irrigation = self._grow(self._irrigation, end)
+        if end > len(self._zoneGreenhouse):
+            grown = np.full(len(self._moisture), -1)
+            grown[:len(self._zoneGreenhouse)] = self._zoneGreenhouse
+            self._zoneGreenhouse = grown
+        self._moisture[start:end] = self.rng.integers(30, 60, end - start, endpoint=True)
+        if greenhouseIDs is not None:
+            self._zoneGreenhouse[start:end] = [self._greenhouseIndex.get(greenhouseID, -1) for greenhouseID in greenhouseIDs]
+        for index, zoneID in enumerate(zoneIDs, start):
+            self.zoneIDs.append(zoneID)
+            self._zoneIndex[zoneID] = index
+        return list(range(start, end))
+
+    def addGreenhouse(self, greenhouseID):
+        return self.addGreenhouses([greenhouseID])[0]
+
+    def addZone(self, zoneID, greenhouseID=None):
+        return self.addZones([zoneID], None if greenhouseID is None else [greenhouseID])[0]
+
+    def removeGreenhouses(self, greenhouseIDs):
+        # remove greenhouses (unknown IDs are ignored), the last greenhouse is moved to the index of each removed one
+        # so the arrays stay compact: the indexes of the moved greenhouses change, get them with greenhouseIndex
+        # the zones of a removed greenhouse are kept, without greenhouse (-1)
+        for greenhouseID in greenhouseIDs:
+            index = self._greenhouseIndex.pop(greenhouseID, None)
+            if index is None:
+                continue
+            last = len(self.greenhouseIDs) - 1
+            lastID = self.greenhouseIDs.pop()
+            zoneGreenhouse = self.zoneGreenhouse
+            zoneGreenhouse[zoneGreenhouse == index] = -1
+            if index != last:
+                for array in (self._temperature, self._heating, self._cooling):
+                    array[index] = array[last]
+                self.greenhouseIDs[index] = lastID
+                self._greenhouseIndex[lastID] = index
+                zoneGreenhouse[zoneGreenhouse == last] = index
+            self._heating[last] = False
+            self._cooling[last] = False
+
+    def removeZones(self, zoneIDs):
+        # remove zones (unknown IDs are ignored), the last zone is moved to the index of each removed one
+        # so the arrays stay compact: the indexes of the moved zones change, get them with zoneIndex
+        for zoneID in zoneIDs:
+            index = self._zoneIndex.pop(zoneID, None)
+            if index is None:
+                continue
+            last = len(self.zoneIDs) - 1
+            lastID = self.zoneIDs.pop()
+            if index != last:
+                for array in (self._moisture, self._irrigation, self._zoneGreenhouse):
+                    array[index] = array[last]
+                self.zoneIDs[index] = lastID
+                self._zoneIndex[lastID] = index
+            self._irrigation[last] = False
+            self._zoneGreenhouse[last] = -1
+
+    def removeGreenhouse(self, greenhouseID):
+        self.removeGreenhouses([greenhouseID])
+
+    def removeZone(self, zoneID):
+        self.removeZones([zoneID])
+
+    def greenhouseIndex(self, greenhouseID):
+        return self._greenhouseIndex[greenhouseID]
+
+    def zoneIndex(self, zoneID):
+        return self._zoneIndex[zoneID]
+
+    def step(self):
+        # one time step of dt seconds for all the greenhouses and zones
+        self.model.step(self, self.dt)
+        self.time += self.dt
+        self.steps += 1
+
+    def advance(self, seconds):
+        # advance the simulated time by the given duration, in steps of dt
+        # (e.g. advance(publishPeriod * timeScale) at every publish period for a faster-than-real-time run)
+        # the time asked is accumulated and a step is taken only once it reaches dt, so advancing by less than dt
+        # at a time (e.g. at every sample period of 1 s) keeps the simulation at the right speed
+        # return the number of steps taken
+        self._owed += seconds
+        steps = math.floor(self._owed / self.dt + 1e-9)
+        for _ in range(steps):
+            self.step()
+        self._owed = max(0.0, self._owed - steps * self.dt)
+        return steps
+
+    def advanceTo(self, timestamp):
+        # advance the simulated time up to timestamp (e.g. the time of the clock), in steps of dt, so the simulated
+        # time follows it without drifting, whatever the delays between the calls; nothing is done if it is behind
+        # return the number of steps taken
+        seconds = timestamp - self.time - self._owed
+        if seconds <= 0:
+            return 0
+        return self.advance(seconds)
@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+
+
+class RandomWalkModel:
+    # random walk of the first simulators, one move per step whatever the time step:
+    # - temperature: +0.3..0.8 °C when heating, -0.3..0.8 °C when cooling, random drift of ±0.2 °C otherwise
+    # - moisture: +10 % when irrigated, -1..3 % otherwise
+    name = "randomWalk"
+
+    def __init__(self, minTemperature=10, maxTemperature=45):
+        self.minTemperature = minTemperature
+        self.maxTemperature = maxTemperature
+
+    def step(self, engine, dt):
+        temperature = engine.temperature
+        change = engine.rng.uniform(0.3, 0.8, len(temperature))
+        drift = engine.rng.uniform(-0.2, 0.2, len(temperature))
+        temperature += np.where(engine.heating, change, np.where(engine.cooling, -change, drift))
+        np.clip(temperature, self.minTemperature, self.maxTemperature, out=temperature)
+
+        moisture = engine.moisture
+        dryness = engine.rng.integers(1, 3, len(moisture), endpoint=True)
+        moisture += np.where(engine.irrigation, 10, -dryness)
+        np.clip(moisture, 0, 100, out=moisture)
+
+
+class PhysicalModel:
+    # lumped model of the greenhouses and of the soil of the zones, integrated over a time step dt (seconds):
+    # - air temperature T: C dT/dt = UA (Tout - T) + heaterPower * heating - coolerPower * cooling
+    #   integrated exactly over dt (the model is linear during a step), so it is stable for any dt
+    # - outside temperature Tout: daily sinusoid around outsideMean, warmest at warmestHour
+    # - soil moisture (% of the field capacity): irrigation flow minus evapotranspiration, which grows with the
+    #   temperature of the greenhouse of the zone (outside temperature if the greenhouse is not simulated)
+    name = "physical"
+
+    def __init__(self, heatCapacity=5e5, heatLoss=200, heaterPower=10000, coolerPower=10000,
+                 outsideMean=15, outsideAmplitude=8, warmestHour=15,
+                 irrigationRate=60, evapotranspirationRate=2, evapotranspirationFactor=0.05,
+                 temperatureNoise=0.05, moistureNoise=0.05):
+        self.heatCapacity = heatCapacity  # J/K
+        self.heatLoss = heatLoss  # W/K
+        self.heaterPower = heaterPower  # W
+        self.coolerPower = coolerPower  # W
+        self.outsideMean = outsideMean  # °C
+        self.outsideAmplitude = outsideAmplitude  # °C
+        self.warmestHour = warmestHour
+        self.irrigationRate = irrigationRate  # %/h while irrigating
+        self.evapotranspirationRate = evapotranspirationRate  # %/h at 20 °C
+        self.evapotranspirationFactor = evapotranspirationFactor  # relative change of the evapotranspiration per °C
+        self.temperatureNoise = temperatureNoise  # °C per sqrt(minute)
+        self.moistureNoise = moistureNoise  # % per sqrt(minute)
+
+    def outsideTemperature(self, timestamp):
+        hour = (timestamp % 86400) / 3600
+        return self.outsideMean + self.outsideAmplitude * math.cos(2 * math.pi * (hour - self.warmestHour) / 24)
+
+    def step(self, engine, dt):
+        outside = self.outsideTemperature(engine.time)
+        noiseScale = math.sqrt(dt / 60)
+
+        temperature = engine.temperature
+        power = self.heaterPower * engine.heating - self.coolerPower * engine.cooling
+        equilibrium = outside + power / self.heatLoss
+        decay = math.exp(-dt * self.heatLoss / self.heatCapacity)
+        temperature[:] = equilibrium + (temperature - equilibrium) * decay
+        temperature += engine.rng.normal(0, self.temperatureNoise * noiseScale, len(temperature))
+
+        moisture = engine.moisture
+        zoneGreenhouse = engine.zoneGreenhouse
+        zoneTemperature = np.where(zoneGreenhouse >= 0, temperature[zoneGreenhouse] if len(temperature) else outside, outside)
+        evapotranspiration = self.evapotranspirationRate * np.maximum(0, 1 + self.evapotranspirationFactor * (zoneTemperature - 20))
+        moisture += (self.irrigationRate * engine.irrigation - evapotranspiration) * dt / 3600
+        moisture += engine.rng.normal(0, self.moistureNoise * noiseScale, len(moisture))
+        np.clip(moisture, 0, 100, out=moisture)
+
+
+# models that can be chosen in the settings of the simulation
+MODELS = {"randomWalk": RandomWalkModel, "physical": PhysicalModel}
+
+
+def createModel(name="randomWalk", parameters=None):
+    # create a model from its name and parameters (as given in the settings)
+    return MODELS[name](**(parameters or {}))
@@ -0,0 +1,104 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    # periodic job of the scheduler: the nominal run times are start + k * period, each run is shifted
+    # by a random jitter in [-jitter, jitter] that does not accumulate, so the cadence stays fixed
+    def __init__(self, callback, period, jitter=0, name=None):
+        self.callback = callback
+        self.period = period
+        self.jitter = min(jitter, period / 2)
+        self.name = name or getattr(callback, "__qualname__", "job")
+        self.nominalTime = None
+        self.running = False
+        self.cancelled = False
+        self.runs = 0
+        self.skipped = 0
+
+    def nextRunTime(self):
+        return self.nominalTime + random.uniform(-self.jitter, self.jitter)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    # run the periodic jobs of many simulated devices from one heap of (run time, job):
+    # a thread waits for the earliest job and hands it to a pool of workers, so a slow job (e.g. a request
+    # to the catalog) does not delay the others; a job still running when it is due again skips that run
+    # the periods are in seconds of a clock running speed times faster than real time (1 for the real time)
+    def __init__(self, workers=4, speed=1):
+        self.speed = speed
+        self._heap = []
+        self._counter = itertools.count()  # breaks the ties of the heap between jobs due at the same time
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._stopped = False
+        self._thread = None
+
+    def every(self, period, callback, jitter=0, name=None, firstDelay=None):
+        # schedule callback every period seconds, the first run is after firstDelay seconds
+        # (by default a random delay within the first period, to spread the devices started together)
+        job = Job(callback, period / self.speed, jitter / self.speed, name)
+        if firstDelay is None:
+            firstDelay = random.uniform(0, period)
+        job.nominalTime = time.time() + firstDelay / self.speed
+        with self._condition:
+            heapq.heappush(self._heap, (job.nominalTime, next(self._counter), job))
+            self._condition.notify()
+        return job
+
+    def _runJob(self, job):
+        try:
+            job.callback()
+        except Exception as e:
+            # an error of a device must not stop the scheduler
+            print(f"Error in scheduled job {job.name}: {e}")
+        finally:
+            job.runs += 1
+            job.running = False
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (not self._heap or self._heap[0][0] > time.time()):
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+                if job.cancelled:
+                    continue
+
+                # next nominal run time, the periods already missed are skipped instead of run in a burst
+                now = time.time()
+                job.nominalTime += job.period
+                if job.nominalTime < now:
+                    missed = int((now - job.nominalTime) // job.period) + 1
+                    job.nominalTime += missed * job.period
+                    job.skipped += missed
+                heapq.heappush(self._heap, (job.nextRunTime(), next(self._counter), job))
+
+            if job.running:
+                job.skipped += 1
+                continue
+            job.running = True
+            self._executor.submit(self._runJob, job)
+
+    def start(self):
+        # run the jobs in a background thread
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._executor.shutdown(wait=True)
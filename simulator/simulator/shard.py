@@ -0,0 +1,153 @@
+import bisect
+import hashlib
+import multiprocessing
+import queue
+import time
+
+
+class HashRing:
+    # consistent hashing of the devices (by greenhouse or zone ID) on the shards: each shard has `replicas` points
+    # on a ring of hashes and a key belongs to the shard of the first point after its hash, so the keys are spread
+    # evenly and changing the number of shards moves only about 1/N of them
+    def __init__(self, shards, replicas=100):
+        self.shards = shards
+        points = sorted((self._hash(f"{shard}-{replica}"), shard) for shard in range(shards) for replica in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    @staticmethod
+    def _hash(key):
+        # stable across processes and runs, unlike hash()
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def shardOf(self, key):
+        if self.shards == 1:
+            return 0
+        i = bisect.bisect(self._hashes, self._hash(str(key))) % len(self._hashes)
+        return self._shards[i]
+
+
+class TopicRouter:
+    # notifier of an MQTT client shared by the devices of a process: a message is delivered to the device
+    # registered on its topic, the messages for the devices of the other processes are dropped
+    def __init__(self):
+        self._devices = {}
+
+    def add(self, topic, device):
+        self._devices[topic] = device
+
+    def remove(self, topic):
+        self._devices.pop(topic, None)
+
+    def notify(self, topic, payload):
+        device = self._devices.get(topic)
+        if device is not None:
+            device.notify(topic, payload)
+
+
+def clientCounters(stats):
+    # additive counters of a MyMQTT.getStats() snapshot, that can be summed over the workers
+    return {
+        "connected": int(stats["connected"]),
+        "reconnections": stats["reconnections"],
+        "published": sum(entry["messages"] for entry in stats["published"].values()),
+        "publishedBytes": sum(entry["bytes"] for entry in stats["published"].values()),
+        "received": sum(entry["messages"] for entry in stats["subscriptions"].values()),
+        "inflight": stats["inflight"],
+        "buffered": stats["buffered"],
+        "decodeErrors": stats["decodeErrors"],
+        "handlerErrors": stats["handlerErrors"]
+    }
+
+
+def mergeStats(statsList):
+    # sum the numbers of the stats of the workers, the nested dicts are merged the same way
+    merged = {}
+    for stats in statsList:
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                merged[key] = mergeStats([merged.get(key, {}), value])
+            elif isinstance(value, (int, float)):
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+class ShardedRunner:
+    # run a simulator in `workers` processes: worker i calls target(*args, shard=i, shards=workers, statsQueue=q)
+    # and simulates only the devices of shard i (see HashRing), with its own engine and MQTT connection
+    # the runner supervises the workers: a worker that exits is restarted after restartDelay seconds;
+    # the workers put their stats in the queue and the runner prints them merged every statsInterval seconds
+    def __init__(self, target, workers, args=(), statsInterval=30, restartDelay=5):
+        self.target = target
+        self.workers = workers
+        self.args = args
+        self.statsInterval = statsInterval
+        self.restartDelay = restartDelay
+        self.restarts = 0
+        self.statsQueue = multiprocessing.Queue()
+        self._processes = {}  # shard: process
+        self._exitTimes = {}  # shard: time at which the worker exited
+        self._lastStats = {}  # shard: last stats received
+
+    def _startWorker(self, shard):
+        process = multiprocessing.Process(target=self.target, args=self.args, name=f"shard{shard}",
+                                          kwargs={"shard": shard, "shards": self.workers, "statsQueue": self.statsQueue})
+        process.start()
+        self._processes[shard] = process
+
+    def start(self):
+        for shard in range(self.workers):
+            self._startWorker(shard)
+
+    def supervise(self):
+        # restart the workers that exited, once they have been dead for restartDelay seconds
+        now = time.time()
+        for shard, process in self._processes.items():
+            if process.is_alive():
+                continue
+            if shard not in self._exitTimes:
+                print(f"Worker {shard} exited with code {process.exitcode}, restarting in {self.restartDelay} s")
+                self._exitTimes[shard] = now
+            elif now - self._exitTimes[shard] >= self.restartDelay:
+                del self._exitTimes[shard]
+                self.restarts += 1
+                self._startWorker(shard)
+
+    def collectStats(self):
+        while True:
+            try:
+                stats = self.statsQueue.get_nowait()
+            except queue.Empty:
+                return
+            self._lastStats[stats["shard"]] = stats
+
+    def mergedStats(self):
+        # stats of the fleet: sum of the last stats of each worker alive
+        alive = [shard for shard, process in self._processes.items() if process.is_alive()]
+        merged = mergeStats([stats for shard, stats in self._lastStats.items() if shard in alive])
+        merged.pop("shard", None)
+        merged["workers"] = len(alive)
+        merged["restarts"] = self.restarts
+        return merged
+
+    def run(self):
+        # start the workers and supervise them until interrupted
+        self.start()
+        nextStats = time.time() + self.statsInterval
+        try:
+            while True:
+                time.sleep(1)
+                self.supervise()
+                self.collectStats()
+                if time.time() >= nextStats:
+                    nextStats += self.statsInterval
+                    print(f"Fleet stats: {self.mergedStats()}")
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self):
+        # the workers receive the interrupt too and stop cleanly, those still running after 10 s are terminated
+        for process in self._processes.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
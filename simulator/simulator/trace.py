@@ -0,0 +1,80 @@
+import json
+import os
+import struct
+import threading
+
+# trace file: magic, then a sequence of records starting with their type
+# - topic record: type "T", topic length, topic (the topics are numbered in their order of appearance)
+# - message record: type "M", timestamp, topic number (32 bits, a fleet can have more than 65535 topics),
+#   payload length, payload (compact JSON of the message)
+# the last byte of the magic is the version of the format, the traces of the other versions are rejected
+MAGIC = b"GHTRACE2"
+_topicRecord = struct.Struct("<cH")
+_messageRecord = struct.Struct("<cdII")
+
+
+class TraceWriter:
+    # record a published stream (timestamp, topic, message) in a compact binary trace file
+    # the writes are buffered, and the same writer can be shared by the devices of a process
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._topics = {}
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def record(self, timestamp, topic, message):
+        payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            topicNumber = self._topics.get(topic)
+            if topicNumber is None:
+                topicNumber = len(self._topics)
+                self._topics[topic] = topicNumber
+                encodedTopic = topic.encode("utf-8")
+                self._file.write(_topicRecord.pack(b"T", len(encodedTopic)) + encodedTopic)
+            self._file.write(_messageRecord.pack(b"M", timestamp, topicNumber, len(payload)) + payload)
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def readTrace(path):
+    # yield the (timestamp, topic, message) of a trace file, in their order of recording
+    # (a record truncated at the end of the file, e.g. if the recorder was killed, is ignored)
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            if magic[:-1] == MAGIC[:-1]:
+                raise ValueError(f"{path} is a trace file of an unsupported version ({magic[-1:].decode('ascii', 'replace')})")
+            raise ValueError(f"{path} is not a trace file")
+        topics = []
+        while True:
+            recordType = f.read(1)
+            if not recordType:
+                return
+            if recordType == b"T":
+                header = f.read(_topicRecord.size - 1)
+                if len(header) < _topicRecord.size - 1:
+                    return
+                (length,) = struct.unpack("<H", header)
+                topic = f.read(length)
+                if len(topic) < length:
+                    return
+                topics.append(topic.decode("utf-8"))
+            elif recordType == b"M":
+                header = f.read(_messageRecord.size - 1)
+                if len(header) < _messageRecord.size - 1:
+                    return
+                timestamp, topicNumber, length = struct.unpack("<dII", header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    return
+                yield timestamp, topics[topicNumber], json.loads(payload)
+            else:
+                raise ValueError(f"Corrupted trace file {path}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the tests use the package from the sources
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
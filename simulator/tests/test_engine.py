@@ -0,0 +1,78 @@
+import pytest
+
+from simulator import SimulationEngine
+
+
+@pytest.mark.parametrize("samplePeriod, timeScale", [(1, 1), (1, 10), (2.5, 1)])
+def test_sampling_faster_than_dt_keeps_the_simulated_time(samplePeriod, timeScale):
+    # in aggregation mode the sensors advance the engine at every sample period, shorter than dt
+    engine = SimulationEngine(seed=1, dt=15, startTime=0)
+    engine.addGreenhouse(1)
+    samples = 100
+    for _ in range(samples):
+        engine.advance(samplePeriod * timeScale)
+    elapsed = samples * samplePeriod * timeScale
+    assert engine.time == pytest.approx(elapsed // 15 * 15)
+    assert elapsed - engine.dt < engine.time <= elapsed
+    assert engine.steps == elapsed // 15
+
+
+def test_advance_by_multiples_of_dt():
+    engine = SimulationEngine(seed=1, dt=15, startTime=0)
+    assert engine.advance(15) == 1
+    assert engine.advance(45) == 3
+    assert engine.advance(10) == 0
+    assert engine.advance(5) == 1
+    assert engine.time == 75
+
+
+def test_add_remove_and_add_again_greenhouses_and_zones():
+    engine = SimulationEngine(seed=1, startTime=0)
+    engine.addGreenhouses([1, 2, 3])
+    engine.addZones([(1, 1), (3, 1), (3, 2)], [1, 3, 3])
+    engine.heating[engine.greenhouseIndex(3)] = True
+    temperature = float(engine.temperature[engine.greenhouseIndex(3)])
+    moisture = float(engine.moisture[engine.zoneIndex((3, 2))])
+
+    # the last greenhouse and zone are moved to the removed indexes, with their state
+    engine.removeGreenhouse(1)
+    engine.removeZone((1, 1))
+    assert sorted(engine.greenhouseIDs) == [2, 3] and len(engine.temperature) == 2
+    assert sorted(engine.zoneIDs) == [(3, 1), (3, 2)] and len(engine.moisture) == 2
+    assert engine.temperature[engine.greenhouseIndex(3)] == temperature
+    assert engine.heating[engine.greenhouseIndex(3)]
+    assert engine.moisture[engine.zoneIndex((3, 2))] == moisture
+    assert list(engine.zoneGreenhouse) == [engine.greenhouseIndex(3)] * 2
+    with pytest.raises(KeyError):
+        engine.greenhouseIndex(1)
+    engine.removeGreenhouse(1)  # already removed
+    engine.step()
+
+    # added again, in a new slot with a new state
+    engine.addGreenhouse(1)
+    engine.addZone((1, 1), 1)
+    assert sorted(engine.greenhouseIDs) == [1, 2, 3] and len(engine.temperature) == 3
+    assert engine.greenhouseIndex(1) == 2 and not engine.heating[2]
+    assert engine.zoneIndex((1, 1)) == 2 and engine.zoneGreenhouse[2] == 2
+    for greenhouseID in engine.greenhouseIDs:
+        assert engine.greenhouseIDs[engine.greenhouseIndex(greenhouseID)] == greenhouseID
+
+
+def test_zones_of_a_removed_greenhouse_lose_their_greenhouse():
+    engine = SimulationEngine(seed=1, startTime=0)
+    engine.addGreenhouses([1, 2])
+    engine.addZones([(1, 1), (2, 1)], [1, 2])
+    engine.removeGreenhouse(1)
+    assert list(engine.zoneGreenhouse) == [-1, engine.greenhouseIndex(2)] == [-1, 0]
+
+
+def test_advance_to_follows_the_clock_without_drift():
+    # the sensors advance the engine to the time of the clock at irregular intervals (late jobs)
+    engine = SimulationEngine(seed=1, dt=15, startTime=1000)
+    now = 1000
+    for delay in [1, 0.4, 16, 3.3, 29, 0.01, 44.7] * 20:
+        now += delay
+        engine.advanceTo(now)
+        assert now - engine.dt < engine.time <= now
+    assert engine.advanceTo(now - 100) == 0  # behind: nothing to do
+    assert engine.steps == (now - 1000) // 15
@@ -1,6 +1,6 @@
 
 import json            
-import time
+from clock import clock
 import requests    
 import telepot         
 from telepot.loop import MessageLoop  
@@ -61,7 +61,7 @@ class TelegramBot:
         Register the service in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.serviceInfo["lastUpdate"] = actualTime
             response = requests.post(f"{self.catalogURL}/services", data=json.dumps(self.serviceInfo))
             response.raise_for_status()
@@ -75,7 +75,7 @@ class TelegramBot:
         Update the service registration in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.serviceInfo["lastUpdate"] = actualTime
             response = requests.put(f"{self.catalogURL}/services", data=json.dumps(self.serviceInfo))
             response.raise_for_status()
@@ -671,7 +671,7 @@ if __name__ == '__main__':
     try:
         # Keep script running
         while True:
-            time.sleep(40)
+            clock.sleep(40)
 
             # Update the service registration
             telegram_bot.updateService()
@@ -0,0 +1,304 @@
+import abc
+
+import numpy as np
+
+# Codes of the commands in the arrays of the strategies
+NONE, OFF, HEATING, COOLING = -1, 0, 1, 2
+COMMANDS = ("off", "heating", "cooling")
+
+class ControlStrategy(abc.ABC):
+    name = None
+    stateArrays = () # names of the float arrays with the state of the strategy, one entry per greenhouse
+
+    def __init__(self, minOnTime=0, minOffTime=0, capacity=64):
+        """
+        Initialize ControlStrategy, the control of many greenhouses with one algorithm.
+        The state of the greenhouses is kept in arrays, one slot per greenhouse, so that the commands of all the
+        greenhouses are decided in one vectorized step. Whatever the algorithm, a command is kept at least minOnTime
+        seconds (heating or cooling) or minOffTime seconds (off) before changing, so the actuators do not short-cycle.
+
+        Parameters:
+            minOnTime (float): minimum time of heating or cooling, in seconds.
+            minOffTime (float): minimum time without heating and cooling, in seconds.
+            capacity (int): initial number of slots, doubled when full.
+        """
+        self.minOnTime = minOnTime
+        self.minOffTime = minOffTime
+        self.index = {} # greenhouseID: slot
+        self.greenhouseIDs = [] # slot: greenhouseID
+        self.command = np.full(capacity, NONE, dtype=np.int8)
+        self.since = np.zeros(capacity) # time of the last transition
+        self.lastPublished = np.zeros(capacity) # time of the last publication of the command
+        self.held = np.zeros(capacity, dtype=bool) # a change of command was held back by the minimum times
+        for name in self.stateArrays:
+            setattr(self, name, np.zeros(capacity))
+
+    def _arrays(self):
+        return ("command", "since", "lastPublished", "held") + tuple(self.stateArrays)
+
+    def __len__(self):
+        return len(self.greenhouseIDs)
+
+    def slots(self, greenhouseIDs):
+        """
+        Get the slots of the greenhouses, the new greenhouses are added.
+
+        Parameters:
+            greenhouseIDs (list): IDs of the greenhouses.
+
+        Returns:
+            numpy.ndarray: slots of the greenhouses.
+        """
+        slots = np.empty(len(greenhouseIDs), dtype=np.intp)
+        for i, greenhouseID in enumerate(greenhouseIDs):
+            slot = self.index.get(greenhouseID)
+            if slot is None:
+                slot = self._add(greenhouseID)
+            slots[i] = slot
+        return slots
+
+    def _add(self, greenhouseID):
+        slot = len(self.greenhouseIDs)
+        if slot == len(self.command):
+            for name in self._arrays():
+                array = getattr(self, name)
+                grown = np.zeros(2 * len(array), dtype=array.dtype)
+                grown[:len(array)] = array
+                setattr(self, name, grown)
+        self.index[greenhouseID] = slot
+        self.greenhouseIDs.append(greenhouseID)
+        self.command[slot] = NONE
+        self.since[slot] = 0
+        self.lastPublished[slot] = 0
+        self.held[slot] = False
+        for name in self.stateArrays:
+            getattr(self, name)[slot] = 0
+        self.reset(slot)
+        return slot
+
+    def reset(self, slot):
+        """
+        Initialize the state of the strategy in a new slot (all zeros by default).
+
+        Parameters:
+            slot (int): slot of the new greenhouse.
+        """
+
+    def remove(self, greenhouseID):
+        """
+        Remove a greenhouse, the last slot is moved to its place so the arrays stay compact.
+
+        Parameters:
+            greenhouseID: ID of the greenhouse to remove.
+        """
+        slot = self.index.pop(greenhouseID, None)
+        if slot is None:
+            return
+        last = len(self.greenhouseIDs) - 1
+        lastID = self.greenhouseIDs.pop()
+        if slot != last:
+            for name in self._arrays():
+                array = getattr(self, name)
+                array[slot] = array[last]
+            self.greenhouseIDs[slot] = lastID
+            self.index[lastID] = slot
+
+    @abc.abstractmethod
+    def decide(self, slots, temperature, temp_min, temp_max, timestamp):
+        """
+        Decide the commands wanted by the algorithm for the greenhouses, and update its state.
+
+        Parameters:
+            slots (numpy.ndarray): slots of the greenhouses (each one at most once).
+            temperature (numpy.ndarray): temperatures of the greenhouses.
+            temp_min (numpy.ndarray): minimum temperatures of the ranges of the greenhouses.
+            temp_max (numpy.ndarray): maximum temperatures of the ranges of the greenhouses.
+            timestamp (float): current time.
+
+        Returns:
+            numpy.ndarray: codes of the wanted commands.
+        """
+
+    def step(self, slots, temperature, temp_min, temp_max, timestamp):
+        """
+        Decide the commands of the greenhouses and apply them.
+
+        Parameters:
+            slots (numpy.ndarray): slots of the greenhouses (each one at most once).
+            temperature (numpy.ndarray): temperatures of the greenhouses.
+            temp_min (numpy.ndarray): minimum temperatures of the ranges of the greenhouses.
+            temp_max (numpy.ndarray): maximum temperatures of the ranges of the greenhouses.
+            timestamp (float): current time.
+
+        Returns:
+            tuple: codes of the commands and mask of the commands that changed (and have to be published).
+        """
+        desired = self.decide(slots, temperature, temp_min, temp_max, timestamp).astype(np.int8)
+        current = self.command[slots]
+
+        # The current command is kept until its minimum time has elapsed
+        minimum = np.where(current == OFF, self.minOffTime, self.minOnTime)
+        locked = (current != NONE) & (timestamp - self.since[slots] < minimum)
+        commands = np.where(locked, current, desired)
+        self.held[slots] = locked & (desired != current)
+
+        changed = commands != current
+        self.command[slots[changed]] = commands[changed]
+        self.since[slots[changed]] = timestamp
+        return commands, changed
+
+    def released(self, timestamp):
+        """
+        Get the greenhouses whose change of command was held back by the minimum times, and is now allowed.
+
+        Parameters:
+            timestamp (float): current time.
+
+        Returns:
+            list: IDs of the greenhouses.
+        """
+        count = len(self.greenhouseIDs)
+        command = self.command[:count]
+        minimum = np.where(command == OFF, self.minOffTime, self.minOnTime)
+        released = self.held[:count] & (timestamp - self.since[:count] >= minimum)
+        return [self.greenhouseIDs[slot] for slot in np.flatnonzero(released)]
+
+class BangBangStrategy(ControlStrategy):
+    name = "bangBang"
+
+    def __init__(self, hysteresis=0.5, **kwargs):
+        """
+        Initialize BangBangStrategy: the heating (cooling) starts below the minimum (above the maximum) of the range
+        and stops only once the temperature is hysteresis degrees inside it.
+
+        Parameters:
+            hysteresis (float): width of the hysteresis bands inside the temperature range, in °C.
+        """
+        super().__init__(**kwargs)
+        self.hysteresis = hysteresis
+
+    def decide(self, slots, temperature, temp_min, temp_max, timestamp):
+        current = self.command[slots]
+        # Inside the range, the heating or cooling goes on until the end of its hysteresis band
+        heating = (temperature < temp_min) | ((current == HEATING) & (temperature < np.minimum(temp_min + self.hysteresis, temp_max)))
+        cooling = (temperature > temp_max) | ((current == COOLING) & (temperature > np.maximum(temp_max - self.hysteresis, temp_min)))
+        return np.where(heating, HEATING, np.where(cooling, COOLING, OFF))
+
+class PIDStrategy(ControlStrategy):
+    name = "pid"
+    stateArrays = ("integral", "previousError", "previousTime")
+
+    def __init__(self, kp=0.2, ki=0.0002, kd=0, threshold=0.5, integralLimit=1000, setpoint=0.3, **kwargs):
+        """
+        Initialize PIDStrategy: a PID controller drives the temperature to a setpoint inside the range, its output
+        is quantized to the commands of the actuators (heating above threshold, cooling below -threshold).
+
+        Parameters:
+            kp (float): proportional gain, per °C.
+            ki (float): integral gain, per °C and second.
+            kd (float): derivative gain, seconds per °C.
+            threshold (float): output above which the heating (below -threshold the cooling) is on.
+            integralLimit (float): bound of the integral of the error, in °C seconds (anti-windup).
+            setpoint (float): position of the setpoint in the range, 0 at the minimum and 1 at the maximum.
+        """
+        super().__init__(**kwargs)
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.threshold = threshold
+        self.integralLimit = integralLimit
+        self.setpoint = setpoint
+
+    def reset(self, slot):
+        self.previousTime[slot] = np.nan # no reading yet
+
+    def decide(self, slots, temperature, temp_min, temp_max, timestamp):
+        error = temp_min + self.setpoint * (temp_max - temp_min) - temperature
+        previousTime = self.previousTime[slots]
+        dt = np.where(np.isnan(previousTime), 0, timestamp - previousTime)
+
+        integral = np.clip(self.integral[slots] + error * dt, -self.integralLimit, self.integralLimit)
+        derivative = np.where(dt > 0, (error - self.previousError[slots]) / np.maximum(dt, 1e-9), 0)
+        output = self.kp * error + self.ki * integral + self.kd * derivative
+
+        self.integral[slots] = integral
+        self.previousError[slots] = error
+        self.previousTime[slots] = timestamp
+        return np.where(output > self.threshold, HEATING, np.where(output < -self.threshold, COOLING, OFF))
+
+class MPCStrategy(ControlStrategy):
+    name = "mpc"
+    stateArrays = ("drift", "previousTemperature", "previousTime")
+
+    def __init__(self, horizon=5, stepTime=60, heatingRate=0.02, coolingRate=0.02, energyWeight=0.002, margin=0.2, smoothing=0.2, **kwargs):
+        """
+        Initialize MPCStrategy, a simple model-predictive control: the temperature of each greenhouse is predicted
+        over the horizon for each command kept constant, with the drift of the greenhouse (estimated online from the
+        last readings) plus the effect of the command, and the command of least cost is chosen. The cost is the
+        squared distance out of the range (reduced by margin on both sides) plus energyWeight per step of heating
+        or cooling.
+
+        Parameters:
+            horizon (int): number of steps of the prediction.
+            stepTime (float): duration of a step of the prediction, in seconds.
+            heatingRate (float): temperature change due to the heating, in °C per second.
+            coolingRate (float): temperature change due to the cooling, in °C per second.
+            energyWeight (float): cost of a step of heating or cooling, in °C².
+            margin (float): distance from the bounds of the range kept by the prediction, in °C.
+            smoothing (float): weight of the last reading in the estimate of the drift (0 to 1).
+        """
+        super().__init__(**kwargs)
+        self.stepTime = stepTime
+        self.rates = np.array([0, heatingRate, -coolingRate])
+        self.energyWeight = energyWeight
+        self.margin = margin
+        self.smoothing = smoothing
+        self.offsets = np.arange(1, horizon + 1) * stepTime
+
+    def reset(self, slot):
+        self.previousTime[slot] = np.nan # no reading yet
+
+    def decide(self, slots, temperature, temp_min, temp_max, timestamp):
+        # The drift is the change of temperature not explained by the command applied since the last reading
+        previousTime = self.previousTime[slots]
+        dt = timestamp - previousTime
+        known = ~np.isnan(previousTime) & (dt > 0)
+        current = self.command[slots]
+        effect = np.where(current == NONE, 0, self.rates[np.maximum(current, 0)])
+        observed = (temperature - self.previousTemperature[slots]) / np.where(known, dt, 1) - effect
+        drift = np.where(known, self.drift[slots] + self.smoothing * (observed - self.drift[slots]), self.drift[slots])
+
+        self.drift[slots] = drift
+        self.previousTemperature[slots] = temperature
+        self.previousTime[slots] = timestamp
+
+        # Predicted temperatures: (commands, greenhouses, horizon)
+        rate = drift[None, :] + self.rates[:, None]
+        predicted = temperature[None, :, None] + rate[:, :, None] * self.offsets[None, None, :]
+        low = (temp_min + self.margin)[None, :, None]
+        high = (temp_max - self.margin)[None, :, None]
+        violation = np.maximum(low - predicted, 0) + np.maximum(predicted - high, 0)
+        cost = np.sum(violation ** 2, axis=2)
+        cost[1:] += self.energyWeight * len(self.offsets)
+        # The order of the commands is off, heating, cooling: on equal cost, off is chosen
+        return np.argmin(cost, axis=0)
+
+# Strategies that can be chosen in the settings of the control
+STRATEGIES = {strategy.name: strategy for strategy in (BangBangStrategy, PIDStrategy, MPCStrategy)}
+
+def createStrategy(name="bangBang", parameters=None, minOnTime=0, minOffTime=0):
+    """
+    Create a control strategy from its name and parameters (as given in the settings).
+
+    Parameters:
+        name (str): name of the strategy (bangBang, pid or mpc).
+        parameters (dict): parameters of the strategy.
+        minOnTime (float): minimum time of heating or cooling, in seconds.
+        minOffTime (float): minimum time without heating and cooling, in seconds.
+
+    Returns:
+        ControlStrategy: the strategy.
+    """
+    if name not in STRATEGIES:
+        raise ValueError(f"unknown control strategy {name}")
+    return STRATEGIES[name](minOnTime=minOnTime, minOffTime=minOffTime, **(parameters or {}))
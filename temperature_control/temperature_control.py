@@ -1,8 +1,11 @@
 import requests
 import json
-import time
+from clock import clock
+import threading
 import uuid
-from MyMQTT import *
+from mymqtt import CatalogCache, CatalogWatcher, LatestValues, MyMQTT
+import numpy as np
+from strategies import COMMANDS, NONE, createStrategy
 
 class TemperatureControl:
     def __init__(self, settings):
@@ -20,12 +23,38 @@ class TemperatureControl:
         self.serviceInfo = self.settings["serviceInfo"]
         self.temperatureTopic = self.settings["temperatureTopic"]
         self.heatingcoolingTopic = self.settings["heatingcoolingTopic"]
+        self.senmlPackTopic = self.settings.get("senmlPackTopic")
 
-        self.mqttClient = MyMQTT(clientID=str(uuid.uuid1()), broker=self.broker, port=self.port, notifier=self)
+        self.mqttClient = MyMQTT(clientID=str(uuid.uuid1()), broker=self.broker, port=self.port, notifier=self, options=self.settings.get("mqttOptions"), name=self.serviceInfo["serviceName"])
 
         self.temp_min = None
         self.temp_max = None
         self.current_temperature = None
+        self.controlled_temperatures = {} # greenhouseID: last temperature controlled
+        self.changed_ranges = set() # greenhouses whose range changed in the catalog, controlled again by recheck()
+
+        # The commands of the greenhouses are decided by the control strategy (bang-bang, PID or model-predictive),
+        # which keeps the state of all the greenhouses in arrays, and published only when they change, or again
+        # every refreshPeriod seconds
+        self.controlSettings = self.settings["control"]
+        self.strategy = createStrategy(self.controlSettings.get("strategy", "bangBang"), self.controlSettings.get("parameters"),
+                                       self.controlSettings["minOnTime"], self.controlSettings["minOffTime"])
+        self.lock = threading.Lock() # the readings are controlled by the MQTT thread, the refresh by the main loop
+
+        # The temperature ranges of the greenhouses are cached, the catalog is read only when a range is unknown,
+        # expired or changed (the changes of the zones are polled by the watcher from the main loop)
+        cacheSettings = self.settings.get("rangeCache", {})
+        self.rangeCache = CatalogCache(self.catalogURL, cacheSettings.get("ttl", 600), cacheSettings.get("maxEntries", 1024))
+        self.watcher = CatalogWatcher(self.catalogURL,
+                                      onGreenhouseRemoved=self.remove_greenhouse,
+                                      onZoneAdded=lambda greenhouseID, zoneID: self.range_changed(greenhouseID),
+                                      onZoneRemoved=lambda greenhouseID, zoneID: self.range_changed(greenhouseID),
+                                      onZoneUpdated=lambda greenhouseID, zoneID: self.range_changed(greenhouseID))
+
+        # In batch mode the readings are only stored in the table of the last temperatures, and the commands of all
+        # the greenhouses with new readings are decided together once per tick by evaluate()
+        self.batchSettings = self.settings.get("batch", {"enabled": False})
+        self.latest_temperatures = LatestValues()
 
         self.start() 
         self.registerService()
@@ -35,7 +64,7 @@ class TemperatureControl:
         Register the service in the catalog
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.serviceInfo["lastUpdate"] = actualTime
             response = requests.post(f"{self.catalogURL}/services", data=json.dumps(self.serviceInfo))
             response.raise_for_status()
@@ -49,7 +78,7 @@ class TemperatureControl:
         Update the service registration in the catalog
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.serviceInfo["lastUpdate"] = actualTime
             response = requests.put(f"{self.catalogURL}/services", data=json.dumps(self.serviceInfo))
             response.raise_for_status()
@@ -58,36 +87,76 @@ class TemperatureControl:
         except Exception as e:
             print(f"Error updating service in the catalog: {e}")
 
+    def remove_greenhouse(self, greenhouseID):
+        """
+        Forget the cached range and the control state of a greenhouse removed from the catalog.
+
+        Params:
+            greenhouseID (int): ID of the removed greenhouse.
+        """
+        self.rangeCache.discard(str(greenhouseID))
+        self.latest_temperatures.discard(str(greenhouseID))
+        self.changed_ranges.discard(str(greenhouseID))
+        with self.lock:
+            self.strategy.remove(str(greenhouseID))
+            self.controlled_temperatures.pop(str(greenhouseID), None)
+
+    def range_changed(self, greenhouseID):
+        """
+        Forget the cached range of a greenhouse whose zones changed in the catalog, the greenhouse is controlled
+        again with its last temperature by recheck().
+
+        Params:
+            greenhouseID (int): ID of the greenhouse.
+        """
+        self.rangeCache.invalidate(str(greenhouseID))
+        self.changed_ranges.add(str(greenhouseID))
+
     def get_temperature_range(self, greenhouseID):
         """
-        Get the temperature range of the greenhouse.
+        Get the temperature range of the greenhouse, from the cache or else from the catalog.
+        If the catalog cannot be reached, the last known range is used.
 
         Params:
             greenhouseID (int): ID of the greenhouse whose temperature range to get.
+
+        Returns:
+            tuple: minimum and maximum temperatures of the greenhouse (None, None if unknown).
         """
         try:
-            # Get the zones in the greenhouse from the catalog
+            # Get the zones in the greenhouse from the catalog, only if the range is not cached
             params = {"greenhouseID": greenhouseID}
-            response = requests.get(f"{self.catalogURL}/zones", params=params)
-            if response.status_code == 200:
-                zones = response.json().get("zonesList", [])
-                min_temp_values = []
-                max_temp_values = []
-
-                # Get the temperature ranges of all zones in the greenhouse
-                for zone in zones:
-                    temperature_range = zone["temperatureRange"]
-                    min_temp_values.append(temperature_range["min"])
-                    max_temp_values.append(temperature_range["max"])
-
-                # Compute the greenhouse range as the maximum of the lower bounds and minimum of the upper bounds
-                temp_min = max(min_temp_values)
-                temp_max = min(max_temp_values)
-                print(f"[Greenhouse {greenhouseID}] Temperature range {temp_min} °C - {temp_max} °C")
-                return temp_min, temp_max
-            print(f"[Greenhouse {greenhouseID}] Error fetching the greenhouse data from the catalog.")
+            return self.rangeCache.get(str(greenhouseID), "zones", params, lambda data: self.compute_temperature_range(greenhouseID, data))
         except Exception as e:
             print(f"[Greenhouse {greenhouseID}] Error in the request for the catalog : {e}")
+        return None, None
+
+    def compute_temperature_range(self, greenhouseID, data):
+        """
+        Compute the temperature range of the greenhouse from its zones.
+
+        Params:
+            greenhouseID (int): ID of the greenhouse.
+            data (dict): response of the catalog with the zones of the greenhouse.
+
+        Returns:
+            tuple: minimum and maximum temperatures of the greenhouse.
+        """
+        zones = data.get("zonesList", [])
+        min_temp_values = []
+        max_temp_values = []
+
+        # Get the temperature ranges of all zones in the greenhouse
+        for zone in zones:
+            temperature_range = zone["temperatureRange"]
+            min_temp_values.append(temperature_range["min"])
+            max_temp_values.append(temperature_range["max"])
+
+        # Compute the greenhouse range as the maximum of the lower bounds and minimum of the upper bounds
+        temp_min = max(min_temp_values)
+        temp_max = min(max_temp_values)
+        print(f"[Greenhouse {greenhouseID}] Temperature range {temp_min} °C - {temp_max} °C")
+        return temp_min, temp_max
 
     def notify(self, topic, payload):
         """
@@ -96,12 +165,17 @@ class TemperatureControl:
         
         Parameters:
             topic (str): topic of the message.
-            payload (json): payload of the message.
+            payload (dict): decoded payload of the message.
         """
         greenhouseID = topic.split("/")[-2] # prendo l'ID della serra
         try:
-            data = json.loads(payload)
+            data = payload
             current_temperature = data["v"] # temperatura attuale
+            # The "still alive" markers are controlled like the readings: the range comes from the cache and the
+            # command is published only if it changes
+            if self.batchSettings["enabled"]:
+                self.latest_temperatures.put(greenhouseID, current_temperature, data.get("t"))
+                return
             self.control_temperature(current_temperature,greenhouseID)
         except Exception as e:
             print(f"[Greenhouse {greenhouseID}] Error processing message: {e}")
@@ -120,20 +194,109 @@ class TemperatureControl:
         if current_temperature is None or temp_min is None or temp_max is None:
             return
 
-        # If the temperature is below the minimum, publish the heating command
-        if current_temperature < temp_min:
-            self.publish("heating", greenhouseID)
-            print(f"[Greenhouse {greenhouseID}] Temperature {current_temperature} °C, heating needed!")
-        
-        # If the temperature is above the maximum, publish the cooling command
-        elif current_temperature > temp_max:
-            self.publish("cooling", greenhouseID)
-            print(f"[Greenhouse {greenhouseID}] Temperature {current_temperature} °C, cooling needed!")
-        
-        # Otherwise, publish the off command
-        else:
-            self.publish("off", greenhouseID)
-            print(f"[Greenhouse {greenhouseID}] Temperature {current_temperature} °C, acceptable")
+        with self.lock:
+            now = clock.time()
+            slots = self.strategy.slots([greenhouseID])
+            commands, changed = self.strategy.step(slots, np.array([current_temperature], dtype=float), np.array([temp_min], dtype=float), np.array([temp_max], dtype=float), now)
+
+            # The command is published only if it changed
+            self.publish_changes([greenhouseID], slots, [current_temperature], commands, changed, now)
+
+    def evaluate(self):
+        """
+        Decide in one step the commands of all the greenhouses with new temperatures since the last tick (batch mode),
+        against their cached temperature ranges, and publish the commands that changed.
+
+        Returns:
+            int: number of greenhouses evaluated.
+        """
+        greenhouseIDs, temperatures, _ = self.latest_temperatures.take()
+        return self.control_greenhouses(greenhouseIDs, temperatures)
+
+    def control_greenhouses(self, greenhouseIDs, temperatures):
+        """
+        Decide in one step the commands of the greenhouses against their cached temperature ranges, and publish the
+        commands that changed.
+
+        Params:
+            greenhouseIDs (list): IDs of the greenhouses (each one at most once).
+            temperatures (list): temperatures of the greenhouses.
+
+        Returns:
+            int: number of greenhouses controlled.
+        """
+        if not greenhouseIDs:
+            return 0
+
+        # The ranges are read from the catalog only for the greenhouses not in the cache
+        ranges = [self.get_temperature_range(greenhouseID) for greenhouseID in greenhouseIDs]
+        known = [i for i, (temp_min, temp_max) in enumerate(ranges) if temp_min is not None and temp_max is not None and temperatures[i] is not None]
+        greenhouseIDs = [greenhouseIDs[i] for i in known]
+        temperature = np.array([temperatures[i] for i in known], dtype=float)
+        temp_min = np.array([ranges[i][0] for i in known], dtype=float)
+        temp_max = np.array([ranges[i][1] for i in known], dtype=float)
+
+        with self.lock:
+            now = clock.time()
+            slots = self.strategy.slots(greenhouseIDs)
+            commands, changed = self.strategy.step(slots, temperature, temp_min, temp_max, now)
+            self.publish_changes(greenhouseIDs, slots, temperature, commands, changed, now)
+        return len(greenhouseIDs)
+
+    def publish_changes(self, greenhouseIDs, slots, temperatures, commands, changed, now):
+        """
+        Publish the commands that changed, with the lock held.
+
+        Params:
+            greenhouseIDs (list): IDs of the controlled greenhouses.
+            slots (numpy.ndarray): slots of the greenhouses in the strategy.
+            temperatures (list): temperatures of the greenhouses.
+            commands (numpy.ndarray): codes of the decided commands.
+            changed (numpy.ndarray): mask of the commands that changed.
+            now (float): current time.
+        """
+        for i in np.flatnonzero(changed):
+            greenhouseID = greenhouseIDs[i]
+            command = COMMANDS[commands[i]]
+            self.publish(command, greenhouseID)
+            if command == "heating":
+                print(f"[Greenhouse {greenhouseID}] Temperature {temperatures[i]} °C, heating needed!")
+            elif command == "cooling":
+                print(f"[Greenhouse {greenhouseID}] Temperature {temperatures[i]} °C, cooling needed!")
+            else:
+                print(f"[Greenhouse {greenhouseID}] Temperature {temperatures[i]} °C, acceptable")
+        self.strategy.lastPublished[slots[changed]] = now
+        for greenhouseID, temperature in zip(greenhouseIDs, temperatures):
+            self.controlled_temperatures[greenhouseID] = temperature
+
+    def recheck(self):
+        """
+        Control again, with their last temperatures, the greenhouses whose change of command was held back by the
+        minimum times and is now allowed, and those whose range changed in the catalog: with report-by-exception
+        sensors no new reading may come for a long time.
+
+        Returns:
+            int: number of greenhouses controlled.
+        """
+        with self.lock:
+            greenhouseIDs = set(self.strategy.released(clock.time())) | self.changed_ranges
+            greenhouseIDs = [greenhouseID for greenhouseID in greenhouseIDs if greenhouseID in self.controlled_temperatures]
+            temperatures = [self.controlled_temperatures[greenhouseID] for greenhouseID in greenhouseIDs]
+        self.changed_ranges.clear()
+        return self.control_greenhouses(greenhouseIDs, temperatures)
+
+    def refresh(self):
+        """
+        Publish again the commands not published for refreshPeriod seconds, for the actuators that missed them.
+        """
+        with self.lock:
+            now = clock.time()
+            count = len(self.strategy)
+            command = self.strategy.command[:count]
+            due = np.flatnonzero((command != NONE) & (now - self.strategy.lastPublished[:count] >= self.controlSettings["refreshPeriod"]))
+            for slot in due:
+                self.publish(COMMANDS[command[slot]], self.strategy.greenhouseIDs[slot])
+            self.strategy.lastPublished[due] = now
 
     def publish(self, command, greenhouseID):
         """
@@ -154,6 +317,9 @@ class TemperatureControl:
         """
         self.mqttClient.start()
         self.mqttClient.mySubscribe(self.temperatureTopic)
+        # The temperatures can also arrive in SenML packs, which are delivered reading by reading
+        if self.senmlPackTopic:
+            self.mqttClient.mySubscribe(self.senmlPackTopic)
 
     def stop(self):
         """
@@ -167,15 +333,22 @@ if __name__ == "__main__":
     controller = TemperatureControl(settings)
     print("Starting Temperature Controller...")
     
+    # In batch mode the loop runs once per tick, the commands are decided at each iteration
+    period = controller.batchSettings["tick"] if controller.batchSettings["enabled"] else 2
     try:
-        counter = 0
+        elapsed = 0
         while True:
-            time.sleep(2)
-            counter += 1
+            clock.sleep(period)
+            controller.watcher.poll() # invalidate the cached ranges of the changed greenhouses
+            if controller.batchSettings["enabled"]:
+                controller.evaluate()
+            controller.recheck() # apply the changes held back by the minimum times, and the changed ranges
+            controller.refresh() # publish again the commands not published for a while
+            elapsed += period
             # Every 40s
-            if counter == 20:
+            if elapsed >= 40:
                 controller.updateService()
-                counter = 0
+                elapsed = 0
 
     except KeyboardInterrupt:
         controller.stop()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the tests import the modules of the service from its folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from strategies import COOLING, HEATING, NONE, OFF, BangBangStrategy, PIDStrategy, createStrategy
+
+
+def step(strategy, greenhouseID, temperature, timestamp, temperatureRange=(20, 25)):
+    # one reading of one greenhouse, return its command and whether it changed
+    slots = strategy.slots([greenhouseID])
+    commands, changed = strategy.step(slots, np.array([temperature], dtype=float), np.array([temperatureRange[0]], dtype=float),
+                                      np.array([temperatureRange[1]], dtype=float), timestamp)
+    return int(commands[0]), bool(changed[0])
+
+
+def test_changes_are_held_back_until_the_minimum_times():
+    strategy = BangBangStrategy(minOnTime=60, minOffTime=30)
+    # the first command is never held back
+    assert step(strategy, "1", 18, 0) == (HEATING, True)
+
+    # cooling is wanted, but the heating is kept for minOnTime
+    assert step(strategy, "1", 27, 10) == (HEATING, False)
+    assert strategy.held[strategy.index["1"]]
+    assert strategy.released(59) == []
+    assert strategy.released(60) == ["1"]
+    assert step(strategy, "1", 27, 60) == (COOLING, True)
+    assert not strategy.held[strategy.index["1"]]
+    assert strategy.released(1000) == []
+
+    # back in the range: the cooling is also kept for minOnTime, then the off command for minOffTime
+    assert step(strategy, "1", 22, 70) == (COOLING, False)
+    assert step(strategy, "1", 22, 120) == (OFF, True)
+    assert step(strategy, "1", 18, 130) == (OFF, False)
+    assert strategy.released(149) == []
+    assert step(strategy, "1", 18, 150) == (HEATING, True)
+
+
+def test_held_back_change_no_longer_wanted_is_not_released():
+    strategy = BangBangStrategy(minOnTime=60, minOffTime=30)
+    step(strategy, "1", 18, 0)
+    step(strategy, "1", 27, 10)
+    # the temperature went back below the range: the heating is wanted again, nothing is held back
+    assert step(strategy, "1", 19, 20) == (HEATING, False)
+    assert strategy.released(60) == []
+
+
+@pytest.mark.parametrize("current, temperature, temperatureRange, expected", [
+    (OFF, 20.0, (20, 25), OFF),  # on the minimum: no heating
+    (OFF, 19.99, (20, 25), HEATING),
+    (HEATING, 20.49, (20, 25), HEATING),  # inside the hysteresis band
+    (HEATING, 20.5, (20, 25), OFF),  # at the end of the band
+    (OFF, 25.0, (20, 25), OFF),  # on the maximum: no cooling
+    (OFF, 25.01, (20, 25), COOLING),
+    (COOLING, 24.51, (20, 25), COOLING),
+    (COOLING, 24.5, (20, 25), OFF),
+    (OFF, 20.3, (20, 25), OFF),  # the band applies only to the command already on
+    (HEATING, 20.29, (20, 20.3), HEATING),  # range narrower than the band: the band ends at the other bound
+    (HEATING, 20.3, (20, 20.3), OFF),
+    (COOLING, 20.01, (20, 20.3), COOLING),
+    (COOLING, 20.0, (20, 20.3), OFF),
+    (NONE, 19.0, (20, 25), HEATING),
+])
+def test_bang_bang_hysteresis_edges(current, temperature, temperatureRange, expected):
+    strategy = BangBangStrategy(hysteresis=0.5)
+    slots = strategy.slots(["1"])
+    strategy.command[slots] = current
+    decided = strategy.decide(slots, np.array([temperature]), np.array([temperatureRange[0]], dtype=float),
+                              np.array([temperatureRange[1]], dtype=float), 0)
+    assert decided[0] == expected
+
+
+def test_slots_grow_and_remove_remaps_the_last_slot():
+    strategy = PIDStrategy(capacity=2)
+    assert list(strategy.slots(["a", "b", "c"])) == [0, 1, 2]
+    assert len(strategy.command) == 4 and len(strategy.integral) == 4
+    assert list(strategy.slots(["c", "a"])) == [2, 0]  # the known greenhouses keep their slot
+    strategy.integral[:3] = [1, 2, 3]
+    strategy.command[:3] = [HEATING, OFF, COOLING]
+    strategy.held[:3] = [False, False, True]
+
+    # the last greenhouse is moved to the slot of the removed one, with its state
+    strategy.remove("a")
+    assert strategy.greenhouseIDs == ["c", "b"] and strategy.index == {"c": 0, "b": 1}
+    assert (strategy.integral[0], strategy.command[0], strategy.held[0]) == (3, COOLING, True)
+    strategy.remove("a")  # unknown: nothing to do
+    strategy.remove("b")  # last slot: nothing to move
+    assert strategy.greenhouseIDs == ["c"] and strategy.index == {"c": 0} and len(strategy) == 1
+
+    # a greenhouse added again gets a new slot with a new state
+    assert list(strategy.slots(["a"])) == [1]
+    assert strategy.command[1] == NONE and not strategy.held[1] and strategy.integral[1] == 0
+    assert np.isnan(strategy.previousTime[1])
+
+
+def test_create_strategy():
+    strategy = createStrategy("pid", {"kp": 1}, minOnTime=10, minOffTime=20)
+    assert isinstance(strategy, PIDStrategy)
+    assert (strategy.kp, strategy.minOnTime, strategy.minOffTime) == (1, 10, 20)
+    with pytest.raises(ValueError):
+        createStrategy("fuzzy")
@@ -1,6 +1,6 @@
 import requests
 import json
-import time
+from clock import clock
 import datetime
 
 class TemperatureMonitoring:
@@ -32,7 +32,7 @@ class TemperatureMonitoring:
         Register the service in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.serviceInfo["lastUpdate"] = actualTime
             response = requests.post(f"{self.catalogURL}/services", data=json.dumps(self.serviceInfo))
             response.raise_for_status()
@@ -46,7 +46,7 @@ class TemperatureMonitoring:
         Update the service registration in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.serviceInfo["lastUpdate"] = actualTime
             response = requests.put(f"{self.catalogURL}/services", data=json.dumps(self.serviceInfo))
             response.raise_for_status()
@@ -81,7 +81,8 @@ class TemperatureMonitoring:
             
             # Build the URL with time filtering
             field_number = 1 # temperature
-            url = f"{self.baseURL}channels/{channel_id}/fields/{field_number}.json?api_key={channel_read_api_key}&start={start_date_str}&end={end_date_str}"
+            # The status of the entries holds the aggregates of the windows uploaded by the sensors, if any
+            url = f"{self.baseURL}channels/{channel_id}/fields/{field_number}.json?api_key={channel_read_api_key}&start={start_date_str}&end={end_date_str}&status=true"
 
             # Fetch data from ThingSpeak
             try:
@@ -110,12 +111,18 @@ class TemperatureMonitoring:
                         print(f"Invalid temperature value: {temp_value}")
                         break
                     
+                    # The mean of a window weighs as many samples as it aggregates, a single reading weighs 1
+                    try:
+                        count = json.loads(entry.get("status") or "{}").get("count", 1)
+                    except (ValueError, AttributeError):
+                        count = 1
+
                     if timestamp not in daily_temperatures:
                         daily_temperatures[timestamp] = []
-                    daily_temperatures[timestamp].append(temp_value)
+                    daily_temperatures[timestamp].append((temp_value, count))
 
             # Compute daily averages
-            daily_avg_temperature = {date: sum(temps) / len(temps) for date, temps in daily_temperatures.items()}
+            daily_avg_temperature = {date: sum(t * c for t, c in temps) / sum(c for t, c in temps) for date, temps in daily_temperatures.items()}
             return daily_avg_temperature
     
     def compute_moisture_adjustment(self, daily_avg_temperature):
@@ -168,7 +175,7 @@ class TemperatureMonitoring:
         """
         
         # Compute the date range (last 5 days)
-        end_date = datetime.datetime.now() # Current time
+        end_date = clock.now() # Current time
         start_date = end_date - datetime.timedelta(days=5) # 5 days ago
 
         # Format dates for ThingSpeak API (ISO 8601 format)
@@ -233,11 +240,11 @@ if __name__ == "__main__":
     try:
         while True:
             # Every 40s, update the service registration
-            time.sleep(40)
+            clock.sleep(40)
             temperature_monitoring.updateService()
 
             # Get the current day
-            current_date = datetime.datetime.now().date()
+            current_date = clock.now().date()
 
             # Once per day, compute the update of the moisture threshold
             if last_updated_date != current_date:
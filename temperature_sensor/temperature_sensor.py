@@ -1,18 +1,26 @@
 import requests
 import json
-import random
+import os
 import time
 import uuid
-from MyMQTT import *
+from clock import clock
+from mymqtt import CatalogWatcher, MyMQTT, ReportByException, SenMLPacker, WindowStats
+from simulator import HashRing, Scheduler, ShardedRunner, SimulationEngine, TopicRouter, TraceWriter, clientCounters, createModel
 
 class TemperatureSensorMQTT:
-    def __init__(self, settings, greenhouseID):
+    def __init__(self, settings, greenhouseID, packer=None, engine=None, recorder=None, mqttClient=None):
         """
         Initialize TemperatureSensor.
         
         Parameters:
             settings (dict): Settings of TemperatureSensor.
             greenhouseID (int): ID of the greenhouse in which the sensor is.
+            packer (SenMLPacker): SenML packer of the greenhouse, if the readings are published in packs.
+            engine (SimulationEngine): engine simulating all the greenhouses, stepped by the caller
+                (if not given, the sensor has its own engine and steps it at each reading).
+            recorder (TraceWriter): trace in which the published readings are recorded, if any.
+            mqttClient (MyMQTT): client shared by the sensors of the process, started and subscribed by the caller,
+                which delivers the commands to the sensor (if not given, the sensor has its own client).
         """
 
         self.settings = settings
@@ -24,18 +32,33 @@ class TemperatureSensorMQTT:
         self.temperatureTopic = self.settings["temperatureTopic"].format(greenhouseID=self.greenhouseID)
         self.heatingcoolingTopic = self.settings["heatingcoolingTopic"].format(greenhouseID=self.greenhouseID)
 
-        self.deviceInfo = self.settings["deviceInfo"]
+        self.deviceInfo = self.settings["deviceInfo"].copy() # each sensor registers its own copy
 
         self.deviceID = f"TemperatureSensor{self.greenhouseID}" # example: TemperatureSensor1
 
-        self.mqttClient = MyMQTT(clientID=str(uuid.uuid1()), broker=self.broker, port=self.port, notifier=self)
+        self.ownClient = mqttClient is None
+        if self.ownClient:
+            self.mqttClient = MyMQTT(clientID=str(uuid.uuid1()), broker=self.broker, port=self.port, notifier=self, options=self.settings.get("mqttOptions"), name=self.deviceID)
+        else:
+            self.mqttClient = mqttClient
+        self.packer = packer
+        self.recorder = recorder
+
+        # If enabled, only the temperatures that changed more than the deadband are published, with a "still alive"
+        # marker after maxSilence seconds without changes
+        reportSettings = self.settings.get("reportByException", {})
+        self.reporter = None
+        if reportSettings.get("enabled", False):
+            self.reporter = ReportByException(reportSettings["deadband"]["temperature"], reportSettings["maxSilence"])
+
+        # If enabled, the temperature is sampled at every sample period and the mean, min, max and count of the
+        # samples of the window are published at every publish period
+        self.window = WindowStats() if self.settings.get("aggregation", {}).get("enabled", False) else None
 
-        self.current_temperature = None  
-        self.max_temperature = 45 # maximum temperature
-        self.min_temperature = 10 # minimum temperature
-        self.previous_temperature = random.randint(self.min_temperature, self.max_temperature) # initial temperature
-        self.heating = False
-        self.cooling = False
+        # the state of the greenhouse is kept by the simulation engine, the sensor is a view on its index
+        self.ownEngine = engine is None
+        self.engine = engine if engine is not None else SimulationEngine(startTime=clock.time())
+        self.engine.addGreenhouse(self.greenhouseID)
 
         self._message = {
             "v":"",
@@ -52,10 +75,10 @@ class TemperatureSensorMQTT:
         Register the device in the catalog.
         """  
         try:   
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.deviceInfo["lastUpdate"] = actualTime
             self.deviceInfo["deviceID"] = self.deviceID
-            params = {"greenhouseID": greenhouseID}
+            params = {"greenhouseID": self.greenhouseID}
             response = requests.post(f"{self.catalogURL}/devices", params=params, data=json.dumps(self.deviceInfo))
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
@@ -69,7 +92,7 @@ class TemperatureSensorMQTT:
         Update the device registration in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.deviceInfo["lastUpdate"] = actualTime
             response = requests.put(f"{self.catalogURL}/devices", data=json.dumps(self.deviceInfo))
             response.raise_for_status()
@@ -80,16 +103,18 @@ class TemperatureSensorMQTT:
     
     def start(self):
         """
-        Start the MQTT client and subscribe to the temperature topic
+        Start the MQTT client and subscribe to the temperature topic (unless the client is shared)
         """
-        self.mqttClient.start()
-        self.mqttClient.mySubscribe(self.heatingcoolingTopic) # subscribe to the heating/cooling topic 
+        if self.ownClient:
+            self.mqttClient.start()
+            self.mqttClient.mySubscribe(self.heatingcoolingTopic) # subscribe to the heating/cooling topic 
     
     def stop(self):
         """
-        Stop the MQTT client
+        Stop the MQTT client (unless the client is shared)
         """
-        self.mqttClient.stop()
+        if self.ownClient:
+            self.mqttClient.stop()
 
     def notify(self, topic, payload):
         """
@@ -98,10 +123,10 @@ class TemperatureSensorMQTT:
         
         Parameters:
             topic (str): topic of the message.
-            payload (json): payload of the message.
+            payload (dict): decoded payload of the message.
         """
         try:
-            message = json.loads(payload)
+            message = payload
             command = message.get("command")
 
             if command == "heating":
@@ -115,63 +140,214 @@ class TemperatureSensorMQTT:
                 self.cooling = False
             else:
                 print(f"[Greenhouse {self.greenhouseID}] Unknown command: {command}")
-        except json.JSONDecodeError:
-            print(f"[Greenhouse {self.greenhouseID}] Error in the format of the MQTT message.")
         except Exception as e:
             print(f"[Greenhouse {self.greenhouseID}] Error in the message: {e}")
 
+    @property
+    def index(self):
+        # index of the greenhouse in the engine, it changes when other greenhouses are removed
+        return self.engine.greenhouseIndex(self.greenhouseID)
+
+    @property
+    def heating(self):
+        return bool(self.engine.heating[self.index])
+
+    @heating.setter
+    def heating(self, value):
+        self.engine.heating[self.index] = value
+
+    @property
+    def cooling(self):
+        return bool(self.engine.cooling[self.index])
+
+    @cooling.setter
+    def cooling(self, value):
+        self.engine.cooling[self.index] = value
+
+    @property
+    def current_temperature(self):
+        return float(self.engine.temperature[self.index])
+
     def simulate_temperature(self):
         """
         Simulate the temperature value.
         """
-        if self.heating:
-            self.current_temperature = min(self.previous_temperature + random.uniform(0.3, 0.8), self.max_temperature)
-        elif self.cooling:
-            self.current_temperature = max(self.previous_temperature - random.uniform(0.3, 0.8), self.min_temperature)
-        else:
-            self.current_temperature = max(self.min_temperature, min(self.max_temperature, self.previous_temperature + random.uniform(-0.2, 0.2)))
-
-        self.previous_temperature = self.current_temperature # update the previous temperature
+        if self.ownEngine:
+            self.engine.step()
         return round(self.current_temperature, 1) 
 
+    def sample(self):
+        """
+        Sample the temperature value in the statistics of the window.
+        """
+        self.window.add(self.simulate_temperature())
+
     def publish(self):
         """
-        Simulate and publish the temperature value.
+        Simulate and publish the temperature value, or the aggregates of the window if the temperature is sampled.
         """
-        temperature = self.simulate_temperature()
         message = self._message.copy()
+        window = self.window.take() if self.window is not None else None
+        if window is not None:
+            temperature = round(window["mean"], 1)
+            message["min"] = window["min"]
+            message["max"] = window["max"]
+            message["count"] = window["count"]
+        else:
+            temperature = self.simulate_temperature()
         message["v"] = temperature
-        message["t"] = time.time()
-        self.mqttClient.myPublish(self.temperatureTopic, message) # publish the temperature
-        print(f"[Greenhouse {self.greenhouseID}] Published Temperature {temperature} °C") # print the complete message
+        message["t"] = clock.time()
+        if self.reporter is not None:
+            report = self.reporter.check(temperature, message["t"])
+            if report is None:
+                return # the temperature has not changed enough to be published
+            if report == "alive":
+                message["alive"] = True
+        if self.recorder is not None:
+            self.recorder.record(message["t"], self.temperatureTopic, message) # record the reading in the trace
+        if self.packer is not None:
+            self.packer.add(self.temperatureTopic, message) # buffer the temperature in the pack of the greenhouse
+            print(f"[Greenhouse {self.greenhouseID}] Buffered Temperature {temperature} °C")
+        else:
+            self.mqttClient.myPublish(self.temperatureTopic, message) # publish the temperature
+            print(f"[Greenhouse {self.greenhouseID}] Published Temperature {temperature} °C") # print the complete message
 
-if __name__ == '__main__':
-    settings = json.load(open("settings.json")) # setting file
+def run(settings, shard=0, shards=1, statsQueue=None):
+    """
+    Run the temperature sensors of the greenhouses of a shard, until interrupted.
 
-    try:
-        response = requests.get(f"{settings['catalogURL']}/greenhouses") # get the list of greenhouses
-        greenhouses = response.json().get('greenhousesList', [])
-    except Exception as e:
-        print(f"Error fetching greenhouses: {e}")
-        greenhouses = []
-
-    sensors = [] 
-    for greenhouse in greenhouses:
-        greenhouseID = greenhouse["greenhouseID"]
-        sensor = TemperatureSensorMQTT(settings, greenhouseID) # create a sensor for each greenhouse
-        sensors.append(sensor)
-
-    print("Temperature sensors started...")
+    Parameters:
+        settings (dict): settings of the sensors.
+        shard (int): index of the shard whose greenhouses are simulated by this process.
+        shards (int): number of shards (processes) of the fleet.
+        statsQueue (multiprocessing.Queue): queue in which the stats of the process are put, if run by a ShardedRunner.
+    """
+    shardSettings = settings.get("sharding", {})
+    ring = HashRing(shards, shardSettings.get("replicas", 100))
+
+    # The sensors of the process share one MQTT client, which delivers the commands to the sensor of their greenhouse
+    router = TopicRouter()
+    mqttClient = MyMQTT(clientID=str(uuid.uuid1()), broker=settings["brokerIP"], port=settings["brokerPort"], notifier=router, options=settings.get("mqttOptions"), name=f"TemperatureSensors{shard}")
+    mqttClient.start()
+    mqttClient.mySubscribe(settings["heatingcoolingTopic"].format(greenhouseID="+"))
+
+    # If enabled, the readings of each greenhouse are published in SenML packs
+    packSettings = settings.get("senmlPack", {})
+
+    # the temperatures of all the greenhouses of the shard are simulated together by one engine, with the model of the settings
+    simulationSettings = settings.get("simulation", {})
+    model = createModel(simulationSettings.get("model", "randomWalk"), simulationSettings.get("parameters"))
+    seed = simulationSettings.get("seed")
+    startTime = clock.time()
+    engine = SimulationEngine(seed + shard if seed is not None else None, model, simulationSettings.get("dt", 15), startTime)
+    timeScale = simulationSettings.get("timeScale", 1)
+
+    def simulatedTime():
+        # the simulation follows the clock (timeScale times faster), so the time of the engine and the time of the
+        # readings do not drift apart when the jobs are late
+        return startTime + (clock.time() - startTime) * timeScale
+
+    # If enabled, the published readings are recorded in a trace file (one per shard), to be replayed later
+    traceSettings = settings.get("trace", {})
+    recorder = None
+    if traceSettings.get("enabled", False):
+        root, extension = os.path.splitext(traceSettings["path"])
+        recorder = TraceWriter(f"{root}.shard{shard}{extension}" if shards > 1 else traceSettings["path"])
+
+    # each sensor publishes its temperature and updates its registration in the catalog at its own period
+    scheduleSettings = settings["schedule"]
+    scheduler = Scheduler(scheduleSettings["workers"], clock.speed)
+
+    sensors = {} # greenhouseID: sensor
+    packers = {} # greenhouseID: packer
+    jobs = {} # greenhouseID: scheduled jobs of the sensor
+
+    # If the readings are aggregated, the simulation advances and all the sensors sample at every sample period,
+    # otherwise the simulation advances at every publish period (timeScale times faster than the clock if > 1)
+    aggregationSettings = settings.get("aggregation", {})
+    if aggregationSettings.get("enabled", False):
+        samplePeriod = aggregationSettings["samplePeriod"]
+        def sampleAll():
+            engine.advanceTo(simulatedTime())
+            for sensor in list(sensors.values()):
+                sensor.sample()
+        scheduler.every(samplePeriod, sampleAll, 0, "sampling")
+    else:
+        scheduler.every(scheduleSettings["publishPeriod"], lambda: engine.advanceTo(simulatedTime()), 0, "simulation step")
+
+    def addSensor(greenhouseID):
+        # create a sensor for a new greenhouse, if it belongs to the shard
+        if ring.shardOf(greenhouseID) != shard:
+            return
+        packer = None
+        if packSettings.get("enabled", False):
+            packer = SenMLPacker(mqttClient, packSettings["packTopic"].format(greenhouseID=greenhouseID), packSettings["flushInterval"], packSettings["maxRecords"])
+            packers[greenhouseID] = packer
+        sensor = TemperatureSensorMQTT(settings, greenhouseID, packer, engine, recorder, mqttClient)
+        sensors[greenhouseID] = sensor
+        router.add(sensor.heatingcoolingTopic, sensor)
+        jobs[greenhouseID] = [
+            scheduler.every(scheduleSettings["publishPeriod"], sensor.publish, scheduleSettings["jitter"], f"{sensor.deviceID} publish"),
+            scheduler.every(scheduleSettings["heartbeatPeriod"], sensor.updateDevice, scheduleSettings["jitter"], f"{sensor.deviceID} update")
+        ]
+        print(f"[Greenhouse {greenhouseID}] Temperature sensor created")
+
+    def removeSensor(greenhouseID):
+        # stop the sensor of a removed greenhouse
+        sensor = sensors.pop(greenhouseID, None)
+        if sensor is None:
+            return # not in the shard
+        for job in jobs.pop(greenhouseID, []):
+            job.cancel()
+        router.remove(sensor.heatingcoolingTopic)
+        sensor.stop()
+        engine.removeGreenhouse(greenhouseID) # no longer simulated
+        packer = packers.pop(greenhouseID, None)
+        if packer is not None:
+            packer.flush()
+        print(f"[Greenhouse {greenhouseID}] Temperature sensor removed")
+
+    # the sensors follow the greenhouses added and removed in the catalog
+    watcher = CatalogWatcher(settings["catalogURL"], onGreenhouseAdded=addSensor, onGreenhouseRemoved=removeSensor)
+    watcher.poll()
+    scheduler.every(scheduleSettings["discoveryPeriod"], watcher.poll, 0, "discovery", scheduleSettings["discoveryPeriod"])
+
+    # If run by a ShardedRunner, the stats of the process are sent to it periodically
+    if statsQueue is not None:
+        def sendStats():
+            allJobs = [job for sensorJobs in list(jobs.values()) for job in sensorJobs]
+            statsQueue.put({
+                "shard": shard,
+                "sensors": len(sensors),
+                "jobRuns": sum(job.runs for job in allJobs),
+                "jobsSkipped": sum(job.skipped for job in allJobs),
+                "mqtt": clientCounters(mqttClient.getStats())
+            })
+        scheduler.every(shardSettings.get("statsInterval", 30), sendStats, 0, "stats")
+    scheduler.start()
+
+    print(f"Temperature sensors of shard {shard}/{shards} started...")
     
     try:
         while True:
-            for sensor in sensors:
-                time.sleep(15)
-                sensor.publish() # publish the temperature value
-                sensor.updateDevice() # update the device in the catalog
-
-            time.sleep(10) 
+            time.sleep(1)
     except KeyboardInterrupt:
         print("Stopping sensors...")
-        for sensor in sensors:
-            sensor.stop()
\ No newline at end of file
+        scheduler.stop()
+        for packer in packers.values():
+            packer.flush() # publish the readings still buffered
+        mqttClient.stop()
+        if recorder is not None:
+            recorder.close()
+
+if __name__ == '__main__':
+    settings = json.load(open("settings.json")) # setting file
+
+    # the greenhouses are partitioned on workers processes (0 for one per core), supervised by a ShardedRunner
+    shardSettings = settings.get("sharding", {})
+    workers = shardSettings.get("workers", 1) or os.cpu_count()
+    if workers == 1:
+        run(settings)
+    else:
+        runner = ShardedRunner(run, workers, (settings,), shardSettings.get("statsInterval", 30), shardSettings.get("restartDelay", 5))
+        runner.run()
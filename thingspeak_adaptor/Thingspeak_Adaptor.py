@@ -1,8 +1,10 @@
 import requests
 import json
-from MyMQTT import *
+from clock import clock
+from mymqtt import MyMQTT
 import time
 import uuid
+from urllib.parse import quote
 
 class Thingspeak_Adaptor:
 
@@ -34,7 +36,7 @@ class Thingspeak_Adaptor:
         self.maxZoneFields = 5
 
         # Create an MQTT client
-        self.mqttClient = MyMQTT(clientID=str(uuid.uuid1()), broker=self.broker, port=self.port, notifier=self) # uuid is to generate a random string for the client id
+        self.mqttClient = MyMQTT(clientID=str(uuid.uuid1()), broker=self.broker, port=self.port, notifier=self, options=self.settings.get("mqttOptions"), name=self.serviceInfo["serviceName"]) # uuid is to generate a random string for the client id
         # Start it
         self.mqttClient.start()
         # Subscribe to the topic
@@ -45,7 +47,7 @@ class Thingspeak_Adaptor:
         Register the service in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.serviceInfo["lastUpdate"] = actualTime
             response = requests.post(f"{self.catalogURL}/services", data=json.dumps(self.serviceInfo))
             response.raise_for_status()
@@ -59,7 +61,7 @@ class Thingspeak_Adaptor:
         Update the service registration in the catalog.
         """
         try:
-            actualTime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            actualTime = clock.strftime("%Y-%m-%d %H:%M:%S")
             self.serviceInfo["lastUpdate"] = actualTime
             response = requests.put(f"{self.catalogURL}/services", data=json.dumps(self.serviceInfo))
             response.raise_for_status()
@@ -81,18 +83,18 @@ class Thingspeak_Adaptor:
         
         Parameters:
             topic (str): topic of the message.
-            payload (json): payload of the message.
+            payload (dict): decoded payload of the message.
         """
 
-        # Decode the message
+        # Read the decoded message
         try:
-            message_decoded = json.loads(payload)
+            message_decoded = payload
             message_value = message_decoded["v"] if "v" in message_decoded.keys() else message_decoded["command"]
             decide_measurement = topic.split("/")[-1]
             greenhouseID = int(topic.split("/")[2])
             zoneID = int(topic.split("/")[3]) if len(topic.split("/")) > 4 else -1
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON message")
+        except KeyError:
+            print(f"Missing value in the message on {topic}")
             return
         except ValueError:
             print((f"Invalid greenhouseID or zoneID: {topic.split("/")[2]}, {topic.split("/")[3]}"))
@@ -181,8 +183,13 @@ class Thingspeak_Adaptor:
         else:
             print(message_decoded)
 
+            # The aggregates of a window of readings (mean as value) are uploaded in the status of the entry
+            status = None
+            if "count" in message_decoded:
+                status = json.dumps({key: message_decoded[key] for key in ("min", "max", "count")})
+
             # Upload the value on Thingspeak
-            self.uploadThingspeak(channel_write_api_key=channel_write_api_key, field_number=field_number, field_value=message_value)
+            self.uploadThingspeak(channel_write_api_key=channel_write_api_key, field_number=field_number, field_value=message_value, status=status)
     
     def getGreenhouseWriteAPIKey(self, greenhouseID):
         """
@@ -475,7 +482,7 @@ class Thingspeak_Adaptor:
         except Exception as e:
             print(f"Error fetching updating greenhouse {greenhouseID} from the catalog: {e}")
 
-    def uploadThingspeak(self, channel_write_api_key, field_number, field_value):
+    def uploadThingspeak(self, channel_write_api_key, field_number, field_value, status=None):
         """
         Upload a value in a field on Thingspeak.
         
@@ -483,6 +490,7 @@ class Thingspeak_Adaptor:
             channel_write_api_key (str): write API key of the channel.
             field_number (int): number of the field.
             field_value (float): value to upload.
+            status (str): status of the entry (aggregates of the window of the value), if any.
         """
         
         # Wait 15 s because ThingSpeak has a 15 s upload rate limit
@@ -490,6 +498,8 @@ class Thingspeak_Adaptor:
 
         # Define the URL
         urlToSend = f"{self.baseURL}update?api_key={channel_write_api_key}&field{field_number}={field_value}"
+        if status is not None:
+            urlToSend += f"&status={quote(status)}"
         
         # Ensure the update goes through
         status = 0
@@ -511,7 +521,7 @@ if __name__ == "__main__":
     try:
         counter = 0
         while True:
-            time.sleep(2)
+            clock.sleep(2)
             counter += 1
             
             # Every 40s
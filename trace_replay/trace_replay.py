@@ -0,0 +1,126 @@
+import json
+import time
+import uuid
+from clock import clock
+from mymqtt import MyMQTT
+from simulator import readTrace
+
+class TraceReplay:
+
+    def __init__(self, settings):
+        """
+        Initialize TraceReplay.
+
+        Parameters:
+            settings (dict): Settings of TraceReplay.
+        """
+        self.settings = settings
+        self.tracePath = settings["tracePath"]
+        self.speed = settings["speed"] # 1 for real time, N for N times faster, "max" for as fast as possible
+        self.loops = settings.get("loops", 1)
+
+        # each message can be published for several synthetic greenhouses: for the copy k, the numeric IDs
+        # at the levels of the topic given in "levels" are shifted by k * idOffset
+        fanOut = settings.get("fanOut", {})
+        self.copies = fanOut.get("copies", 1)
+        self.idOffset = fanOut.get("idOffset", 1000)
+        self.idLevels = fanOut.get("levels", [2, 3])
+
+        self.mqttClient = MyMQTT(clientID=str(uuid.uuid1()), broker=settings["brokerIP"], port=settings["brokerPort"], options=settings.get("mqttOptions"), name="TraceReplay")
+
+    def start(self):
+        """
+        Start the MQTT client and wait for the connection to the broker.
+        """
+        self.mqttClient.start()
+        while not self.mqttClient.isConnected():
+            time.sleep(0.1)
+
+    def stop(self):
+        """
+        Stop the MQTT client.
+        """
+        self.mqttClient.stop()
+
+    def fanOutTopic(self, topic, copy):
+        """
+        Return the topic of a copy of a message.
+
+        Parameters:
+            topic (str): recorded topic (or SenML base name).
+            copy (int): number of the copy (0 for the recorded greenhouse).
+
+        Returns:
+            str: topic with the IDs of the copy.
+        """
+        if copy == 0:
+            return topic
+        levels = topic.split("/")
+        for level in self.idLevels:
+            if level < len(levels) and levels[level].isdigit():
+                levels[level] = str(int(levels[level]) + copy * self.idOffset)
+        return "/".join(levels)
+
+    def fanOutMessage(self, message, copy, timestamp):
+        """
+        Return the message of a copy, with the timestamp of the replay.
+
+        Parameters:
+            message (dict or list): recorded reading or SenML pack.
+            copy (int): number of the copy (0 for the recorded greenhouse).
+            timestamp (float): timestamp of the replayed reading.
+
+        Returns:
+            dict or list: message to publish.
+        """
+        if isinstance(message, list):
+            pack = [dict(record) for record in message]
+            if pack and "bn" in pack[0]:
+                pack[0]["bn"] = self.fanOutTopic(pack[0]["bn"], copy)
+            if pack and "bt" in pack[0]:
+                pack[0]["bt"] = timestamp
+            return pack
+        message = dict(message)
+        if "t" in message:
+            message["t"] = timestamp
+        return message
+
+    def replay(self):
+        """
+        Publish the messages of the trace, with the recorded intervals divided by the speed.
+
+        Returns:
+            int: number of published messages.
+        """
+        published = 0
+        for _ in range(self.loops):
+            start = None
+            for recordedTime, topic, message in readTrace(self.tracePath):
+                if start is None:
+                    start = (recordedTime, time.time())
+                if self.speed != "max":
+                    delay = start[1] + (recordedTime - start[0]) / self.speed - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                timestamp = clock.time()
+                for copy in range(self.copies):
+                    self.mqttClient.myPublish(self.fanOutTopic(topic, copy), self.fanOutMessage(message, copy, timestamp))
+                    published += 1
+        return published
+
+if __name__ == "__main__":
+    settings = json.load(open("settings.json"))
+    trace_replay = TraceReplay(settings)
+    trace_replay.start()
+    print(f"Replaying {trace_replay.tracePath} at speed {trace_replay.speed} for {trace_replay.copies} copies...")
+
+    try:
+        start = time.time()
+        published = trace_replay.replay()
+        elapsed = time.time() - start
+        print(f"Published {published} messages in {elapsed:.1f} s ({published / max(elapsed, 1e-9):.0f} messages/s)")
+        time.sleep(2) # let the client send the last messages
+    except KeyboardInterrupt:
+        print("Replay stopped")
+    trace_replay.stop()